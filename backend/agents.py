@@ -0,0 +1,372 @@
+"""Agentes remotos: workers en otras VMs que toman ejecuciones de las colas.
+
+Protocolo (HTTP, header X-Agent-Token = AGENT_TOKEN):
+
+1. POST /api/agents/register con nombre y capacidades (requires_ui, tags, slots).
+2. POST /api/agents/{id}/lease?wait=N: long-poll; devuelve un trabajo (bot, env) y
+   un lease de AGENT_LEASE_SECONDS, o 204 si no hubo nada en N segundos.
+3. Mientras corre: POST .../heartbeat para renovar el lease y POST .../log con los
+   bytes nuevos de stdout (las líneas de eventos, ver bot_events, se separan ahí).
+   Ambos responden {"cancel": true} si se canceló.
+4. Al terminar: PUT .../files/<logs|resultados>/<ruta> por cada archivo generado y
+   POST .../complete con exit code, duración y recursos.
+
+Si un lease vence (agente caído o sin red) la ejecución vuelve al frente de su cola,
+hasta AGENT_MAX_ATTEMPTS leases; después queda fallida con failure_reason agent_lost.
+
+El orquestador crea la carpeta de la ejecución al otorgar el lease y guarda ahí los
+logs y archivos recibidos, así que la UI (archivos, descargas, stream-log) no cambia.
+Ver worker_agent.py para el proceso del agente. En modo multi-proceso el registro y los
+leases viven en el engine; log y archivos los escribe directo el proceso HTTP.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import bot_events
+import engine
+import executor
+import io_pool
+import log_index
+import queue_manager
+import uploads
+from models import gen_id
+
+logger = logging.getLogger(__name__)
+
+AGENT_TOKEN = os.getenv("AGENT_TOKEN", "")
+LEASE_SECONDS = int(os.getenv("AGENT_LEASE_SECONDS", "30"))
+MAX_LEASE_ATTEMPTS = int(os.getenv("AGENT_MAX_ATTEMPTS", "3"))
+AGENT_TIMEOUT = LEASE_SECONDS * 3  # Sin contacto por este tiempo → se da de baja
+REAPER_INTERVAL = 5
+
+# Campos del bot que necesita el agente para lanzar el script y aplicar límites
+_BOT_FIELDS = (
+    "id", "name", "script_path", "script_args", "requires_ui", "priority",
+    "limit_memory_mb", "limit_cpu_seconds", "limit_open_files", "limit_wall_seconds",
+)
+
+
+@dataclass
+class Agent:
+    id: str
+    name: str
+    requires_ui: bool
+    tags: frozenset[str]
+    slots: int
+    registered_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    last_seen: float = field(default_factory=time.monotonic)
+    leases: set[str] = field(default_factory=set)
+
+    def accepts(self, tags: frozenset[str]) -> bool:
+        return tags <= self.tags
+
+
+@dataclass
+class Lease:
+    execution_id: str
+    agent_id: str
+    kind: str
+    bot: dict
+    env: dict[str, str]
+    run_folder: Path
+    expires_at: float
+    cancel_requested: bool = False
+
+
+_agents: dict[str, Agent] = {}
+_leases: dict[str, Lease] = {}
+_reaper_task: Optional[asyncio.Task] = None
+
+
+def enabled() -> bool:
+    return bool(AGENT_TOKEN)
+
+
+# ── Registro ─────────────────────────────────────────────────────────────────
+
+@engine.command
+def register(info: dict) -> dict:
+    """`info`: AgentRegistration ya validado (como dict)."""
+    agent = Agent(
+        id=gen_id(),
+        name=info["name"],
+        requires_ui=info.get("requires_ui", False),
+        tags=frozenset(info.get("tags", [])),
+        slots=info.get("slots", 1),
+    )
+    _agents[agent.id] = agent
+    if agent.requires_ui:
+        queue_manager.add_capacity("ui", 1)
+    queue_manager.add_capacity("headless", agent.slots)
+    logger.info(
+        "Agente '%s' registrado (%s): ui=%s, slots=%d, tags=%s",
+        agent.name, agent.id, agent.requires_ui, agent.slots, sorted(agent.tags),
+    )
+    return {"agent_id": agent.id, "lease_seconds": LEASE_SECONDS}
+
+
+@engine.command
+async def unregister(agent_id: str):
+    agent = _agents.pop(agent_id, None)
+    if agent is None:
+        return
+    if agent.requires_ui:
+        queue_manager.add_capacity("ui", -1)
+    queue_manager.add_capacity("headless", -agent.slots)
+    for execution_id in list(agent.leases):
+        lease = _leases.get(execution_id)
+        if lease:
+            await _expire(lease)
+    logger.info("Agente '%s' (%s) dado de baja", agent.name, agent.id)
+
+
+def _agent(agent_id: str) -> Agent:
+    agent = _agents.get(agent_id)
+    if agent is None:
+        # El agente debe volver a registrarse (p. ej. tras reiniciar el orquestador)
+        raise engine.EngineError(404, "Agente no registrado")
+    agent.last_seen = time.monotonic()
+    return agent
+
+
+def _lease(agent_id: str, execution_id: str) -> Lease:
+    agent = _agent(agent_id)
+    lease = _leases.get(execution_id)
+    if lease is None or lease.agent_id != agent.id:
+        raise engine.EngineError(409, "El lease de la ejecución venció o no pertenece al agente")
+    return lease
+
+
+@engine.command
+def list_agents() -> list[dict]:
+    now = time.monotonic()
+    return [
+        {
+            "id": a.id,
+            "name": a.name,
+            "requires_ui": a.requires_ui,
+            "tags": sorted(a.tags),
+            "slots": a.slots,
+            "registered_at": a.registered_at,
+            "seconds_since_seen": round(now - a.last_seen, 1),
+            "leases": sorted(a.leases),
+        }
+        for a in _agents.values()
+    ]
+
+
+# ── Leases ───────────────────────────────────────────────────────────────────
+
+def _allowed_kinds(agent: Agent) -> list[str]:
+    if len(agent.leases) >= agent.slots:
+        return []
+    kinds = []
+    # Un solo bot con UI a la vez por agente: hay un único escritorio
+    if agent.requires_ui and not any(_leases[e].kind == "ui" for e in agent.leases if e in _leases):
+        kinds.append("ui")
+    kinds.append("headless")
+    return kinds
+
+
+@engine.command
+async def acquire(agent_id: str, wait: float) -> Optional[dict]:
+    """Espera hasta `wait` segundos una ejecución que el agente pueda correr.
+    El llamador la cancela si el agente corta el long-poll."""
+    agent = _agent(agent_id)
+    kinds = _allowed_kinds(agent)
+    if not kinds:
+        await asyncio.sleep(min(wait, 1.0))
+        return None
+    got = await queue_manager.lease(kinds, agent.accepts, wait)
+    if got is None:
+        return None
+    # Ya salió de la cola: se asigna aunque el long-poll se corte (el lease vence y se reintenta)
+    return await asyncio.shield(_grant(agent, *got))
+
+
+async def _grant(agent: Agent, kind: str, execution_id: str) -> Optional[dict]:
+    execution = await io_pool.run(executor.load_execution, execution_id)
+    if not execution or execution.get("status") != "queued":
+        await queue_manager.run_completion_hooks(execution_id)
+        return None
+    bot = await io_pool.run(executor.load_bot, execution["bot_id"])
+    if not bot:
+        await io_pool.run(executor.update_execution, execution_id, {
+            "status": "failed",
+            "completed_at": datetime.now().isoformat(),
+            "error_message": f"Bot {execution['bot_id']} no encontrado",
+        })
+        await queue_manager.run_completion_hooks(execution_id)
+        return None
+
+    run_folder = await io_pool.run(executor.create_run_folder, bot, execution_id)
+    attempt = int(execution.get("lease_attempts", 0)) + 1
+    await io_pool.run(executor.mark_started, execution, bot, run_folder, {
+        "agent_id": agent.id,
+        "agent_name": agent.name,
+        "lease_attempts": attempt,
+    })
+    queue_manager.track_start(kind, execution_id)
+    lease = Lease(
+        execution_id=execution_id,
+        agent_id=agent.id,
+        kind=kind,
+        bot=bot,
+        env=executor.input_env(execution),
+        run_folder=run_folder,
+        expires_at=time.monotonic() + LEASE_SECONDS,
+    )
+    _leases[execution_id] = lease
+    agent.leases.add(execution_id)
+    logger.info("Ejecución %s asignada al agente '%s' (intento %d)", execution_id, agent.name, attempt)
+    return {
+        "execution_id": execution_id,
+        "attempt": attempt,
+        "lease_seconds": LEASE_SECONDS,
+        "bot": {k: bot.get(k) for k in _BOT_FIELDS},
+        "env": lease.env,
+        "event_prefix": bot_events.EVENT_PREFIX,
+    }
+
+
+@engine.command
+async def renew(agent_id: str, execution_id: str) -> dict:
+    """Renueva el lease. Incluye la carpeta de la ejecución para que el proceso HTTP
+    escriba ahí el log y los archivos que manda el agente."""
+    lease = _lease(agent_id, execution_id)
+    lease.expires_at = time.monotonic() + LEASE_SECONDS
+    return {
+        "cancel": lease.cancel_requested,
+        "lease_seconds": LEASE_SECONDS,
+        "run_folder": str(lease.run_folder),
+    }
+
+
+@engine.command
+def request_cancel(execution_id: str) -> bool:
+    """Pide al agente que corre la ejecución que la termine. False si no es remota."""
+    lease = _leases.get(execution_id)
+    if lease is None:
+        return False
+    lease.cancel_requested = True
+    return True
+
+
+def _append_log(execution_id: str, run_folder: Path, data: bytes):
+    # El agente manda líneas completas: las de eventos se separan igual que en el executor
+    text, events = bot_events.split_lines(data.decode("utf-8", errors="replace"))
+    with open(run_folder / "logs" / "run.log", "a", encoding="utf-8") as f:
+        f.write(text)
+    bot_events.record(executor.EXECUTIONS_FILE, execution_id, run_folder / "logs", events)
+    log_index.add_text(execution_id, text)
+
+
+async def append_log(execution_id: str, run_folder: Path, data: bytes):
+    if data:
+        await io_pool.run(_append_log, execution_id, run_folder, data)
+
+
+def artifact_path(run_folder: Path, rel_path: str) -> Optional[Path]:
+    """Destino de un archivo subido: solo dentro de logs/ o resultados/ de la ejecución."""
+    parts = Path(rel_path).parts
+    if len(parts) < 2 or parts[0] not in ("logs", "resultados") or ".." in parts:
+        return None
+    target = (run_folder / rel_path).resolve()
+    if not target.is_relative_to(run_folder.resolve()):
+        return None
+    return target
+
+
+async def save_artifact(target: Path, chunks: AsyncIterator[bytes]) -> int:
+    return (await uploads.receive(chunks, target))["size"]
+
+
+def _release(lease: Lease):
+    _leases.pop(lease.execution_id, None)
+    agent = _agents.get(lease.agent_id)
+    if agent:
+        agent.leases.discard(lease.execution_id)
+    queue_manager.track_end(lease.kind, lease.execution_id)
+
+
+@engine.command
+async def complete(agent_id: str, execution_id: str, result: dict) -> str:
+    """`result`: AgentCompletion ya validado (como dict)."""
+    lease = _lease(agent_id, execution_id)
+    _release(lease)
+    status = "completed" if result["exit_code"] == 0 else "failed"
+    error_msg = result.get("error_message", "") if status == "failed" else ""
+    if status == "failed" and not error_msg:
+        error_msg = f"El proceso terminó con código {result['exit_code']}"
+    final = await io_pool.run(executor.finish_execution, lease.execution_id, lease.bot, {
+        "status": status,
+        "exit_code": result["exit_code"],
+        "error_message": error_msg,
+        "resources": result.get("resources", {}),
+        "failure_reason": result.get("failure_reason"),
+    }, result.get("duration_seconds", 0.0))
+    await queue_manager.run_completion_hooks(lease.execution_id)
+    return final
+
+
+async def _expire(lease: Lease):
+    """Lease vencido o agente dado de baja: reintentar la ejecución o darla por fallida."""
+    _release(lease)
+    execution = await io_pool.run(executor.load_execution, lease.execution_id)
+    if not execution:
+        return
+    attempts = int(execution.get("lease_attempts", 0))
+    if execution.get("status") == "running" and attempts < MAX_LEASE_ATTEMPTS:
+        logger.warning(
+            "Lease de la ejecución %s vencido (intento %d/%d): vuelve a la cola",
+            lease.execution_id, attempts, MAX_LEASE_ATTEMPTS,
+        )
+        await io_pool.run(executor.update_execution, lease.execution_id, {
+            "status": "queued", "started_at": None, "agent_id": None, "agent_name": None, "progress": None,
+        })
+        for key in executor.SENSITIVE_ENV_KEYS:
+            value = lease.env.get(f"BOT_INPUT_{key}")
+            if value:
+                await executor.store_execution_secret(lease.execution_id, key, value)
+        await queue_manager.enqueue(
+            lease.execution_id, lease.kind == "ui", front=True, tags=lease.bot.get("agent_tags", []),
+        )
+        return
+    await io_pool.run(executor.finish_execution, lease.execution_id, lease.bot, {
+        "status": "failed",
+        "exit_code": None,
+        "error_message": f"El agente dejó de responder ({attempts} intentos)",
+        "failure_reason": "agent_lost",
+    }, 0.0)
+    await queue_manager.run_completion_hooks(lease.execution_id)
+
+
+async def _reaper():
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL)
+        now = time.monotonic()
+        try:
+            for lease in [l for l in _leases.values() if l.expires_at < now]:
+                await _expire(lease)
+            for agent in [a for a in _agents.values() if now - a.last_seen > AGENT_TIMEOUT and not a.leases]:
+                await unregister(agent.id)
+        except Exception as e:
+            logger.error("Error revisando leases de agentes: %s", e)
+
+
+def start():
+    global _reaper_task
+    if enabled():
+        _reaper_task = asyncio.create_task(_reaper())
+
+
+def shutdown():
+    if _reaper_task:
+        _reaper_task.cancel()
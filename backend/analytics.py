@@ -0,0 +1,481 @@
+"""Analítica de ejecuciones terminadas en formato columnar (NumPy).
+
+Cada ejecución terminada se guarda una sola vez como registro de ancho fijo en
+data/analytics/rows.bin (un array estructurado de NumPy escrito de forma
+append-only); los valores de texto (bot, status, origen, usuario, agente, motivo de
+falla) se guardan como códigos enteros y sus diccionarios en
+data/analytics/dictionaries.json. Consultar es leer el archivo como columnas y
+agregar con bincount/lexsort: no se arma ningún dict por ejecución.
+
+El motor (rol standalone o engine) agrega las ejecuciones nuevas cada
+ANALYTICS_SYNC_INTERVAL segundos; cualquier proceso lee el archivo y solo carga la
+parte que creció desde la última consulta. Borrar una ejecución no la quita de la
+historia hasta que se llame a rebuild() (POST /api/admin/analytics/rebuild), que
+también lee las ejecuciones que ya pasaron al archivo (ver archive).
+
+Los tiempos son la hora local de queued_at (como se guarda en executions.json).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+import archive
+import engine
+import executor
+import storage
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+ANALYTICS_DIR = BASE_DIR / "data" / "analytics"
+SYNC_INTERVAL = int(os.getenv("ANALYTICS_SYNC_INTERVAL", "60"))
+FINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+FAILED_STATUSES = ("failed", "interrupted")
+MAX_GROUPS = 50000
+
+ROW = np.dtype([
+    ("id", "S36"),
+    ("queued", "f8"),        # Segundos desde 1970 de la hora local (sin zona)
+    ("duration", "f4"),      # NaN si nunca llegó a correr
+    ("wait", "f4"),          # Espera en cola (NaN si nunca arrancó)
+    ("peak_rss_kb", "f4"),
+    ("cpu_seconds", "f4"),
+    ("exit_code", "i4"),     # -1 si no hay
+    ("bot", "i4"),
+    ("user", "i4"),
+    ("agent", "i4"),
+    ("status", "i2"),
+    ("source", "i2"),
+    ("failure", "i2"),
+])
+
+# Dimensión de agrupación → columna codificada con diccionario
+CATEGORICAL = {
+    "bot": "bot",
+    "status": "status",
+    "source": "source",
+    "user": "user",
+    "agent": "agent",
+    "failure_reason": "failure",
+}
+TIME_BUCKETS = ("hour", "day", "week", "month")
+METRICS = (
+    "count", "failure_rate", "success_rate",
+    "avg_duration", "p50_duration", "p95_duration", "max_duration", "total_duration",
+    "avg_wait", "p95_wait", "avg_peak_rss_kb", "avg_cpu_seconds",
+)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class AnalyticsError(ValueError):
+    """Parámetros de consulta inválidos (main lo convierte en 400)."""
+
+
+# ── Escritura (solo el motor) ────────────────────────────────────────────────
+
+def _rows_file() -> Path:
+    return ANALYTICS_DIR / "rows.bin"
+
+
+def _dict_file() -> Path:
+    return ANALYTICS_DIR / "dictionaries.json"
+
+
+def _seconds(iso: Optional[str]) -> float:
+    if not iso:
+        return float("nan")
+    try:
+        return (datetime.fromisoformat(iso) - _EPOCH).total_seconds()
+    except ValueError:
+        return float("nan")
+
+
+def _float(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else float("nan")
+
+
+def trigger_source(ex: dict) -> str:
+    """De dónde vino la ejecución (para "tasa de fallas por origen")."""
+    if ex.get("triggered_by") == "scheduler":
+        return "scheduler"
+    if ex.get("pipeline_run_id"):
+        return "pipeline"
+    if ex.get("parent_id"):
+        return "fanout"
+    if ex.get("batch_id"):
+        return "batch"
+    if ex.get("cached_from"):
+        return "cache"
+    return "manual"
+
+
+class _Writer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.known: Optional[set[bytes]] = None
+
+    def _load_known(self):
+        if self.known is None:
+            self.known = set(_read_rows(0)[0]["id"].tolist())
+
+    def append(self, executions: list[dict], rebuild: bool = False) -> int:
+        """Agrega las ejecuciones terminadas que todavía no están. Retorna cuántas.
+
+        Con rebuild=True arma un rows.bin nuevo y lo reemplaza de una vez (los códigos
+        de los diccionarios se conservan, así un lector nunca los ve cambiar)."""
+        with self.lock:
+            if rebuild:
+                self.known = set()
+            self._load_known()
+            new = [
+                ex for ex in executions
+                if ex.get("status") in FINAL_STATUSES and ex["id"].encode() not in self.known
+            ]
+            if not new and not rebuild:
+                return 0
+            rows = np.zeros(len(new), dtype=ROW)
+            with storage.transaction(_dict_file()) as columns:
+                codes = {c["column"]: c["values"] for c in columns}
+                index = {name: {v: i for i, v in enumerate(values)} for name, values in codes.items()}
+
+                def code(column: str, value: Optional[str]) -> int:
+                    value = value or ""
+                    known = index.setdefault(column, {})
+                    if value not in known:
+                        known[value] = len(known)
+                        codes.setdefault(column, []).append(value)
+                    return known[value]
+
+                for i, ex in enumerate(new):
+                    queued = _seconds(ex.get("queued_at"))
+                    started = _seconds(ex.get("started_at"))
+                    resources = ex.get("resources") or {}
+                    ran = ex.get("started_at") is not None and ex["status"] != "interrupted"
+                    rows[i] = (
+                        ex["id"].encode(),
+                        queued,
+                        float(ex.get("duration_seconds") or 0.0) if ran else np.nan,
+                        started - queued,
+                        _float(resources.get("peak_rss_kb")),
+                        _float(resources.get("cpu_seconds")),
+                        ex["exit_code"] if isinstance(ex.get("exit_code"), int) else -1,
+                        code("bot", ex["bot_id"]),
+                        code("user", ex.get("triggered_by")),
+                        code("agent", ex.get("agent_name")),
+                        code("status", ex["status"]),
+                        code("source", trigger_source(ex)),
+                        code("failure", ex.get("failure_reason")),
+                    )
+                columns[:] = [{"column": name, "values": values} for name, values in codes.items()]
+            # El diccionario ya está guardado: un lector nunca ve un código sin su valor
+            if rebuild:
+                tmp = _rows_file().with_suffix(".tmp")
+                rows.tofile(tmp)
+                os.replace(tmp, _rows_file())
+            else:
+                with open(_rows_file(), "ab") as f:
+                    f.write(rows.tobytes())
+            self.known.update(rows["id"].tolist())
+            return len(new)
+
+
+_writer = _Writer()
+
+
+def sync() -> int:
+    ANALYTICS_DIR.mkdir(parents=True, exist_ok=True)
+    added = _writer.append(storage.load(executor.EXECUTIONS_FILE))
+    if added:
+        logger.info("Analítica: %d ejecuciones nuevas", added)
+    return added
+
+
+@engine.command(blocking=True)
+def rebuild() -> int:
+    """Rehace la historia desde executions.json y el archivo (p. ej. después de borrar
+    ejecuciones). Si una ejecución quedó en los dos lados vale la de executions.json."""
+    ANALYTICS_DIR.mkdir(parents=True, exist_ok=True)
+    by_id = {ex["id"]: ex for ex in archive.iter_all()}
+    by_id.update((ex["id"], ex) for ex in storage.load(executor.EXECUTIONS_FILE))
+    return _writer.append(list(by_id.values()), rebuild=True)
+
+
+async def sync_loop():
+    """Background task del motor."""
+    while True:
+        try:
+            await asyncio.to_thread(sync)
+        except Exception as e:
+            logger.error("Error sincronizando analítica: %s", e)
+        await asyncio.sleep(SYNC_INTERVAL)
+
+
+# ── Lectura (cualquier proceso) ──────────────────────────────────────────────
+
+def _read_rows(offset_rows: int) -> tuple[np.ndarray, int]:
+    """Registros completos desde `offset_rows` (un append a medio escribir se ignora)."""
+    path = _rows_file()
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return np.zeros(0, dtype=ROW), 0
+    total = size // ROW.itemsize
+    if total <= offset_rows:
+        return np.zeros(0, dtype=ROW), total
+    with open(path, "rb") as f:
+        f.seek(offset_rows * ROW.itemsize)
+        data = np.fromfile(f, dtype=ROW, count=total - offset_rows)
+    return data, total
+
+
+class _Table:
+    """Columnas en memoria (un array contiguo por campo de ROW) que se extienden solo
+    con lo que creció rows.bin."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns: dict[str, np.ndarray] = self._empty()
+        self.length = 0
+        self.dictionaries: dict[str, list[str]] = {}
+        self.stamp: Optional[tuple[int, int]] = None
+
+    @staticmethod
+    def _empty() -> dict[str, np.ndarray]:
+        return {name: np.zeros(0, dtype=ROW[name]) for name in ROW.names if name != "id"}
+
+    def current(self) -> tuple[dict[str, np.ndarray], dict[str, list[str]]]:
+        with self.lock:
+            try:
+                st = _rows_file().stat()
+                stamp = (st.st_ino, st.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp != self.stamp:
+                if self.stamp is None or stamp is None or stamp[0] != self.stamp[0] or stamp[1] < self.stamp[1]:
+                    self.columns, self.length = self._empty(), 0   # rebuild: archivo nuevo
+                tail, self.length = _read_rows(self.length)
+                if len(tail):
+                    self.columns = {
+                        name: np.concatenate([column, tail[name]]) for name, column in self.columns.items()
+                    }
+                self.dictionaries = {c["column"]: c["values"] for c in storage.load(_dict_file())}
+                self.stamp = stamp
+            return self.columns, self.dictionaries
+
+
+_table = _Table()
+
+
+def _bucket(queued: np.ndarray, unit: str) -> tuple[np.ndarray, Callable]:
+    """Clave entera del bucket de tiempo y cómo convertirla en etiqueta."""
+    seconds = np.nan_to_num(queued).astype("int64")
+    if unit == "hour":
+        return seconds // 3600, lambda k: (_EPOCH + timedelta(hours=int(k))).strftime("%Y-%m-%dT%H:00")
+    days = seconds // 86400
+    if unit == "day":
+        return days, lambda k: (_EPOCH + timedelta(days=int(k))).strftime("%Y-%m-%d")
+    if unit == "week":
+        # 1970-01-01 fue jueves: semanas ISO empezando el lunes, etiquetadas por ese lunes
+        weeks = (days + 3) // 7
+        return weeks, lambda k: (_EPOCH + timedelta(days=int(k) * 7 - 3)).strftime("%Y-%m-%d")
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype("int64")
+    return months, lambda k: str(np.datetime64(int(k), "M"))
+
+
+def _codes(dictionaries: dict, column: str, values: list[str]) -> list[int]:
+    known = dictionaries.get(column, [])
+    return [known.index(v) for v in values if v in known]
+
+
+def _group_ids(parts: list[np.ndarray], length: int) -> tuple[np.ndarray, list[np.ndarray]]:
+    """Id de grupo por fila (0..n-1) y, por dimensión, el valor de cada grupo.
+
+    Las claves de cada dimensión se corren a 0 y se combinan en un entero; si el
+    espacio combinado es chico alcanza con un bincount (sin ordenar el millón de filas)."""
+    key = np.zeros(length, dtype="int64")
+    offsets, spans = [], []
+    for raw in parts:
+        lo = int(raw.min()) if length else 0
+        span = int(raw.max()) - lo + 1 if length else 1
+        key = key * span + (raw - lo)
+        offsets.append(lo)
+        spans.append(span)
+    space = int(np.prod(spans, dtype="float64")) if spans else 1
+    if space <= 1 << 24:
+        present = np.flatnonzero(np.bincount(key, minlength=space))
+        remap = np.zeros(space, dtype="int64")
+        remap[present] = np.arange(len(present))
+        gid = remap[key]
+    else:
+        present, gid = np.unique(key, return_inverse=True)
+    values = []
+    remainder = present.copy()
+    for lo, span in zip(reversed(offsets), reversed(spans)):
+        values.append(remainder % span + lo)
+        remainder //= span
+    return gid, list(reversed(values))
+
+
+def _sorted_by_group(gid: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(gid, values) sin NaN, ordenados por grupo y dentro del grupo por valor. Un solo
+    argsort sobre gid + valor normalizado a [0, 1) (mucho más rápido que lexsort)."""
+    valid = ~np.isnan(values)
+    gid, values = gid[valid], values[valid]
+    if not len(values):
+        return gid, values
+    lo, hi = values.min(), values.max()
+    order = np.argsort(gid + (values - lo) / ((hi - lo) * 1.0001 + 1e-12), kind="stable")
+    return gid[order], values[order]
+
+
+def _percentile(gid: np.ndarray, values: np.ndarray, n_groups: int, q: float) -> np.ndarray:
+    """Percentil (nearest-rank) por grupo ignorando NaN, sin loop por grupo."""
+    gid, values = _sorted_by_group(gid, values)
+    out = np.full(n_groups, np.nan)
+    if not len(values):
+        return out
+    counts = np.bincount(gid, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    has = counts > 0
+    idx = starts[has] + np.ceil(q * counts[has]).astype("int64") - 1
+    out[has] = values[np.maximum(idx, starts[has])]
+    return out
+
+
+def _max(gid: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    out = np.full(n_groups, np.nan)
+    np.fmax.at(out, gid, values)   # fmax ignora NaN (grupos sin valores quedan NaN)
+    return out
+
+
+def query(
+    group_by: list[str],
+    metrics: list[str],
+    bot_ids: Optional[list[str]] = None,
+    statuses: Optional[list[str]] = None,
+    sources: Optional[list[str]] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> dict:
+    """Agregaciones por dimensiones (bot, status, source, user, agent, failure_reason) y/o
+    un bucket de tiempo (hour, day, week, month)."""
+    start = time.perf_counter()
+    unknown = [g for g in group_by if g not in CATEGORICAL and g not in TIME_BUCKETS]
+    if unknown:
+        raise AnalyticsError(f"Dimensión desconocida: {', '.join(unknown)}")
+    if sum(g in TIME_BUCKETS for g in group_by) > 1:
+        raise AnalyticsError("Solo se puede agrupar por un bucket de tiempo")
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise AnalyticsError(f"Métrica desconocida: {', '.join(unknown)}")
+
+    columns, dictionaries = _table.current()
+    length = len(columns["queued"])
+    mask = None
+
+    def restrict(condition: np.ndarray):
+        nonlocal mask
+        mask = condition if mask is None else mask & condition
+
+    if bot_ids:
+        restrict(np.isin(columns["bot"], _codes(dictionaries, "bot", bot_ids)))
+    if statuses:
+        restrict(np.isin(columns["status"], _codes(dictionaries, "status", statuses)))
+    if sources:
+        restrict(np.isin(columns["source"], _codes(dictionaries, "source", sources)))
+    if date_from:
+        restrict(columns["queued"] >= _seconds(date_from))
+    if date_to:
+        # Fecha sin hora = incluye todo ese día
+        restrict(columns["queued"] < _seconds(date_to) + (86400 if len(date_to) == 10 else 0))
+    if mask is not None:
+        length = int(mask.sum())
+
+    cache: dict[str, np.ndarray] = {}
+
+    def col(name: str) -> np.ndarray:
+        # Solo se copian (filtradas) las columnas que la consulta usa
+        if name not in cache:
+            cache[name] = columns[name] if mask is None else columns[name][mask]
+        return cache[name]
+
+    parts, labels = [], []
+    for dim in group_by:
+        if dim in TIME_BUCKETS:
+            raw, label = _bucket(col("queued"), dim)
+        else:
+            raw = col(CATEGORICAL[dim]).astype("int64")
+            label = (lambda vs: lambda k: vs[int(k)] or None)(dictionaries.get(CATEGORICAL[dim], []))
+        parts.append(raw)
+        labels.append(label)
+    gid, group_values = _group_ids(parts, length)
+    n = len(group_values[0]) if group_values else int(length > 0)
+    if n > MAX_GROUPS:
+        raise AnalyticsError(f"La consulta genera {n} grupos (máximo {MAX_GROUPS}): usa un bucket más grande o filtros")
+
+    counts = np.bincount(gid, minlength=n).astype("float64")
+    status_values = dictionaries.get("status", [])
+
+    def rate(statuses: tuple[str, ...]) -> np.ndarray:
+        codes = [status_values.index(s) for s in statuses if s in status_values]
+        return np.bincount(gid, weights=np.isin(col("status"), codes), minlength=n) / np.maximum(counts, 1)
+
+    def mean(name: str) -> np.ndarray:
+        values = col(name).astype("float64")
+        valid = ~np.isnan(values)
+        total = np.bincount(gid[valid], weights=values[valid], minlength=n)
+        seen = np.bincount(gid[valid], minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(seen > 0, total / seen, np.nan)
+
+    computed: dict[str, np.ndarray] = {}
+    for metric in metrics:
+        if metric == "count":
+            computed[metric] = counts
+        elif metric == "failure_rate":
+            computed[metric] = rate(FAILED_STATUSES)
+        elif metric == "success_rate":
+            computed[metric] = rate(("completed",))
+        elif metric == "avg_duration":
+            computed[metric] = mean("duration")
+        elif metric == "total_duration":
+            computed[metric] = np.bincount(gid, weights=np.nan_to_num(col("duration").astype("float64")), minlength=n)
+        elif metric == "max_duration":
+            computed[metric] = _max(gid, col("duration").astype("float64"), n)
+        elif metric in ("p50_duration", "p95_duration"):
+            q = 0.5 if metric == "p50_duration" else 0.95
+            computed[metric] = _percentile(gid, col("duration").astype("float64"), n, q)
+        elif metric == "avg_wait":
+            computed[metric] = mean("wait")
+        elif metric == "p95_wait":
+            computed[metric] = _percentile(gid, col("wait").astype("float64"), n, 0.95)
+        elif metric == "avg_peak_rss_kb":
+            computed[metric] = mean("peak_rss_kb")
+        elif metric == "avg_cpu_seconds":
+            computed[metric] = mean("cpu_seconds")
+
+    dims = [[label(v) for v in values.tolist()] for label, values in zip(labels, group_values)]
+    series = {metric: values.tolist() for metric, values in computed.items()}
+    rows = []
+    for i in range(n):
+        row = {dim: dims[j][i] for j, dim in enumerate(group_by)}
+        for metric, values in series.items():
+            value = values[i]
+            row[metric] = None if value != value else (int(value) if metric == "count" else round(value, 4))
+        rows.append(row)
+    return {
+        "group_by": group_by,
+        "metrics": metrics,
+        "rows": rows,
+        "total_executions": length,
+        "took_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
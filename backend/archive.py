@@ -0,0 +1,234 @@
+"""Archivo de ejecuciones viejas en segmentos NDJSON comprimidos.
+
+executions.json se lee y se reescribe entero en cada operación, así que no debe
+guardar años de historia. Cada ARCHIVE_INTERVAL el motor mueve las ejecuciones
+terminadas hace más de ARCHIVE_AFTER_DAYS a data/archive/:
+
+- executions-YYYY-MM.ndjson.zst (o .gz si no está instalado `zstandard`): un segmento
+  por mes de queued_at. Solo se agrega al final: cada pasada escribe un frame zstd
+  (o miembro gzip) nuevo, y los lectores descomprimen todos los frames seguidos.
+- <segmento>.ids: los ids del segmento, uno por línea, para encontrar una ejecución
+  por id sin descomprimir todo.
+- index.json: por segmento, rango de fechas (from/to), cantidad, bots y status.
+
+Primero se escribe el segmento y después se sacan las ejecuciones del archivo
+caliente: si el proceso se corta en el medio una ejecución puede quedar en los dos
+lados (los lectores prefieren la copia caliente), nunca en ninguno.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # Opcional: sin zstandard se comprime con gzip
+    zstandard = None
+
+import analytics
+import executor
+import storage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).parent / "data" / "archive"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+BATCH_SIZE = 5000          # Ejecuciones por transacción (no tener executions.json tomado mucho rato)
+CACHE_SEGMENTS = 4         # Segmentos descomprimidos que se mantienen en memoria
+FINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+
+# (archivo, tamaño) → registros del segmento, del más nuevo al más viejo
+_cache: "OrderedDict[tuple[str, int], list[dict]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def index_file() -> Path:
+    return ARCHIVE_DIR / "index.json"
+
+
+def _segment_for(month: str) -> Path:
+    """Segmento de un mes; si ya existe se sigue usando su compresión."""
+    for suffix in (".zst", ".gz"):
+        path = ARCHIVE_DIR / f"executions-{month}.ndjson{suffix}"
+        if path.exists():
+            return path
+    return ARCHIVE_DIR / f"executions-{month}.ndjson{'.zst' if zstandard else '.gz'}"
+
+
+def _compress(path: Path, data: bytes) -> bytes:
+    if path.suffix == ".zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(path: Path) -> bytes:
+    raw = path.read_bytes()
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{path.name} está comprimido con zstd: instalar `zstandard`")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        return reader.read()
+    return gzip.decompress(raw)
+
+
+# ── Escritura (solo el motor) ────────────────────────────────────────────────
+
+def _append(records: list[dict]):
+    """Agrega ejecuciones a los segmentos de su mes y actualiza el índice."""
+    by_month: dict[str, list[dict]] = {}
+    for ex in records:
+        by_month.setdefault(ex["queued_at"][:7], []).append(ex)
+    with storage.transaction(index_file()) as index:
+        entries = {entry["file"]: entry for entry in index}
+        for month, group in sorted(by_month.items()):
+            group.sort(key=lambda e: e["queued_at"])
+            path = _segment_for(month)
+            data = "".join(json.dumps(ex, ensure_ascii=False) + "\n" for ex in group).encode("utf-8")
+            # ids antes que el segmento: un id sin registro se ignora, un registro sin id no se encontraría
+            with open(path.with_name(path.name + ".ids"), "a", encoding="utf-8") as f:
+                f.write("".join(ex["id"] + "\n" for ex in group))
+            with open(path, "ab") as f:
+                f.write(_compress(path, data))
+                f.flush()
+                os.fsync(f.fileno())
+            entry = entries.setdefault(path.name, {
+                "file": path.name, "from": group[0]["queued_at"], "to": group[-1]["queued_at"],
+                "count": 0, "bots": [], "statuses": {},
+            })
+            entry["from"] = min(entry["from"], group[0]["queued_at"])
+            entry["to"] = max(entry["to"], group[-1]["queued_at"])
+            entry["count"] += len(group)
+            entry["bots"] = sorted(set(entry["bots"]) | {ex["bot_id"] for ex in group})
+            for ex in group:
+                entry["statuses"][ex["status"]] = entry["statuses"].get(ex["status"], 0) + 1
+        index[:] = sorted(entries.values(), key=lambda e: e["from"])
+
+
+def _expired(executions: list[dict], cutoff: str) -> list[dict]:
+    return [
+        ex for ex in executions
+        if ex["status"] in FINAL_STATUSES and (ex.get("completed_at") or ex["queued_at"]) < cutoff
+    ][:BATCH_SIZE]
+
+
+def archive_old(now: Optional[datetime] = None) -> int:
+    """Mueve al archivo las ejecuciones terminadas antes del umbral. Retorna cuántas."""
+    if ARCHIVE_AFTER_DAYS <= 0:
+        return 0
+    cutoff = ((now or datetime.now()) - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    # Lo que se archiva ya tiene que estar en la analítica (sync solo lee executions.json)
+    analytics.sync()
+    total = 0
+    # Primero sin lock: la transacción reescribe executions.json aunque no cambie nada
+    while _expired(storage.load(executor.EXECUTIONS_FILE), cutoff):
+        with storage.transaction(executor.EXECUTIONS_FILE) as executions:
+            old = _expired(executions, cutoff)
+            if old:
+                _append(old)
+                moved = {ex["id"] for ex in old}
+                executions[:] = [ex for ex in executions if ex["id"] not in moved]
+        total += len(old)
+    if total:
+        logger.info("Archivo: %d ejecuciones movidas a %s", total, ARCHIVE_DIR)
+    return total
+
+
+async def archive_loop():
+    """Background task del motor."""
+    while True:
+        try:
+            await asyncio.to_thread(archive_old)
+        except Exception as e:
+            logger.error("Error archivando ejecuciones: %s", e)
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+
+
+# ── Lectura (cualquier proceso) ──────────────────────────────────────────────
+
+def segments() -> list[dict]:
+    """Entradas del índice, del segmento más nuevo al más viejo."""
+    return sorted(storage.load(index_file()), key=lambda e: e["to"], reverse=True)
+
+
+def _records(entry: dict) -> list[dict]:
+    path = ARCHIVE_DIR / entry["file"]
+    try:
+        key = (entry["file"], path.stat().st_size)
+    except FileNotFoundError:
+        return []
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    records = [json.loads(line) for line in _decompress(path).splitlines() if line]
+    records.sort(key=lambda e: e["queued_at"], reverse=True)
+    with _cache_lock:
+        _cache[key] = records
+        while len(_cache) > CACHE_SEGMENTS:
+            _cache.popitem(last=False)
+    return records
+
+
+def page(before: Optional[str] = None, limit: int = 100, bot_id: Optional[str] = None) -> list[dict]:
+    """Ejecuciones archivadas con queued_at < `before`, de la más nueva a la más vieja.
+    Solo descomprime los segmentos necesarios para llenar la página."""
+    out: list[dict] = []
+    for entry in segments():
+        if before and entry["from"] >= before:
+            continue
+        if bot_id and bot_id not in entry["bots"]:
+            continue
+        for ex in _records(entry):
+            if before and ex["queued_at"] >= before:
+                continue
+            if bot_id and ex["bot_id"] != bot_id:
+                continue
+            out.append(ex)
+            if len(out) >= limit:
+                return out
+    return out
+
+
+def find(execution_id: str) -> Optional[dict]:
+    needle = "\n" + execution_id + "\n"
+    for entry in segments():
+        ids = ARCHIVE_DIR / (entry["file"] + ".ids")
+        try:
+            # Se compara la línea completa: un id no debe coincidir con el sufijo de otro.
+            if needle not in "\n" + ids.read_text(encoding="utf-8"):
+                continue
+        except FileNotFoundError:
+            continue
+        found = next((ex for ex in _records(entry) if ex["id"] == execution_id), None)
+        if found is not None:
+            return found
+    return None
+
+
+def iter_all() -> Iterator[dict]:
+    """Todas las ejecuciones archivadas (segmento por segmento, sin pasar por la caché)."""
+    for entry in segments():
+        path = ARCHIVE_DIR / entry["file"]
+        if path.exists():
+            for line in _decompress(path).splitlines():
+                if line:
+                    yield json.loads(line)
+
+
+def totals() -> dict[str, int]:
+    """Cantidad archivada por status (y "total"), leída solo del índice."""
+    counts: dict[str, int] = {"total": 0}
+    for entry in storage.load(index_file()):
+        counts["total"] += entry["count"]
+        for status, n in entry["statuses"].items():
+            counts[status] = counts.get(status, 0) + n
+    return counts
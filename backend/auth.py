@@ -1,7 +1,8 @@
 """Google OAuth2 + JWT para el Orquestador de Bots."""
 
-import json
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Optional
@@ -12,35 +13,70 @@ from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 
+import storage
+import tracing
 from models import User
 
 GOOGLE_AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
-GOOGLE_TOKEN_URL = "https://oauth2.googleapis.com/token"
-GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+# Sobrescribibles por env para apuntar a un servidor OAuth stub local en pruebas
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
 
 DATA_DIR = Path(__file__).parent / "data"
 USERS_FILE = DATA_DIR / "users.json"
 
 security = HTTPBearer(auto_error=False)
 
+# Caché de payloads JWT ya verificados: token → (payload, expira_en monotonic)
+TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+TOKEN_CACHE_MAX = int(os.getenv("AUTH_TOKEN_CACHE_MAX", "1024"))
+
 
 # ── Persistencia usuarios ────────────────────────────────────────────────────
 
+# Índice in-memory de usuarios, atado a la versión de users.json (storage.version): con
+# varios procesos (rol api con N workers) un cambio hecho en otro proceso también lo
+# invalida, al costo de un stat por acceso
+_users_lock = threading.Lock()
+_users_index: Optional[tuple[str, dict[str, dict], dict[str, dict]]] = None
+
+
 def load_users() -> list[dict]:
-    if USERS_FILE.exists():
-        with open(USERS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load(USERS_FILE)
 
 
 def save_users(users: list[dict]):
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    with open(USERS_FILE, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    storage.save(USERS_FILE, users)
+    invalidate_user_cache()
+
+
+def invalidate_user_cache():
+    """Descarta el índice de usuarios; se recarga desde disco en el próximo acceso."""
+    global _users_index
+    with _users_lock:
+        _users_index = None
+
+
+def _user_index() -> tuple[dict[str, dict], dict[str, dict]]:
+    global _users_index
+    version, _ = storage.version(USERS_FILE)
+    index = _users_index
+    if index is not None and index[0] == version:
+        return index[1], index[2]
+    with _users_lock:
+        if _users_index is None or _users_index[0] != version:
+            # Versión tomada antes de leer: si cambia en el medio, el próximo acceso relee
+            users = load_users()
+            _users_index = (version, {u["email"]: u for u in users}, {u["id"]: u for u in users})
+        return _users_index[1], _users_index[2]
 
 
 def get_user_by_email(email: str) -> Optional[dict]:
-    return next((u for u in load_users() if u["email"] == email), None)
+    return _user_index()[0].get(email)
+
+
+def get_user_by_id(user_id: str) -> Optional[dict]:
+    return _user_index()[1].get(user_id)
 
 
 def upsert_user(email: str, name: str, picture: str) -> dict:
@@ -84,29 +120,110 @@ def get_google_auth_url() -> str:
     return f"{GOOGLE_AUTH_URL}?{urlencode(params)}"
 
 
+# ── Cliente HTTP compartido ──────────────────────────────────────────────────
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def init_http_client():
+    """Crea el cliente HTTP compartido (pool + keep-alive). Llamar desde el lifespan."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120),
+        )
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def _client() -> httpx.AsyncClient:
+    # Fallback perezoso por si se usa fuera del lifespan (scripts, pruebas)
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(http2=_http2_available(), timeout=httpx.Timeout(10.0, connect=5.0))
+    return _http_client
+
+
 # ── Intercambio de código ────────────────────────────────────────────────────
 
 async def exchange_code(code: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(GOOGLE_TOKEN_URL, data={
-            "code": code,
-            "client_id": os.getenv("GOOGLE_CLIENT_ID", ""),
-            "client_secret": os.getenv("GOOGLE_CLIENT_SECRET", ""),
-            "redirect_uri": os.getenv("GOOGLE_REDIRECT_URI", ""),
-            "grant_type": "authorization_code",
-        })
-        resp.raise_for_status()
-        return resp.json()
+    resp = await _client().post(GOOGLE_TOKEN_URL, data={
+        "code": code,
+        "client_id": os.getenv("GOOGLE_CLIENT_ID", ""),
+        "client_secret": os.getenv("GOOGLE_CLIENT_SECRET", ""),
+        "redirect_uri": os.getenv("GOOGLE_REDIRECT_URI", ""),
+        "grant_type": "authorization_code",
+    })
+    resp.raise_for_status()
+    return resp.json()
 
 
 async def get_google_user_info(access_token: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            GOOGLE_USERINFO_URL,
-            headers={"Authorization": f"Bearer {access_token}"},
-        )
-        resp.raise_for_status()
-        return resp.json()
+    resp = await _client().get(
+        GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+
+def _valid_id_token_claims(claims: dict) -> bool:
+    """Validaciones de OIDC Core §3.1.3.7 que siguen aplicando sin verificar la firma:
+    emisor, audiencia (nuestro client_id) y vencimiento; además el email verificado."""
+    audience = claims.get("aud")
+    audiences = audience if isinstance(audience, list) else [audience]
+    client_id = os.getenv("GOOGLE_CLIENT_ID", "")
+    exp = claims.get("exp")
+    return (
+        claims.get("iss") in GOOGLE_ISSUERS
+        and bool(client_id) and client_id in audiences
+        and isinstance(exp, (int, float)) and exp > time.time()
+        and bool(claims.get("email"))
+        and claims.get("email_verified") is True
+    )
+
+
+async def get_google_identity(code: str) -> dict:
+    """Intercambia el código y devuelve email/name/picture del usuario.
+
+    El userinfo depende del access_token, así que no puede pedirse en paralelo.
+    En su lugar se usan los claims del id_token que Google devuelve junto con el
+    token (scope openid): al llegar directo del token endpoint por TLS no requiere
+    verificar firma (OIDC Core §3.1.3.7), pero sí iss, aud y exp. Si alguna validación
+    no pasa o el email no viene verificado se consulta userinfo.
+    """
+    tokens = await exchange_code(code)
+    id_token = tokens.get("id_token")
+    if id_token:
+        try:
+            claims = jwt.get_unverified_claims(id_token)
+        except JWTError:
+            claims = {}
+        if _valid_id_token_claims(claims):
+            return {
+                "email": claims["email"],
+                "name": claims.get("name", ""),
+                "picture": claims.get("picture", ""),
+            }
+    return await get_google_user_info(tokens["access_token"])
 
 
 # ── JWT ──────────────────────────────────────────────────────────────────────
@@ -126,6 +243,36 @@ def decode_jwt(token: str) -> dict:
     return jwt.decode(token, os.getenv("JWT_SECRET", "dev-secret"), algorithms=["HS256"])
 
 
+_token_cache: dict[str, tuple[dict, float]] = {}
+
+
+def verify_jwt(token: str) -> dict:
+    """Como decode_jwt, pero reutiliza el payload de tokens verificados recientemente.
+
+    La entrada caduca a los TOKEN_CACHE_TTL segundos o al vencer el propio token,
+    lo que ocurra primero.
+    """
+    now = time.monotonic()
+    cached = _token_cache.get(token)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    payload = decode_jwt(token)
+    expires_at = now + TOKEN_CACHE_TTL
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        expires_at = min(expires_at, now + (exp - time.time()))
+    if len(_token_cache) >= TOKEN_CACHE_MAX:
+        # Purga vencidos; si sigue lleno, descarta el más antiguo (orden de inserción)
+        for key, (_, exp_at) in list(_token_cache.items()):
+            if exp_at <= now:
+                _token_cache.pop(key, None)
+        if len(_token_cache) >= TOKEN_CACHE_MAX:
+            _token_cache.pop(next(iter(list(_token_cache)), None), None)
+    _token_cache[token] = (payload, expires_at)
+    return payload
+
+
 # ── Dependencias FastAPI ─────────────────────────────────────────────────────
 
 def get_current_user(
@@ -140,12 +287,13 @@ def get_current_user(
         token = request.query_params.get("token")
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="No autenticado")
-    try:
-        payload = decode_jwt(token)
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
-    # Refresh from DB to get latest role/permissions
-    user = get_user_by_email(payload["email"])
+    with tracing.span("auth.get_current_user"):
+        try:
+            payload = verify_jwt(token)
+        except JWTError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+        # Índice in-memory: refleja el último rol/permisos guardados (por cualquier proceso)
+        user = get_user_by_email(payload["email"])
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario no encontrado")
     return user
@@ -0,0 +1,79 @@
+"""Micro-benchmark del camino de autenticación (get_current_user).
+
+Compara el camino original (decode JWT + lectura de users.json en cada request)
+con el índice in-memory + caché de tokens verificados.
+
+Uso (desde backend/):
+    python benchmarks/bench_auth.py [--users 1000] [--iterations 20000]
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import auth  # noqa: E402
+
+
+def _seed_users(n: int) -> list[dict]:
+    return [
+        {
+            "id": f"user-{i}",
+            "email": f"user{i}@interseguro.com.pe",
+            "name": f"Usuario {i}",
+            "picture": "",
+            "role": "user",
+            "allowed_bot_ids": [],
+            "created_at": "2024-01-01T00:00:00",
+            "last_login": None,
+        }
+        for i in range(n)
+    ]
+
+
+def _cold_lookup(token: str) -> dict:
+    payload = auth.decode_jwt(token)
+    return next(u for u in auth.load_users() if u["email"] == payload["email"])
+
+
+def _cached_lookup(token: str) -> dict:
+    payload = auth.verify_jwt(token)
+    return auth.get_user_by_email(payload["email"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        auth.DATA_DIR = Path(tmp)
+        auth.USERS_FILE = Path(tmp) / "users.json"
+        users = _seed_users(args.users)
+        auth.save_users(users)
+        token = auth.create_jwt(users[-1])
+
+        cold_iters = max(1, args.iterations // 100)
+        cold = timeit.timeit(lambda: _cold_lookup(token), number=cold_iters) / cold_iters
+        _cached_lookup(token)
+        cached = timeit.timeit(lambda: _cached_lookup(token), number=args.iterations) / args.iterations
+        index_only = timeit.timeit(
+            lambda: auth.get_user_by_email(users[-1]["email"]), number=args.iterations
+        ) / args.iterations
+
+    print(json.dumps({
+        "users": args.users,
+        "cold_us": round(cold * 1e6, 3),
+        "cached_us": round(cached * 1e6, 3),
+        "index_lookup_us": round(index_only * 1e6, 3),
+        "speedup": round(cold / cached, 1) if cached else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
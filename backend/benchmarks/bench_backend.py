@@ -0,0 +1,391 @@
+"""Suite de carga del backend: latencias de la API, del executor y de los streams SSE.
+
+Levanta la app real con uvicorn en un puerto local, sobre un directorio de datos
+temporal sembrado con executions.json / users.json sintéticos a cada escala, y bots
+de prueba (sleep, stdout verborrágico, resultados grandes). Mide por escala:
+
+- execute → start: desde queued_at hasta started_at de la ejecución (y el POST)
+- costo de update_execution (lectura-modificación-escritura de executions.json)
+- latencia de GET /api/executions y GET /api/stats
+- transferencia de los endpoints que se consultan por polling: bytes en el cable y
+  latencia sin comprimir, comprimidos (gzip/brotli) y revalidados con ETag (304)
+- fan-out SSE: N suscriptores a /stream-log de la misma ejecución
+- throughput de logs (líneas/s) y de resultados grandes (MB/s)
+
+El resultado es un JSON; con --compare se agrega la variación contra una corrida previa.
+
+Uso (desde backend/):
+    python benchmarks/bench_backend.py [--scales 1000 10000 100000] [--subscribers 200]
+        [--output bench.json] [--compare bench_anterior.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+ADMIN_EMAIL = "bench-admin@interseguro.com.pe"
+os.environ["SUPERADMIN_EMAIL"] = ADMIN_EMAIL
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+import analytics  # noqa: E402
+import archive  # noqa: E402
+import auth  # noqa: E402
+import executor  # noqa: E402
+import log_index  # noqa: E402
+import main  # noqa: E402
+import pipelines  # noqa: E402
+from models import Bot, BotExecution, User  # noqa: E402
+
+BOT_SCRIPTS = {
+    "sleep": (
+        "import os, time\n"
+        "time.sleep(float(os.environ.get('BOT_INPUT_SLEEP', '0')))\n"
+    ),
+    "chatty": (
+        "import os\n"
+        "for i in range(int(os.environ.get('BOT_INPUT_LINES', '10000'))):\n"
+        "    print(f'linea {i:08d} ' + 'x' * 80)\n"
+    ),
+    "large": (
+        "import os\n"
+        "path = os.path.join(os.environ['EJECUCION_RESULTADOS_DIR'], 'salida.bin')\n"
+        "chunk = os.urandom(1024 * 1024)\n"
+        "with open(path, 'wb') as f:\n"
+        "    for _ in range(int(os.environ.get('BOT_INPUT_MB', '50'))):\n"
+        "        f.write(chunk)\n"
+    ),
+}
+
+
+# ── Entorno aislado ──────────────────────────────────────────────────────────
+
+def _isolate(root: Path):
+    """Redirige los archivos de datos de todos los módulos al directorio temporal."""
+    data = root / "data"
+    data.mkdir(parents=True)
+    for mod in (main, executor, auth):
+        mod.DATA_DIR = data
+    main.BOTS_FILE = executor.BOTS_FILE = data / "bots.json"
+    main.EXECUTIONS_FILE = executor.EXECUTIONS_FILE = data / "executions.json"
+    main.SCHEDULES_FILE = data / "schedules.json"
+    auth.USERS_FILE = data / "users.json"
+    pipelines.PIPELINES_FILE = data / "pipelines.json"
+    pipelines.PIPELINE_RUNS_FILE = data / "pipeline_runs.json"
+    analytics.ANALYTICS_DIR = data / "analytics"
+    log_index.DB_FILE = data / "logs_index.db"
+    archive.ARCHIVE_DIR = data / "archive"
+    # Se mide executions.json a cada escala: que el motor no archive las sembradas
+    archive.ARCHIVE_AFTER_DAYS = 0
+    # run_folder se guarda relativo a backend/: las ejecuciones tienen que quedar dentro
+    main.EJECUCIONES_DIR = executor.EJECUCIONES_DIR = root / "ejecuciones"
+
+    bots_dir = root / "bots"
+    bots = []
+    for name, code in BOT_SCRIPTS.items():
+        script = bots_dir / name / "main.py"
+        script.parent.mkdir(parents=True)
+        script.write_text(code)
+        bots.append(Bot(
+            id=f"bench-{name}", name=f"Bench {name}", script_path=str(script),
+            page_slug=f"bench-{name}", supports_data_input=True,
+        ).model_dump())
+    (data / "bots.json").write_text(json.dumps(bots))
+
+
+def _seed(scale: int, bots: list[dict]):
+    """Escribe `scale` ejecuciones terminadas y scale/10 usuarios (más el admin)."""
+    rnd = random.Random(scale)
+    now = datetime.now()
+    template = BotExecution(bot_id="x", bot_name="x", triggered_by="x").model_dump()
+    executions = []
+    for i in range(scale):
+        bot = bots[i % len(bots)]
+        queued = now - timedelta(minutes=i * 5)
+        duration = round(rnd.uniform(1, 600), 2)
+        status = rnd.choices(["completed", "failed", "cancelled"], [85, 12, 3])[0]
+        executions.append({
+            **template,
+            "id": f"seed-{i:07d}",
+            "bot_id": bot["id"],
+            "bot_name": bot["name"],
+            "status": status,
+            "queued_at": queued.isoformat(),
+            "started_at": (queued + timedelta(seconds=rnd.uniform(0, 30))).isoformat(),
+            "completed_at": (queued + timedelta(seconds=duration)).isoformat(),
+            "triggered_by": f"user-{i % max(scale // 10, 1)}",
+            "triggered_by_name": f"Usuario {i % max(scale // 10, 1)}",
+            "run_folder": f"ejecuciones/{bot['id']}/{queued.strftime('%Y-%m-%d_%H-%M-%S')}",
+            "exit_code": 0 if status == "completed" else 1,
+            "duration_seconds": duration,
+            "input_data": {"servidores": f"srv{i % 50:02d}"},
+        })
+    executor._save_json(main.EXECUTIONS_FILE, executions)
+
+    users = [
+        User(id=f"user-{i}", email=f"user{i}@interseguro.com.pe", name=f"Usuario {i}").model_dump()
+        for i in range(max(scale // 10, 1))
+    ]
+    auth.save_users(users)
+    admin = auth.upsert_user(ADMIN_EMAIL, "Bench Admin", "")
+    return auth.create_jwt(admin)
+
+
+# ── Servidor ─────────────────────────────────────────────────────────────────
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Server:
+    def __init__(self):
+        self.port = _free_port()
+        self.server = uvicorn.Server(uvicorn.Config(
+            main.app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on",
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+# ── Mediciones ───────────────────────────────────────────────────────────────
+
+def _summary(samples: list[float]) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def _get_latency(client: httpx.AsyncClient, path: str, requests: int) -> dict:
+    samples = []
+    size = 0
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        r = await client.get(path)
+        samples.append(time.perf_counter() - t0)
+        r.raise_for_status()
+        size = len(r.content)
+    return {**_summary(samples), "response_bytes": size}
+
+
+async def _transfer(client: httpx.AsyncClient, path: str, requests: int) -> dict:
+    """Sin comprimir vs. comprimido vs. GET condicional con el ETag de la respuesta anterior."""
+    result = {}
+    etag = None
+    for mode in ("identity", "compressed", "not_modified"):
+        headers = {"Accept-Encoding": "identity"} if mode == "identity" else {}
+        if mode == "not_modified":
+            headers["If-None-Match"] = etag
+        samples = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            samples.append(time.perf_counter() - t0)
+            if r.status_code != 304:
+                r.raise_for_status()
+        etag = r.headers.get("etag")
+        result[mode] = {
+            **_summary(samples),
+            "status": r.status_code,
+            "encoding": r.headers.get("content-encoding", "identity"),
+            "wire_bytes": r.num_bytes_downloaded,
+        }
+    plain = result["identity"]["wire_bytes"] or 1
+    result["compressed_saving_pct"] = round((1 - result["compressed"]["wire_bytes"] / plain) * 100, 1)
+    result["not_modified_saving_pct"] = round((1 - result["not_modified"]["wire_bytes"] / plain) * 100, 1)
+    return result
+
+
+async def _wait_finished(client: httpx.AsyncClient, execution_id: str, timeout: float = 300) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        ex = (await client.get(f"/api/executions/{execution_id}")).json()
+        if ex["status"] not in ("queued", "running"):
+            return ex
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"La ejecución {execution_id} no terminó en {timeout}s")
+
+
+async def _execute(client: httpx.AsyncClient, bot: str, input_data: dict) -> tuple[dict, float]:
+    t0 = time.perf_counter()
+    r = await client.post(f"/api/bots/{bot}/execute", json={"input_data": input_data})
+    r.raise_for_status()
+    return r.json(), time.perf_counter() - t0
+
+
+async def _execute_to_start(client: httpx.AsyncClient, runs: int) -> dict:
+    post, start = [], []
+    for _ in range(runs):
+        ex, elapsed = await _execute(client, "bench-sleep", {"SLEEP": "0"})
+        post.append(elapsed)
+        done = await _wait_finished(client, ex["id"])
+        start.append((datetime.fromisoformat(done["started_at"]) - datetime.fromisoformat(done["queued_at"])).total_seconds())
+    return {"post": _summary(post), "queued_to_started": _summary(start)}
+
+
+def _update_cost(runs: int) -> dict:
+    executions = executor._load_json(main.EXECUTIONS_FILE)
+    target = executions[len(executions) // 2]["id"]
+    samples = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        executor.update_execution(target, {"error_message": f"bench {i}"})
+        samples.append(time.perf_counter() - t0)
+    return {**_summary(samples), "file_bytes": main.EXECUTIONS_FILE.stat().st_size}
+
+
+async def _sse_subscriber(base: str, headers: dict, path: str, t0: float, result: dict):
+    async with httpx.AsyncClient(base_url=base, headers=headers, timeout=None) as client:
+        async with client.stream("GET", path) as r:
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                result.setdefault("first", time.perf_counter() - t0)
+                if '"done"' in line:
+                    result["done"] = time.perf_counter() - t0
+                    return
+
+
+async def _sse_fanout(client: httpx.AsyncClient, base: str, headers: dict, subscribers: int) -> dict:
+    ex, _ = await _execute(client, "bench-chatty", {"LINES": "20000"})
+    t0 = time.perf_counter()
+    results = [{} for _ in range(subscribers)]
+    tasks = [
+        _sse_subscriber(base, headers, f"/api/executions/{ex['id']}/stream-log", t0, res)
+        for res in results
+    ]
+    await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), timeout=600)
+    return {
+        "subscribers": subscribers,
+        "completed": sum(1 for r in results if "done" in r),
+        "first_event": _summary([r["first"] for r in results if "first" in r]),
+        "done": _summary([r["done"] for r in results if "done" in r]),
+    }
+
+
+async def _log_throughput(client: httpx.AsyncClient, lines: int, megabytes: int) -> dict:
+    chatty, _ = await _execute(client, "bench-chatty", {"LINES": str(lines)})
+    chatty = await _wait_finished(client, chatty["id"])
+    large, _ = await _execute(client, "bench-large", {"MB": str(megabytes)})
+    large = await _wait_finished(client, large["id"])
+    return {
+        "lines": lines,
+        "lines_per_second": round(lines / max(chatty["duration_seconds"], 1e-3)),
+        "large_output_mb": megabytes,
+        "large_output_mb_per_second": round(megabytes / max(large["duration_seconds"], 1e-3), 1),
+    }
+
+
+async def _run_scale(base: str, token: str, args) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base, headers=headers, timeout=120) as client:
+        result = {
+            "executions_file_bytes": main.EXECUTIONS_FILE.stat().st_size,
+            "api_executions": await _get_latency(client, "/api/executions", args.requests),
+            "api_stats": await _get_latency(client, "/api/stats", args.requests),
+            "http_transfer": {
+                "api_executions": await _transfer(client, "/api/executions", args.requests),
+                "api_bot_executions": await _transfer(client, "/api/bots/bench-sleep/executions", args.requests),
+                "api_stats": await _transfer(client, "/api/stats", args.requests),
+                "execution_files": await _transfer(client, "/api/executions/seed-0000000/files", args.requests),
+            },
+            "update_execution": await asyncio.to_thread(_update_cost, args.requests),
+            "execute_to_start": await _execute_to_start(client, args.runs),
+        }
+        if args.subscribers:
+            result["sse_fanout"] = await _sse_fanout(client, base, headers, args.subscribers)
+    return result
+
+
+def _compare(current: dict, previous: dict, prefix: str = "") -> dict:
+    """Variación porcentual de cada métrica numérica presente en ambas corridas."""
+    diff = {}
+    for key, value in current.items():
+        old = previous.get(key) if isinstance(previous, dict) else None
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and isinstance(old, dict):
+            diff.update(_compare(value, old, f"{name}."))
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            diff[name] = {"before": old, "after": value, "change_pct": round((value - old) / old * 100, 1)}
+    return diff
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--requests", type=int, default=20, help="Requests por endpoint medido")
+    parser.add_argument("--runs", type=int, default=5, help="Ejecuciones para execute→start")
+    parser.add_argument("--subscribers", type=int, default=200, help="Suscriptores SSE (0 = omitir)")
+    parser.add_argument("--log-lines", type=int, default=200000)
+    parser.add_argument("--large-mb", type=int, default=200)
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("--compare", type=Path)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix=".bench_", dir=BACKEND_DIR))
+    try:
+        _isolate(root)
+        bots = json.loads(main.BOTS_FILE.read_text())
+        report = {
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "max_headless_workers": main.MAX_HEADLESS,
+            "scales": {},
+        }
+        token = _seed(args.scales[0], bots)
+        with _Server() as base:
+            for scale in args.scales:
+                token = _seed(scale, bots)
+                print(f"escala {scale}...", file=sys.stderr)
+                report["scales"][str(scale)] = asyncio.run(_run_scale(base, token, args))
+            headers = {"Authorization": f"Bearer {token}"}
+
+            async def _throughput():
+                async with httpx.AsyncClient(base_url=base, headers=headers, timeout=600) as client:
+                    return await _log_throughput(client, args.log_lines, args.large_mb)
+            report["log_throughput"] = asyncio.run(_throughput())
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.compare:
+        report["comparison"] = _compare(report, json.loads(args.compare.read_text()))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
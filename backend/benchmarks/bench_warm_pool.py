@@ -0,0 +1,88 @@
+"""Benchmark de latencia de arranque: subprocess en frío vs. intérprete del warm pool.
+
+Mide el tiempo hasta la primera línea de salida de un bot de prueba que importa
+módulos pesados (por defecto los del propio backend: pydantic, httpx, fastapi).
+
+Uso (desde backend/):
+    python benchmarks/bench_warm_pool.py [--runs 10] [--modules pydantic httpx fastapi]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import warm_pool  # noqa: E402
+
+
+async def _cold(script: Path) -> float:
+    t0 = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        "python", "-u", script.name, cwd=str(script.parent),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+    )
+    await proc.stdout.readline()
+    elapsed = time.perf_counter() - t0
+    await proc.wait()
+    return elapsed
+
+
+async def _warm(bot: dict, script: Path) -> float:
+    # Esperar a que el pool tenga un intérprete listo: el benchmark mide el camino caliente
+    while not warm_pool._idle.get(bot["id"]):
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(2)  # margen para que termine de importar los módulos
+    t0 = time.perf_counter()
+    warm = await warm_pool.acquire(bot)
+    await warm.submit(script, [], {})
+    result = None
+    while result is None:
+        line = await warm.proc.stdout.readline()
+        if not line:
+            break
+        if t0 is not None and line.strip():
+            elapsed = time.perf_counter() - t0
+            t0 = None
+        _, result = warm.split_sentinel(line)
+    await warm_pool.release(bot, warm, result)
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--modules", nargs="*", default=["pydantic", "httpx", "fastapi"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        script = Path(tmp) / "main.py"
+        script.write_text("".join(f"import {m}\n" for m in args.modules) + "print('listo')\n")
+        bot = {
+            "id": "bench",
+            "script_path": str(script),
+            "warm_pool_size": 1,
+            "warm_preload_modules": args.modules,
+        }
+
+        cold = [await _cold(script) for _ in range(args.runs)]
+        await warm_pool.start([bot])
+        warm = [await _warm(bot, script) for _ in range(args.runs)]
+        await warm_pool.shutdown()
+
+    print(json.dumps({
+        "modules": args.modules,
+        "runs": args.runs,
+        "cold_ms_median": round(statistics.median(cold) * 1000, 1),
+        "warm_ms_median": round(statistics.median(warm) * 1000, 1),
+        "speedup": round(statistics.median(cold) / statistics.median(warm), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
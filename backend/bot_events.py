@@ -0,0 +1,182 @@
+"""Canal estructurado de eventos de los bots (progreso, pasos, métricas, artefactos).
+
+El bot imprime en stdout una línea con el prefijo EVENT_PREFIX (se le pasa en la
+variable ORQUESTADOR_EVENT_PREFIX) seguido de un objeto JSON:
+
+    print('##orquestador {"type": "progress", "current": 4, "total": 10, "message": "Anubis"}', flush=True)
+
+Tipos reconocidos:
+- progress: percent (0-100) o current + total; message opcional.
+- step: name del paso en curso.
+- metrics: values (dict) que se mezcla con las métricas anteriores.
+- artifact: path relativo a la carpeta de la ejecución (logs/ o resultados/), label opcional.
+Cualquier otro type se guarda igual en el historial.
+
+Se usa stdout y no un FIFO/socket aparte porque funciona igual en Windows, en el
+warm pool y en los agentes remotos (que ya reenvían stdout). Las líneas de eventos
+no van a run.log: se agregan a logs/events.ndjson (con seq y ts) y se resumen en
+logs/progress.json. Ese resumen se copia al campo `progress` de la ejecución solo con
+el primer evento, al cambiar de paso, cada SYNC_INTERVAL y al terminar: reescribir
+executions.json con cada tanda de eventos de cada ejecución en curso no escala.
+Una línea con el prefijo pero JSON inválido se deja en el log tal cual.
+"""
+
+import functools
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import io_pool
+import storage
+
+EVENT_PREFIX = "##orquestador "
+EVENTS_FILENAME = "events.ndjson"
+PROGRESS_FILENAME = "progress.json"
+FLUSH_INTERVAL = 1.0
+SYNC_INTERVAL = 30.0
+MAX_ARTIFACTS = 200
+MAX_METRICS = 100
+
+
+def parse(line: str) -> Optional[dict]:
+    """El evento de una línea de stdout, o None si es una línea normal de log."""
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        event = json.loads(line[len(EVENT_PREFIX):])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(event, dict) or not isinstance(event.get("type"), str):
+        return None
+    return event
+
+
+def split_lines(text: str) -> tuple[str, list[dict]]:
+    """Separa un bloque de salida en (texto para run.log, eventos)."""
+    kept, events = [], []
+    for line in text.splitlines(keepends=True):
+        event = parse(line)
+        if event is None:
+            kept.append(line)
+        else:
+            events.append(event)
+    return "".join(kept), events
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def apply(progress: dict, event: dict):
+    """Actualiza in-place el resumen `progress` de una ejecución con un evento."""
+    kind = event["type"]
+    if kind == "progress":
+        percent = _number(event.get("percent"))
+        current, total = _number(event.get("current")), _number(event.get("total"))
+        if percent is None and current is not None and total:
+            percent = current / total * 100
+        if percent is not None:
+            progress["percent"] = round(min(max(percent, 0.0), 100.0), 1)
+        if current is not None and total is not None:
+            progress["current"], progress["total"] = event["current"], event["total"]
+        if "message" in event:
+            progress["message"] = str(event["message"])
+    elif kind == "step":
+        progress["step"] = str(event.get("name", ""))
+    elif kind == "metrics" and isinstance(event.get("values"), dict):
+        merged = {**progress.get("metrics", {}), **event["values"]}
+        progress["metrics"] = dict(list(merged.items())[-MAX_METRICS:])
+    elif kind == "artifact" and event.get("path"):
+        artifacts = [a for a in progress.get("artifacts", []) if a["path"] != event["path"]]
+        artifacts.append({"path": str(event["path"]), "label": str(event.get("label", ""))})
+        progress["artifacts"] = artifacts[-MAX_ARTIFACTS:]
+    progress["events"] = progress.get("events", 0) + 1
+    progress["updated_at"] = event["ts"]
+
+
+def _read_state(logs_dir: Path) -> Optional[dict]:
+    try:
+        with open(logs_dir / PROGRESS_FILENAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_state(logs_dir: Path, state: dict):
+    # Atómico: get_execution y el stream lo leen mientras el bot sigue reportando
+    path = logs_dir / PROGRESS_FILENAME
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_progress(logs_dir: Path) -> Optional[dict]:
+    """Resumen vivo de los eventos de una ejecución, o None si el bot no reportó ninguno."""
+    state = _read_state(logs_dir)
+    return state["progress"] if state else None
+
+
+def record(executions_file: Path, execution_id: str, logs_dir: Path, events: list[dict]):
+    """Agrega los eventos a events.ndjson y actualiza el resumen en progress.json.
+    executions.json se reescribe solo con el primer evento, al cambiar de paso o si
+    pasó SYNC_INTERVAL desde la última copia; el resumen final lo guarda
+    executor.finish_execution."""
+    if not events:
+        return
+    state = _read_state(logs_dir) or {"progress": {}, "synced_at": None}
+    progress = state["progress"]
+    lines = []
+    step_changed = False
+    for event in events:
+        event = {**event, "seq": progress.get("events", 0) + 1, "ts": event.get("ts") or datetime.now().isoformat()}
+        if event["type"] == "step" and str(event.get("name", "")) != progress.get("step"):
+            step_changed = True
+        apply(progress, event)
+        lines.append(json.dumps(event, ensure_ascii=False) + "\n")
+    with open(logs_dir / EVENTS_FILENAME, "a", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    now = time.time()
+    if state["synced_at"] is None or step_changed or now - state["synced_at"] >= SYNC_INTERVAL:
+        with storage.transaction(executions_file) as executions:
+            ex = next((e for e in executions if e["id"] == execution_id), None)
+            if ex is not None:
+                ex["progress"] = progress
+        state["synced_at"] = now
+    _write_state(logs_dir, state)
+
+
+def read_events(logs_dir: Path, after: int = 0) -> list[dict]:
+    path = logs_dir / EVENTS_FILENAME
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return [e for e in events if e.get("seq", 0) > after]
+
+
+class EventSink:
+    """Separa los eventos del stdout que lee el executor y los persiste como mucho cada
+    FLUSH_INTERVAL (un bot que reporta cada línea no escribe a disco cada línea)."""
+
+    def __init__(self, executions_file: Path, execution_id: str, logs_dir: Path):
+        self._writer = io_pool.BatchWriter(
+            functools.partial(record, executions_file, execution_id, logs_dir), FLUSH_INTERVAL,
+        )
+
+    def feed(self, line: str) -> bool:
+        """True si la línea era un evento (no va al log)."""
+        event = parse(line)
+        if event is None:
+            return False
+        self._writer.add({**event, "ts": datetime.now().isoformat()})
+        return True
+
+    async def close(self):
+        await self._writer.close()
@@ -0,0 +1,135 @@
+"""Lista de servidores de un bot, leída del CSV Consolidado*.csv de su carpeta.
+
+La página del bot la pide en cada carga y el CSV puede tener miles de filas. El
+resultado se guarda ya serializado por carpeta, y se valida en cada request con dos
+stat: el de la carpeta (cambia si se agrega, borra o renombra un Consolidado*.csv) y
+el del CSV elegido (mtime, tamaño, inode). Un CSV editado se vuelve a leer en la
+request siguiente; mientras no cambia, la respuesta no cuesta ni un glob.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+CSV_PATTERN = "Consolidado*.csv"
+DEFAULT_SSH_PORT = 22
+
+
+@dataclass(frozen=True)
+class ServerList:
+    body: bytes  # JSON listo para mandar
+    etag: str
+    count: int
+
+
+@dataclass
+class _Entry:
+    dir_stamp: tuple
+    csv_path: Optional[Path]
+    csv_stamp: tuple
+    result: ServerList
+
+
+_cache: dict[Path, _Entry] = {}
+_lock = threading.Lock()
+_EMPTY = ServerList(b"[]", 'W/"servers-empty"', 0)
+
+
+def _stamp(path: Path) -> tuple:
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def parse(csv_path: Path) -> list[dict]:
+    """Un servidor por nombre (orden de aparición) con sus rutas sin repetir."""
+    servers: dict[str, dict] = {}
+    seen: dict[str, set[str]] = {}
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            tipo = (row.get("Tipo") or "").strip().lower() or "windows"
+            name = (row.get("Servidor") or "").strip()
+            host = (row.get("Host") or "").strip()
+            port_str = (row.get("Puerto") or "").strip()
+            path = (row.get("Ruta") or "").strip()
+
+            if not name or not path:
+                continue
+
+            if name not in servers:
+                servers[name] = {
+                    "id": name,
+                    "name": name,
+                    "tipo": tipo,
+                    "host": host,
+                    "port": int(port_str) if port_str else DEFAULT_SSH_PORT,
+                    "rutas": [],
+                }
+                seen[name] = set()
+
+            if path not in seen[name]:
+                seen[name].add(path)
+                servers[name]["rutas"].append(path)
+
+    result = []
+    for info in servers.values():
+        rutas = info["rutas"]
+        if len(rutas) == 1:
+            desc = rutas[0]
+        else:
+            desc = f"{rutas[0]}  (+{len(rutas) - 1} más)"
+        result.append({
+            "id": info["id"],
+            "name": info["name"],
+            "tipo": info["tipo"],
+            "host": info["host"],
+            "rutas_count": len(rutas),
+            "descripcion": desc,
+        })
+    return result
+
+
+def load(bot_dir: Path) -> ServerList:
+    """Servidores del CSV Consolidado de la carpeta del bot (cacheado, ver arriba).
+    Los errores de lectura del CSV se propagan y no se cachean."""
+    try:
+        dir_stamp = _stamp(bot_dir)
+    except FileNotFoundError:
+        return _EMPTY
+    entry = _cache.get(bot_dir)
+    if entry is not None and entry.dir_stamp == dir_stamp:
+        if entry.csv_path is None:
+            return entry.result
+        try:
+            if _stamp(entry.csv_path) == entry.csv_stamp:
+                return entry.result
+        except FileNotFoundError:
+            pass
+
+    csv_files = sorted(bot_dir.glob(CSV_PATTERN))
+    if not csv_files:
+        entry = _Entry(dir_stamp, None, (), _EMPTY)
+    else:
+        csv_path = csv_files[0]
+        # Stat antes de leer: si el CSV cambia mientras se lee, la próxima request lo relee
+        csv_stamp = _stamp(csv_path)
+        if entry is not None and entry.csv_path == csv_path and entry.csv_stamp == csv_stamp:
+            # Cambió otra cosa en la carpeta del bot (logs, resultados): el CSV es el mismo
+            entry = _Entry(dir_stamp, csv_path, csv_stamp, entry.result)
+        else:
+            servers = parse(csv_path)
+            body = json.dumps(servers, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            etag = 'W/"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+            entry = _Entry(dir_stamp, csv_path, csv_stamp, ServerList(body, etag, len(servers)))
+    with _lock:
+        _cache[bot_dir] = entry
+    return entry.result
+
+
+def server_ids(bot_dir: Path) -> list[str]:
+    """Ids de los servidores (p. ej. valores por defecto de un fan-out)."""
+    return [server["id"] for server in json.loads(load(bot_dir).body)]
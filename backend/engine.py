@@ -0,0 +1,244 @@
+"""Separación entre la API HTTP y el motor de ejecución (modo multi-proceso).
+
+El estado de ejecución vive en memoria de un solo proceso: colas y workers
+(queue_manager), procesos en curso y datos sensibles (executor), ventanas de
+fan-out, secretos de pipelines, agentes remotos, scheduler y warm pool. Para servir
+HTTP con varios procesos sin duplicar nada de eso, ORQUESTADOR_ROLE define el rol:
+
+- standalone (default): un solo proceso hace todo, como siempre.
+- engine: `python main.py engine`. Corre colas, scheduler, workers y un servidor
+  IPC local; no sirve HTTP.
+- api: `ORQUESTADOR_ROLE=api uvicorn main:app --workers N`. Solo HTTP; cada
+  operación sobre el estado del motor se reenvía al engine.
+
+Las funciones que tocan ese estado se marcan con @command: en los roles standalone
+y engine se llaman directo; en el rol api viajan por el canal IPC (un socket Unix,
+o TCP en 127.0.0.1 donde no hay AF_UNIX, como Windows) como una línea JSON por
+conexión. Argumentos y resultados deben ser serializables a JSON.
+
+Del lado del engine los comandos sync corren en el event loop, igual que en
+standalone cuando los llama un handler async: tocan colas y futures del loop, que no
+son thread-safe. Solo los marcados @command(blocking=True), que hacen I/O y no tocan
+estado del loop, van a un thread.
+
+Los archivos JSON los comparten todos los procesos: storage usa además un lock
+entre procesos (ver storage.set_interprocess).
+"""
+
+import asyncio
+import functools
+import hmac
+import json
+import logging
+import os
+import socket
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent / "data"
+ENGINE_TOKEN = os.getenv("ENGINE_TOKEN", "")
+CALL_TIMEOUT = 30          # Operaciones sync (el long-poll de agentes es async y sin límite)
+READ_LIMIT = 16 * 1024 * 1024
+
+ROLES = ("standalone", "engine", "api")
+ROLE = "standalone"
+
+# nombre → función original (la que corre el engine)
+_commands: dict[str, Callable] = {}
+# Comandos sync que el engine corre en un thread (ver docstring del módulo)
+_blocking: set[str] = set()
+
+
+class EngineError(Exception):
+    """Error con status HTTP que cruza el canal IPC tal cual (main lo convierte en respuesta)."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def set_role(role: str):
+    global ROLE
+    if role not in ROLES:
+        raise ValueError(f"ORQUESTADOR_ROLE inválido: {role}")
+    ROLE = role
+    storage.set_interprocess(role != "standalone")
+
+
+def _address() -> str:
+    address = os.getenv("ENGINE_ADDRESS", "")
+    if address:
+        return address
+    if hasattr(socket, "AF_UNIX") and os.name != "nt":
+        return f"unix:{DATA_DIR / 'engine.sock'}"
+    return "tcp:127.0.0.1:8765"
+
+
+def _parse(address: str) -> tuple[str, Any]:
+    kind, _, rest = address.partition(":")
+    if kind == "unix":
+        return kind, rest
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return kind, (host, int(port))
+    raise ValueError(f"ENGINE_ADDRESS inválido: {address}")
+
+
+# ── Cliente (rol api) ────────────────────────────────────────────────────────
+
+def _request(name: str, args: tuple, kwargs: dict) -> bytes:
+    return json.dumps({"token": ENGINE_TOKEN, "command": name, "args": args, "kwargs": kwargs}).encode() + b"\n"
+
+
+def _result(line: bytes) -> Any:
+    if not line:
+        raise EngineError(503, "El motor de ejecución cerró la conexión")
+    response = json.loads(line)
+    if "error" in response:
+        raise EngineError(response["error"]["status"], response["error"]["detail"])
+    return response.get("result")
+
+
+def _call_sync(name: str, args: tuple, kwargs: dict) -> Any:
+    kind, target = _parse(_address())
+    try:
+        if kind == "unix":
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CALL_TIMEOUT)
+            sock.connect(target)
+        else:
+            sock = socket.create_connection(target, timeout=CALL_TIMEOUT)
+        with sock, sock.makefile("rb") as f:
+            sock.sendall(_request(name, args, kwargs))
+            line = f.readline()
+    except OSError as e:
+        raise EngineError(503, f"Motor de ejecución no disponible: {e}")
+    return _result(line)
+
+
+async def _call_async(name: str, args: tuple, kwargs: dict) -> Any:
+    kind, target = _parse(_address())
+    try:
+        if kind == "unix":
+            reader, writer = await asyncio.open_unix_connection(target, limit=READ_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(*target, limit=READ_LIMIT)
+    except OSError as e:
+        raise EngineError(503, f"Motor de ejecución no disponible: {e}")
+    try:
+        writer.write(_request(name, args, kwargs))
+        await writer.drain()
+        # Si esta tarea se cancela, cerrar la conexión cancela también el comando en el engine
+        line = await reader.readline()
+    finally:
+        writer.close()
+    return _result(line)
+
+
+def command(fn: Optional[Callable] = None, *, blocking: bool = False) -> Callable:
+    """Marca una función que opera sobre el estado del motor (ver docstring del módulo).
+    `blocking`: función sync que hace I/O sin tocar estado del loop; el engine la corre
+    en un thread."""
+    if fn is None:
+        return functools.partial(command, blocking=blocking)
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    _commands[name] = fn
+    if blocking:
+        _blocking.add(name)
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if ROLE == "api":
+                return await _call_async(name, args, kwargs)
+            return await fn(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if ROLE == "api":
+            return _call_sync(name, args, kwargs)
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+# ── Servidor (rol engine) ────────────────────────────────────────────────────
+
+def _error(status: int, detail: str) -> dict:
+    return {"error": {"status": status, "detail": detail}}
+
+
+def _outcome(name: str, call: Callable[[], Any]) -> dict:
+    try:
+        return {"result": call()}
+    except EngineError as e:
+        return _error(e.status, e.detail)
+    except Exception as e:
+        logger.exception("Comando %s falló", name)
+        return _error(500, str(e))
+
+
+async def _dispatch(request: dict, reader: asyncio.StreamReader) -> Optional[dict]:
+    if ENGINE_TOKEN and not hmac.compare_digest(str(request.get("token", "")), ENGINE_TOKEN):
+        return _error(401, "Token del motor inválido")
+    name = request.get("command", "")
+    fn = _commands.get(name)
+    if fn is None:
+        return _error(404, f"Comando desconocido: {name}")
+    args, kwargs = request.get("args", []), request.get("kwargs", {})
+    if asyncio.iscoroutinefunction(fn):
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+    elif name in _blocking:
+        task = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+    else:
+        # En el loop y sin await en el medio: no hace falta vigilar si el cliente se fue
+        return _outcome(name, lambda: fn(*args, **kwargs))
+    # El cliente no escribe nada más: EOF = se fue (p. ej. el agente cortó el long-poll)
+    gone = asyncio.ensure_future(reader.read(1))
+    try:
+        await asyncio.wait({task, gone}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        gone.cancel()
+    if not task.done():
+        task.cancel()
+        return None
+    return _outcome(name, task.result)
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        line = await reader.readline()
+        if not line:
+            return
+        try:
+            response = await _dispatch(json.loads(line), reader)
+        except json.JSONDecodeError:
+            response = _error(400, "Solicitud inválida")
+        if response is not None:
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve() -> asyncio.AbstractServer:
+    address = _address()
+    kind, target = _parse(address)
+    if kind == "unix":
+        Path(target).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(_handle, target, limit=READ_LIMIT)
+        os.chmod(target, 0o600)
+    else:
+        server = await asyncio.start_server(_handle, *target, limit=READ_LIMIT)
+    logger.info("Motor de ejecución escuchando en %s (%d comandos)", address, len(_commands))
+    return server
+
+
+set_role(os.getenv("ORQUESTADOR_ROLE", "standalone"))
@@ -5,19 +5,35 @@ Estructura: ejecuciones/<bot_id>/<YYYY-MM-DD_HH-MM-SS>/logs/ y resultados/
 """
 
 import asyncio
-import json
+import functools
 import logging
 import os
+import re
+import shutil
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+import bot_events
+import engine
+import io_pool
+import log_index
+import metrics
+import resource_limits
+import resource_monitor
+import storage
+import tracing
+import warm_pool
+
 logger = logging.getLogger(__name__)
 
 DATA_DIR = Path(__file__).parent / "data"
 BOTS_FILE = DATA_DIR / "bots.json"
 EXECUTIONS_FILE = DATA_DIR / "executions.json"
 EJECUCIONES_DIR = Path(__file__).parent / "ejecuciones"
+# El stream de logs (SSE) relee run.log cada 1 s: juntar las líneas de este intervalo
+# ahorra un salto al pool por línea sin que se note en vivo
+LOG_FLUSH_INTERVAL = 0.25
 
 # Mapa de ejecuciones en curso → proceso asyncio.subprocess.Process
 _running_procs: dict[str, asyncio.subprocess.Process] = {}
@@ -28,8 +44,10 @@ _execution_secrets: dict[str, dict[str, str]] = {}
 SENSITIVE_ENV_KEYS = {"LINUX_KEY_PASS"}
 
 
-def store_execution_secret(execution_id: str, key: str, value: str):
-    """Guarda un dato sensible en memoria para una ejecución."""
+@engine.command
+async def store_execution_secret(execution_id: str, key: str, value: str):
+    """Guarda un dato sensible en memoria para una ejecución (async: en el rol api el
+    reenvío al engine no bloquea el event loop)."""
     if execution_id not in _execution_secrets:
         _execution_secrets[execution_id] = {}
     _execution_secrets[execution_id][key] = value
@@ -43,16 +61,11 @@ def _pop_execution_secrets(execution_id: str) -> dict[str, str]:
 # ── Helpers de persistencia ──────────────────────────────────────────────────
 
 def _load_json(path: Path) -> list[dict]:
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load(path)
 
 
 def _save_json(path: Path, data: list[dict]):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    storage.save(path, data)
 
 
 def load_execution(execution_id: str) -> Optional[dict]:
@@ -60,12 +73,11 @@ def load_execution(execution_id: str) -> Optional[dict]:
 
 
 def update_execution(execution_id: str, fields: dict):
-    executions = _load_json(EXECUTIONS_FILE)
-    for ex in executions:
-        if ex["id"] == execution_id:
-            ex.update(fields)
-            break
-    _save_json(EXECUTIONS_FILE, executions)
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        for ex in executions:
+            if ex["id"] == execution_id:
+                ex.update(fields)
+                break
 
 
 def load_bot(bot_id: str) -> Optional[dict]:
@@ -80,6 +92,7 @@ def _unregister_proc(execution_id: str):
     _running_procs.pop(execution_id, None)
 
 
+@engine.command(blocking=True)
 def cancel_running_process(execution_id: str) -> bool:
     """Intenta terminar el proceso de una ejecución en curso."""
     proc = _running_procs.get(execution_id)
@@ -110,9 +123,90 @@ def cancel_running_process(execution_id: str) -> bool:
 
 # ── Ejecución principal ──────────────────────────────────────────────────────
 
+def create_run_folder(bot: dict, execution_id: str) -> Path:
+    """Crea ejecuciones/<bot>/<timestamp>/{logs,resultados} y retorna la carpeta."""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    run_folder = EJECUCIONES_DIR / bot["id"] / timestamp
+    if run_folder.exists():
+        # Varias ejecuciones del mismo bot en el mismo segundo (lotes, workers en paralelo)
+        run_folder = EJECUCIONES_DIR / bot["id"] / f"{timestamp}_{execution_id[:8]}"
+    (run_folder / "logs").mkdir(parents=True, exist_ok=True)
+    (run_folder / "resultados").mkdir(parents=True, exist_ok=True)
+    return run_folder
+
+
+def mark_started(execution: dict, bot: dict, run_folder: Path, extra: Optional[dict] = None):
+    waited = metrics.elapsed_since(execution.get("queued_at"))
+    if waited is not None:
+        metrics.QUEUE_WAIT.observe(max(waited, 0.0), bot_id=bot["id"])
+    started_at = datetime.now().isoformat()
+    log_index.register_run(execution["id"], bot["id"], started_at)
+    update_execution(execution["id"], {
+        "status": "running",
+        "started_at": started_at,
+        "run_folder": str(run_folder.relative_to(Path(__file__).parent)),
+        "progress": None,
+        **(extra or {}),
+    })
+
+
+def input_env(execution: dict) -> dict[str, str]:
+    """Variables BOT_INPUT_* de la ejecución, incluidos los datos sensibles en memoria
+    (se consumen: solo se entregan una vez)."""
+    env = {}
+    input_data: dict = execution.get("input_data", {})
+    for key, value in input_data.items():
+        env[f"BOT_INPUT_{key.upper()}"] = str(value)
+    for key, value in _pop_execution_secrets(execution["id"]).items():
+        env[f"BOT_INPUT_{key.upper()}"] = str(value)
+    return env
+
+
+def _write_lines(f, lines: list[str]):
+    f.write("".join(lines))
+    f.flush()
+
+
+def _append_log(log_file: Path, text: str):
+    with open(log_file, "a", encoding="utf-8") as lf:
+        lf.write(text)
+
+
+def finish_execution(execution_id: str, bot: dict, fields: dict, duration: float) -> str:
+    """Guarda el resultado final de una ejecución y retorna su status."""
+    current = load_execution(execution_id)
+    # Resumen final de los eventos del bot: durante la ejecución executions.json
+    # solo tiene copias espaciadas (ver bot_events.record)
+    progress = None
+    if current and current.get("run_folder"):
+        progress = bot_events.load_progress(Path(__file__).parent / current["run_folder"] / "logs")
+    final_progress = {"progress": progress} if progress else {}
+    if current and current.get("status") == "cancelled":
+        # La cancelación ya registró estado y motivo: no pisarlos con el exit code del kill
+        status = "cancelled"
+        update_execution(execution_id, {
+            "duration_seconds": round(duration, 2),
+            "resources": fields.get("resources", {}),
+            **final_progress,
+        })
+    else:
+        status = fields["status"]
+        update_execution(execution_id, {
+            **fields,
+            **final_progress,
+            "completed_at": datetime.now().isoformat(),
+            "duration_seconds": round(duration, 2),
+        })
+    log_index.set_status(execution_id, status)
+    metrics.RUN_DURATION.observe(duration, bot_id=bot["id"], status=status)
+    logger.info("Ejecución %s finalizada con status=%s (%.1fs)", execution_id, status, duration)
+    return status
+
+
 async def run_execution(execution_id: str):
-    """Worker: ejecuta un bot y actualiza el estado de la ejecución."""
-    execution = load_execution(execution_id)
+    """Worker: ejecuta un bot y actualiza el estado de la ejecución.
+    Todo el I/O de disco va por io_pool para no frenar el event loop."""
+    execution = await io_pool.run(load_execution, execution_id)
     if not execution:
         logger.error("Ejecución %s no encontrada", execution_id)
         return
@@ -122,9 +216,9 @@ async def run_execution(execution_id: str):
         logger.info("Ejecución %s ya cancelada antes de iniciar", execution_id)
         return
 
-    bot = load_bot(execution["bot_id"])
+    bot = await io_pool.run(load_bot, execution["bot_id"])
     if not bot:
-        update_execution(execution_id, {
+        await io_pool.run(update_execution, execution_id, {
             "status": "failed",
             "completed_at": datetime.now().isoformat(),
             "error_message": f"Bot {execution['bot_id']} no encontrado",
@@ -132,20 +226,10 @@ async def run_execution(execution_id: str):
         return
 
     # Crear carpetas de salida
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    run_folder = EJECUCIONES_DIR / bot["id"] / timestamp
+    run_folder = await io_pool.run(create_run_folder, bot, execution_id)
     logs_dir = run_folder / "logs"
     resultados_dir = run_folder / "resultados"
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    resultados_dir.mkdir(parents=True, exist_ok=True)
-
-    run_folder_rel = str(run_folder.relative_to(Path(__file__).parent))
-
-    update_execution(execution_id, {
-        "status": "running",
-        "started_at": datetime.now().isoformat(),
-        "run_folder": run_folder_rel,
-    })
+    await io_pool.run(mark_started, execution, bot, run_folder)
 
     script_path = Path(bot["script_path"])
     script_args = bot.get("script_args", [])
@@ -156,70 +240,158 @@ async def run_execution(execution_id: str):
         "EJECUCION_DIR": str(run_folder.resolve()),
         "EJECUCION_LOGS_DIR": str(logs_dir.resolve()),
         "EJECUCION_RESULTADOS_DIR": str(resultados_dir.resolve()),
+        "ORQUESTADOR_EVENT_PREFIX": bot_events.EVENT_PREFIX,
     }
 
-    input_data: dict = execution.get("input_data", {})
-    for key, value in input_data.items():
-        env[f"BOT_INPUT_{key.upper()}"] = str(value)
+    # Carpetas de los pasos previos cuando la ejecución es parte de un pipeline
+    upstream: dict = execution.get("upstream_run_folders") or {}
+    for step_id, folder in upstream.items():
+        if folder:
+            step_key = re.sub(r"[^A-Z0-9]+", "_", step_id.upper()).strip("_")
+            env[f"EJECUCION_UPSTREAM_{step_key}_DIR"] = str((Path(__file__).parent / folder).resolve())
+    if len(upstream) == 1 and next(iter(upstream.values())):
+        env["EJECUCION_UPSTREAM_DIR"] = str((Path(__file__).parent / next(iter(upstream.values()))).resolve())
 
-    secrets = _pop_execution_secrets(execution_id)
-    for key, value in secrets.items():
-        env[f"BOT_INPUT_{key.upper()}"] = str(value)
+    env.update(input_env(execution))
 
     start_time = datetime.now()
     exit_code = -1
 
+    warm: Optional[warm_pool.WarmProcess] = None
+    warm_result: Optional[dict] = None
+    monitor: Optional[resource_monitor.ResourceMonitor] = None
+    resources: dict = {}
+    failure_reason: Optional[str] = None
+    timed_out = False
+    baseline: Optional[dict] = None
+    events = bot_events.EventSink(EXECUTIONS_FILE, execution_id, logs_dir)
+    indexer = log_index.LogIndexer(execution_id)
+
     try:
-        # -u para stdout/stderr sin buffer → los logs llegan en tiempo real
-        proc = await asyncio.create_subprocess_exec(
-            "python", "-u", str(script_path.name), *script_args,
-            cwd=str(script_path.parent),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
-            env=env,
-        )
+        with tracing.span("executor.spawn", bot_id=bot["id"]) as spawn_span:
+            warm = await warm_pool.acquire(bot)
+            if warm:
+                # Intérprete pre-lanzado con los módulos pesados del bot ya importados
+                proc = warm.proc
+                # Lo que el intérprete ya consumió (precarga, trabajos anteriores) no es de esta ejecución
+                baseline = await io_pool.run(resource_monitor.sample_tree, proc.pid)
+                await warm.submit(script_path, script_args, env, resource_limits.job_limits(bot))
+            else:
+                # -u para stdout/stderr sin buffer → los logs llegan en tiempo real
+                proc = await asyncio.create_subprocess_exec(
+                    "python", "-u", str(script_path.name), *script_args,
+                    cwd=str(script_path.parent),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    env=env,
+                    **resource_limits.spawn_kwargs(bot),
+                )
+                resource_limits.apply_after_spawn(bot, proc.pid)
+            if spawn_span is not None:
+                spawn_span["attributes"]["warm"] = warm is not None
 
         _register_proc(execution_id, proc)
+        monitor = resource_monitor.ResourceMonitor(
+            proc.pid,
+            logs_dir / resource_monitor.RESOURCES_FILENAME,
+            max_rss_kb=resource_limits.memory_limit_kb(bot),
+            on_exceeded=proc.kill,
+            baseline=baseline,
+        )
+        monitor.start()
 
-        # Leer stdout y escribir a log en tiempo real
-        with open(log_file, "w", encoding="utf-8") as lf:
-            while True:
-                line = await proc.stdout.readline()
-                if not line:
-                    break
-                decoded = line.decode("utf-8", errors="replace")
-                lf.write(decoded)
-                lf.flush()
-
-        exit_code = await proc.wait()
+        # Leer stdout y escribir a log en tiempo real (las líneas de eventos van aparte)
+        async def _pump() -> Optional[dict]:
+            result = None
+            lf = await io_pool.run(open, log_file, "w", encoding="utf-8")
+            writer = io_pool.BatchWriter(functools.partial(_write_lines, lf), LOG_FLUSH_INTERVAL)
+            try:
+                while True:
+                    line = await proc.stdout.readline()
+                    if not line:
+                        break
+                    if warm:
+                        line, result = warm.split_sentinel(line)
+                    decoded = line.decode("utf-8", errors="replace")
+                    if decoded and not events.feed(decoded):
+                        writer.add(decoded)
+                        indexer.add(decoded)
+                    if result is not None:
+                        break
+            finally:
+                await writer.close()
+                await io_pool.run(lf.close)
+            return result
+
+        try:
+            warm_result = await asyncio.wait_for(_pump(), timeout=resource_limits.wall_limit_seconds(bot))
+        except asyncio.TimeoutError:
+            timed_out = True
+            proc.kill()
+        await monitor.final_sample()
+
+        if warm_result is not None:
+            exit_code = int(warm_result.get("exit_code", 1))
+        else:
+            exit_code = await proc.wait()
         status = "completed" if exit_code == 0 else "failed"
         error_msg = "" if exit_code == 0 else f"El proceso terminó con código {exit_code}"
+        if status == "failed":
+            limit_failure = resource_limits.classify_failure(
+                bot, exit_code, log_file, timed_out, monitor.limit_exceeded, monitor.cpu_seconds,
+            )
+            if limit_failure:
+                failure_reason, error_msg = limit_failure
+                await io_pool.run(_append_log, log_file, f"\n[EXECUTOR] {error_msg}\n")
+                indexer.add(f"\n[EXECUTOR] {error_msg}\n")
 
     except Exception as e:
         logger.exception("Error ejecutando bot %s", bot["id"])
         status = "failed"
         error_msg = str(e)
         # Escribir error en log
-        with open(log_file, "a", encoding="utf-8") as lf:
-            lf.write(f"\n[EXECUTOR ERROR] {e}\n")
+        await io_pool.run(_append_log, log_file, f"\n[EXECUTOR ERROR] {e}\n")
+        indexer.add(f"\n[EXECUTOR ERROR] {e}\n")
 
     finally:
         _unregister_proc(execution_id)
+        await events.close()
+        await indexer.close()
+        if monitor:
+            resources = await monitor.stop()
+        if warm:
+            await warm_pool.release(bot, warm, warm_result)
 
     duration = (datetime.now() - start_time).total_seconds()
-
-    update_execution(execution_id, {
+    await io_pool.run(finish_execution, execution_id, bot, {
         "status": status,
-        "completed_at": datetime.now().isoformat(),
         "exit_code": exit_code,
         "error_message": error_msg,
-        "duration_seconds": round(duration, 2),
-    })
-    logger.info("Ejecución %s finalizada con status=%s (%.1fs)", execution_id, status, duration)
+        "resources": resources,
+        "failure_reason": failure_reason,
+    }, duration)
 
 
 # ── Helpers para listar archivos de una ejecución ────────────────────────────
 
+def link_tree(src_root: Path, dst_root: Path) -> int:
+    """Replica los archivos de src_root en dst_root con hardlinks (copia si el FS no lo permite).
+    Retorna la cantidad de archivos replicados."""
+    count = 0
+    for f in src_root.rglob("*"):
+        if not f.is_file():
+            continue
+        dst = dst_root / f.relative_to(src_root)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(f, dst)
+        except OSError:
+            shutil.copy2(f, dst)
+        count += 1
+    return count
+
+
+@tracing.traced("executor.list_files")
 def list_execution_files(run_folder_rel: str) -> dict:
     """Retorna listas de archivos en logs/ y resultados/ con estructura jerárquica."""
     base = Path(__file__).parent / run_folder_rel
@@ -0,0 +1,191 @@
+"""Fan-out de ejecuciones para el Orquestador de Bots.
+
+Una ejecución "padre" se divide en N ejecuciones hijas, una por valor (p. ej. un
+servidor del CSV Consolidado). Las hijas pasan por las colas normales con una
+ventana de como máximo `max_parallel` encoladas a la vez; al terminar la última,
+el paso de join fusiona sus resultados/ en la carpeta del padre:
+
+    ejecuciones/<bot_id>/<timestamp>_fanout_<id>/resultados/<valor>/...
+"""
+
+import logging
+import re
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import engine
+import executor
+import io_pool
+import queue_manager
+import storage
+from models import BotExecution
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+FINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+
+# parent_id → hijas aún no entregadas a la cola (ventana de concurrencia)
+_pending: dict[str, deque[str]] = {}
+# parent_id → requires_ui del bot, para saber a qué cola enviar las siguientes hijas
+_requires_ui: dict[str, bool] = {}
+# parent_id → agent_tags del bot
+_tags: dict[str, list[str]] = {}
+# Padres con join en curso (dos hijas pueden terminar a la vez)
+_joining: set[str] = set()
+
+
+def _safe_folder_name(value: str) -> str:
+    return re.sub(r"[^\w.\-]+", "_", value).strip("._") or "item"
+
+
+@engine.command
+async def start_fanout(
+    bot: dict,
+    input_data: dict,
+    secrets: dict[str, str],
+    fanout_key: str,
+    values: list[str],
+    max_parallel: int,
+    triggered_by: str,
+    triggered_by_name: str,
+) -> tuple[dict, list[dict]]:
+    """Crea padre + hijas en una sola transacción y encola la primera ventana."""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    parent = BotExecution(
+        bot_id=bot["id"],
+        bot_name=bot["name"],
+        status="running",
+        started_at=datetime.now().isoformat(),
+        triggered_by=triggered_by,
+        triggered_by_name=triggered_by_name,
+        input_data={**input_data, fanout_key: ",".join(values)},
+    )
+    parent_folder = executor.EJECUCIONES_DIR / bot["id"] / f"{timestamp}_fanout_{parent.id[:8]}"
+    parent.run_folder = str(parent_folder.relative_to(BASE_DIR))
+
+    children = [
+        BotExecution(
+            bot_id=bot["id"],
+            bot_name=bot["name"],
+            triggered_by=triggered_by,
+            triggered_by_name=triggered_by_name,
+            input_data={**input_data, fanout_key: value},
+            parent_id=parent.id,
+            fanout_value=value,
+        )
+        for value in values
+    ]
+    parent.children_ids = [c.id for c in children]
+
+    await io_pool.run(_persist, parent_folder, [parent.model_dump()] + [c.model_dump() for c in reversed(children)])
+
+    for child in children:
+        for key, val in secrets.items():
+            await executor.store_execution_secret(child.id, key, val)
+
+    requires_ui = bot.get("requires_ui", False)
+    window = max(1, max_parallel)
+    _requires_ui[parent.id] = requires_ui
+    _tags[parent.id] = bot.get("agent_tags", [])
+    _pending[parent.id] = deque(c.id for c in children[window:])
+    await queue_manager.enqueue_many([c.id for c in children[:window]], requires_ui, tags=_tags[parent.id])
+    logger.info("Fan-out %s: %d hijas (ventana %d)", parent.id, len(children), window)
+
+    return parent.model_dump(), [c.model_dump() for c in children]
+
+
+def _persist(parent_folder: Path, records: list[dict]):
+    """Crea la carpeta del padre y da de alta padre + hijas en una sola transacción."""
+    (parent_folder / "logs").mkdir(parents=True, exist_ok=True)
+    (parent_folder / "resultados").mkdir(parents=True, exist_ok=True)
+    with storage.transaction(executor.EXECUTIONS_FILE) as executions:
+        executions[0:0] = records
+
+
+@engine.command
+def drop_pending(parent_id: str):
+    """Descarta las hijas aún no encoladas de un fan-out (p. ej. al cancelar el padre)."""
+    _pending.pop(parent_id, None)
+
+
+async def on_execution_finished(execution_id: str):
+    """Hook de queue_manager: avanza la ventana del fan-out y lanza el join al final."""
+    execution = await io_pool.run(executor.load_execution, execution_id)
+    if not execution or not execution.get("parent_id"):
+        return
+    parent_id = execution["parent_id"]
+
+    pending = _pending.get(parent_id)
+    if pending:
+        # Saltar hijas canceladas mientras esperaban su turno
+        while pending:
+            next_id = pending.popleft()
+            nxt = await io_pool.run(executor.load_execution, next_id)
+            if nxt and nxt.get("status") == "queued":
+                await queue_manager.enqueue(
+                    next_id, _requires_ui.get(parent_id, False), tags=_tags.get(parent_id, []),
+                )
+                break
+
+    executions = {e["id"]: e for e in await io_pool.run(storage.load, executor.EXECUTIONS_FILE)}
+    parent = executions.get(parent_id)
+    if not parent or parent.get("status") in FINAL_STATUSES:
+        _cleanup(parent_id)
+        return
+    children = [executions.get(cid) for cid in parent.get("children_ids", [])]
+    if parent_id in _joining:
+        return
+    if all(c is None or c.get("status") in FINAL_STATUSES for c in children):
+        _cleanup(parent_id)
+        _joining.add(parent_id)
+        try:
+            await io_pool.run(_join, parent, [c for c in children if c])
+        finally:
+            _joining.discard(parent_id)
+
+
+def _cleanup(parent_id: str):
+    _pending.pop(parent_id, None)
+    _requires_ui.pop(parent_id, None)
+    _tags.pop(parent_id, None)
+
+
+def _join(parent: dict, children: list[dict]):
+    """Fusiona resultados/ de cada hija en resultados/<valor>/ del padre (hardlink si se puede)."""
+    parent_folder = BASE_DIR / parent["run_folder"]
+    resultados = parent_folder / "resultados"
+    lines = [f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Join de {len(children)} ejecuciones hijas"]
+    used_names: set[str] = set()
+
+    for child in children:
+        value = child.get("fanout_value") or child["id"]
+        name = _safe_folder_name(value)
+        if name in used_names:
+            name = f"{name}_{child['id'][:8]}"
+        used_names.add(name)
+        lines.append(f"  - {value}: {child['status']} ({child.get('duration_seconds', 0)}s) → {child['id']}")
+
+        if not child.get("run_folder"):
+            continue
+        src_root = BASE_DIR / child["run_folder"] / "resultados"
+        if src_root.exists():
+            executor.link_tree(src_root, resultados / name)
+
+    failed = [c for c in children if c["status"] != "completed"]
+    status = "completed" if not failed else "failed"
+    error_msg = "" if not failed else f"{len(failed)} de {len(children)} ejecuciones hijas no completaron"
+    lines.append(f"Resultado: {status}" + (f" — {error_msg}" if error_msg else ""))
+    with open(parent_folder / "logs" / "run.log", "w", encoding="utf-8") as lf:
+        lf.write("\n".join(lines) + "\n")
+
+    started = datetime.fromisoformat(parent["started_at"]) if parent.get("started_at") else datetime.now()
+    executor.update_execution(parent["id"], {
+        "status": status,
+        "completed_at": datetime.now().isoformat(),
+        "exit_code": 0 if not failed else 1,
+        "error_message": error_msg,
+        "duration_seconds": round((datetime.now() - started).total_seconds(), 2),
+    })
+    logger.info("Fan-out %s finalizado con status=%s", parent["id"], status)
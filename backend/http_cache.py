@@ -0,0 +1,180 @@
+"""Compresión de respuestas y GET condicional (ETag / Last-Modified).
+
+El frontend consulta /api/executions, /api/stats y los archivos de una ejecución
+cada pocos segundos; casi siempre la respuesta es la misma. Dos mecanismos:
+
+- CompressionMiddleware: comprime con brotli (si está instalado el paquete `brotli`)
+  o gzip las respuestas de MIN_SIZE bytes o más que el cliente acepte (las grandes en
+  un thread, fuera del event loop). Solo las que salen en un único bloque
+  (JSONResponse, texto): streams SSE y descargas de archivos pasan tal cual.
+- json_response(): arma la respuesta de un endpoint de lectura con un ETag débil
+  derivado de la versión de los archivos de storage de los que depende (ver
+  storage.version) y contesta 304 sin serializar nada si el cliente ya la tiene.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin brotli solo gzip
+    brotli = None
+
+MIN_SIZE = int(os.getenv("HTTP_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Más grande que esto se comprime en un thread: varios MB de JSON son decenas de ms
+OFFLOAD_SIZE = 256 * 1024
+_COMPRESSIBLE = ("application/json", "text/", "application/javascript")
+
+
+# ── Compresión ───────────────────────────────────────────────────────────────
+
+def _accepted_encoding(accept: str) -> Optional[str]:
+    """br o gzip según Accept-Encoding (respetando q=0), o None."""
+    accepted = {}
+    for part in accept.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI: comprime las respuestas de un solo bloque de MIN_SIZE o más."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), "")
+        encoding = _accepted_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[dict] = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (
+                    b"content-encoding" in headers
+                    or not content_type.startswith(_COMPRESSIBLE)
+                    or message["status"] < 200 or message["status"] in (204, 304)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # Se decide con el primer bloque del body
+                return
+            if passthrough or message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+            held, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < MIN_SIZE:
+                passthrough = True
+                await send(held)
+                await send(message)
+                return
+            if len(body) >= OFFLOAD_SIZE:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers = [(k, v) for k, v in held.get("headers", []) if k.lower() not in (b"content-length", b"vary")]
+            vary = [v for k, v in held.get("headers", []) if k.lower() == b"vary"]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            await send({**held, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# ── GET condicional ──────────────────────────────────────────────────────────
+
+def etag(*parts: Any) -> str:
+    """ETag débil a partir de versiones de storage, parámetros, etc."""
+    digest = hashlib.blake2b("\0".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def content_etag(data: Any) -> str:
+    """ETag de un contenido que no sale de storage (p. ej. un listado de archivos)."""
+    return etag(json.dumps(data, sort_keys=True, separators=(",", ":"), default=str))
+
+
+def _not_modified(request: Request, tag: str, last_modified: Optional[float]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Comparación débil: el ETag vale igual para la respuesta comprimida y sin comprimir
+        opaque = tag.removeprefix("W/")
+        return any(t.strip() == "*" or t.strip().removeprefix("W/") == opaque for t in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def json_response(
+    request: Request,
+    tag: str,
+    build: Callable[[], Any],
+    last_modified: Optional[float] = None,
+) -> Response:
+    """JSONResponse con ETag (y Last-Modified), o 304 si el cliente ya tiene esa versión.
+    `build` solo se llama si hay que mandar el contenido."""
+    headers = {"ETag": tag, "Cache-Control": "no-cache"}
+    # Last-Modified tiene resolución de 1 s: si el archivo cambió en este mismo segundo
+    # un If-Modified-Since posterior no vería el próximo cambio, así que no se manda
+    if last_modified is not None and last_modified < time.time() - 1:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    else:
+        last_modified = None
+    if _not_modified(request, tag, last_modified):
+        return Response(status_code=304, headers=headers)
+    content = build()
+    if isinstance(content, bytes):  # Ya serializado
+        return Response(content, media_type="application/json", headers=headers)
+    if isinstance(content, BaseModel):
+        content = content.model_dump(mode="json")
+    return JSONResponse(content, headers=headers)
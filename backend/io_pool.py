@@ -0,0 +1,95 @@
+"""Pool de threads dedicado al I/O de disco bloqueante de los caminos async.
+
+El event loop atiende todos los SSE, los long-polls de agentes y el pump de logs de
+los bots: un mkdir, una reescritura de executions.json o un read() en un disco lento
+hechos en el loop frenan a todos a la vez. Esos llamados van por run(), que los corre
+en un pool propio de IO_THREADS threads (concurrencia acotada y separada del
+threadpool de FastAPI y del default de asyncio.to_thread).
+
+Ver loop_monitor.py para detectar lo que todavía bloquea el loop.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+IO_THREADS = int(os.getenv("IO_THREADS", "8"))
+
+_pool = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix="io")
+
+IO_PENDING = metrics.Gauge("orquestador_io_pool_pending", "Operaciones de disco en curso o esperando un thread del pool")
+
+T = TypeVar("T")
+
+
+async def run(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Como asyncio.to_thread pero en el pool de I/O (propaga el contexto: spans)."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    IO_PENDING.inc()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_pool, call)
+    finally:
+        IO_PENDING.dec()
+
+
+def read_text_from(path: Path, offset: int = 0) -> tuple[str, int]:
+    """Texto desde `offset` hasta el final y el nuevo offset ("", offset si no creció)."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return "", offset
+    return data.decode("utf-8", errors="replace"), offset + len(data)
+
+
+class BatchWriter:
+    """Junta ítems desde el event loop y los pasa en bloque a `write` (en el pool) como
+    mucho cada `interval` segundos. Las escrituras van de a una y en orden, aunque la
+    tarea de flush se cancele a mitad de una."""
+
+    def __init__(self, write: Callable[[list], None], interval: float = 1.0):
+        self._write = write
+        self._interval = interval
+        self._pending: list = []
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Optional[asyncio.Future] = None
+
+    def add(self, item):
+        self._pending.append(item)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self._interval)
+            await self.flush()
+
+    async def flush(self):
+        if self._inflight is not None:
+            await asyncio.wait([self._inflight])
+        items, self._pending = self._pending, []
+        if not items:
+            return
+        self._inflight = asyncio.ensure_future(run(self._write, items))
+        try:
+            await asyncio.shield(self._inflight)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Escritura en bloque falló (%s): %s", getattr(self._write, "__name__", self._write), e)
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
@@ -0,0 +1,248 @@
+"""Índice de texto completo de los run.log (SQLite FTS5).
+
+Cada ejecución iniciada se registra en `runs` (bot, inicio, status) y sus líneas de
+log se agregan a la tabla FTS5 `lines` a medida que se escriben: el executor las
+junta y las inserta como mucho cada FLUSH_INTERVAL, y las de agentes remotos se
+indexan al recibir cada bloque. Así GET /api/executions/search encuentra en qué
+ejecución apareció un error sin abrir los run.log uno por uno.
+
+Los logs anteriores al índice (o de ejecuciones que se cortaron) se completan con
+backfill() al arrancar el motor. LOG_INDEX_ENABLED=0 lo desactiva; si el SQLite
+de Python no trae FTS5 queda desactivado con un warning.
+"""
+
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import io_pool
+import storage
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+DB_FILE = BASE_DIR / "data" / "logs_index.db"
+ENABLED = os.getenv("LOG_INDEX_ENABLED", "1") == "1"
+FLUSH_INTERVAL = 1.0
+MAX_LINE_CHARS = 2000
+FINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    execution_id TEXT NOT NULL UNIQUE,
+    bot_id TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    line_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_bot_started ON runs (bot_id, started_at);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5(
+    text, run UNINDEXED, line_no UNINDEXED, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+# Una conexión de escritura por proceso; las búsquedas abren la suya (WAL: lectores no bloquean)
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _writer() -> Optional[sqlite3.Connection]:
+    global _conn, ENABLED
+    if _conn is None and ENABLED:
+        try:
+            conn = _connect()
+            conn.executescript(_SCHEMA)
+            _conn = conn
+        except sqlite3.OperationalError as e:
+            logger.warning("Índice de logs desactivado (SQLite sin FTS5?): %s", e)
+            ENABLED = False
+    return _conn
+
+
+def register_run(execution_id: str, bot_id: str, started_at: str):
+    """Alta (o reinicio, si un agente perdió el lease) de una ejecución en el índice."""
+    with _conn_lock:
+        conn = _writer()
+        if conn is None:
+            return
+        with conn:
+            row = conn.execute("SELECT id FROM runs WHERE execution_id = ?", (execution_id,)).fetchone()
+            if row:
+                conn.execute("DELETE FROM lines WHERE run = ?", (row[0],))
+                conn.execute(
+                    "UPDATE runs SET started_at = ?, status = 'running', line_count = 0 WHERE id = ?",
+                    (started_at, row[0]),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO runs (execution_id, bot_id, started_at, status) VALUES (?, ?, ?, 'running')",
+                    (execution_id, bot_id, started_at),
+                )
+
+
+def add_text(execution_id: str, text: str):
+    """Indexa un bloque de líneas nuevas del run.log (las vacías cuentan para la numeración)."""
+    if not text:
+        return
+    with _conn_lock:
+        conn = _writer()
+        if conn is None:
+            return
+        with conn:
+            row = conn.execute("SELECT id, line_count FROM runs WHERE execution_id = ?", (execution_id,)).fetchone()
+            if not row:
+                return
+            run_id, line_no = row
+            batch = []
+            for line in text.splitlines():
+                line_no += 1
+                line = line.strip()
+                if line:
+                    batch.append((line[:MAX_LINE_CHARS], run_id, line_no))
+            conn.executemany("INSERT INTO lines (text, run, line_no) VALUES (?, ?, ?)", batch)
+            conn.execute("UPDATE runs SET line_count = ? WHERE id = ?", (line_no, run_id))
+
+
+def set_status(execution_id: str, status: str):
+    with _conn_lock:
+        conn = _writer()
+        if conn is None:
+            return
+        with conn:
+            conn.execute("UPDATE runs SET status = ? WHERE execution_id = ?", (status, execution_id))
+
+
+def remove(execution_ids: list[str]):
+    with _conn_lock:
+        conn = _writer()
+        if conn is None or not execution_ids:
+            return
+        with conn:
+            for execution_id in execution_ids:
+                row = conn.execute("SELECT id FROM runs WHERE execution_id = ?", (execution_id,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM lines WHERE run = ?", (row[0],))
+                    conn.execute("DELETE FROM runs WHERE id = ?", (row[0],))
+
+
+def backfill(executions_file: Path) -> int:
+    """Indexa los run.log de ejecuciones terminadas que no están en el índice y corrige
+    status desactualizados (p. ej. interrumpidas por un reinicio). Retorna cuántas indexó."""
+    with _conn_lock:
+        conn = _writer()
+        if conn is None:
+            return 0
+        known = dict(conn.execute("SELECT execution_id, status FROM runs").fetchall())
+    indexed = 0
+    for ex in storage.load(executions_file):
+        if ex["status"] not in FINAL_STATUSES or not ex.get("run_folder"):
+            continue
+        if ex["id"] in known:
+            if known[ex["id"]] != ex["status"]:
+                set_status(ex["id"], ex["status"])
+            continue
+        log_file = BASE_DIR / ex["run_folder"] / "logs" / "run.log"
+        if not log_file.exists():
+            continue
+        register_run(ex["id"], ex["bot_id"], ex.get("started_at") or ex.get("queued_at", ""))
+        add_text(ex["id"], log_file.read_text(encoding="utf-8", errors="replace"))
+        set_status(ex["id"], ex["status"])
+        indexed += 1
+    if indexed:
+        logger.info("Índice de logs: %d ejecuciones anteriores indexadas", indexed)
+    return indexed
+
+
+def _match_expression(q: str) -> str:
+    """Cada palabra como término literal (AND); `palabra*` busca por prefijo."""
+    terms = []
+    for word in q.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*") if prefix else word
+        terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def search(
+    q: str,
+    bot_id: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 100,
+) -> dict:
+    """Líneas que contienen todas las palabras de `q`, de las ejecuciones más recientes
+    primero (hasta `limit`)."""
+    start = time.perf_counter()
+    with _conn_lock:
+        ready = _writer() is not None
+    if not ready:
+        return {"enabled": False, "results": [], "took_ms": 0.0}
+    sql = [
+        "SELECT r.execution_id, r.bot_id, r.status, r.started_at, l.line_no, l.text",
+        "FROM lines l JOIN runs r ON r.id = l.run WHERE lines MATCH ?",
+    ]
+    params: list = [_match_expression(q)]
+    if bot_id:
+        sql.append("AND r.bot_id = ?")
+        params.append(bot_id)
+    if status:
+        sql.append("AND r.status = ?")
+        params.append(status)
+    if date_from:
+        sql.append("AND r.started_at >= ?")
+        params.append(date_from)
+    if date_to:
+        # Fecha sin hora = incluye todo ese día
+        sql.append("AND r.started_at < ?")
+        params.append(date_to + "~" if len(date_to) == 10 else date_to)
+    # Orden de inserción (≈ más reciente primero): FTS5 lo recorre sin ordenar todos los matches
+    sql.append("ORDER BY l.rowid DESC LIMIT ?")
+    params.append(limit)
+    conn = _connect()
+    try:
+        rows = conn.execute(" ".join(sql), params).fetchall()
+    finally:
+        conn.close()
+    rows.sort(key=lambda r: (r[3], -r[4]), reverse=True)
+    return {
+        "enabled": True,
+        "results": [
+            {"execution_id": r[0], "bot_id": r[1], "status": r[2], "started_at": r[3], "line": r[4], "text": r[5]}
+            for r in rows
+        ],
+        "took_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
+
+
+def _add_texts(execution_id: str, texts: list[str]):
+    add_text(execution_id, "".join(texts))
+
+
+class LogIndexer:
+    """Junta las líneas que el executor escribe en run.log y las indexa en bloque."""
+
+    def __init__(self, execution_id: str):
+        self._writer = io_pool.BatchWriter(functools.partial(_add_texts, execution_id), FLUSH_INTERVAL)
+
+    def add(self, text: str):
+        if ENABLED:
+            self._writer.add(text)
+
+    async def close(self):
+        await self._writer.close()
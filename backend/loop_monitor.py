@@ -0,0 +1,119 @@
+"""Monitor de lag del event loop.
+
+Una tarea del loop se despierta cada INTERVAL y mide cuánto tarde llegó (lag). Un
+thread watchdog mira cuándo fue el último despertar: si el loop lleva más de
+LOOP_LAG_THRESHOLD_MS sin avanzar, toma el stack del thread del loop
+(sys._current_frames) mientras sigue bloqueado, así el reporte dice qué llamada lo
+frena y no solo cuánto.
+
+Cada bloqueo se registra en el log (warning), en /metrics
+(orquestador_event_loop_lag_seconds, orquestador_event_loop_blocked_total) y en
+/api/admin/loop-lag (últimos MAX_REPORTS). LOOP_LAG_THRESHOLD_MS=0 lo desactiva.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000
+INTERVAL = 0.05
+MAX_REPORTS = 100
+STACK_DEPTH = 12
+
+LOOP_LAG = metrics.Histogram(
+    "orquestador_event_loop_lag_seconds", "Retraso del event loop al despertar una tarea",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+LOOP_BLOCKED = metrics.Counter(
+    "orquestador_event_loop_blocked_total", "Veces que el event loop estuvo bloqueado más que el umbral",
+)
+
+_reports: deque[dict] = deque(maxlen=MAX_REPORTS)
+_loop_thread: Optional[int] = None
+_last_tick = 0.0
+# Stack tomado por el watchdog durante el bloqueo en curso (lo consume _ticker)
+_pending_stack: Optional[list[str]] = None
+_task: Optional[asyncio.Task] = None
+_stop = threading.Event()
+
+
+def _stack_of(thread_id: int) -> list[str]:
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    return [
+        f"{Path(fs.filename).name}:{fs.lineno} {fs.name}" + (f" — {fs.line}" if fs.line else "")
+        for fs in traceback.extract_stack(frame)[-STACK_DEPTH:]
+    ]
+
+
+def _watchdog():
+    global _pending_stack
+    while not _stop.wait(INTERVAL / 2):
+        stalled = time.monotonic() - _last_tick - INTERVAL
+        if stalled > THRESHOLD and _pending_stack is None and _loop_thread is not None:
+            _pending_stack = _stack_of(_loop_thread)
+
+
+async def _ticker():
+    global _last_tick, _pending_stack
+    while True:
+        start = time.monotonic()
+        await asyncio.sleep(INTERVAL)
+        _last_tick = time.monotonic()
+        lag = max(_last_tick - start - INTERVAL, 0.0)
+        LOOP_LAG.observe(lag)
+        if lag > THRESHOLD:
+            stack, _pending_stack = _pending_stack or [], None
+            LOOP_BLOCKED.inc()
+            _reports.append({
+                "at": datetime.now().isoformat(),
+                "blocked_ms": round(lag * 1000, 1),
+                "stack": stack,
+            })
+            logger.warning(
+                "Event loop bloqueado %.0f ms%s", lag * 1000,
+                ("; en: " + " ← ".join(reversed(stack[-3:]))) if stack else "",
+            )
+        else:
+            _pending_stack = None
+
+
+def start():
+    """Arranca el monitor en el loop actual (llamar desde el lifespan)."""
+    global _task, _loop_thread, _last_tick
+    if THRESHOLD <= 0 or _task is not None:
+        return
+    _loop_thread = threading.get_ident()
+    _last_tick = time.monotonic()
+    _stop.clear()
+    _task = asyncio.create_task(_ticker())
+    threading.Thread(target=_watchdog, name="loop-watchdog", daemon=True).start()
+
+
+def stop():
+    global _task
+    _stop.set()
+    if _task:
+        _task.cancel()
+        _task = None
+
+
+def status() -> dict:
+    return {
+        "enabled": _task is not None,
+        "threshold_ms": round(THRESHOLD * 1000, 1),
+        "reports": list(reversed(_reports)),
+    }
@@ -5,10 +5,12 @@ FastAPI application for managing and orchestrating RPA/automation bots.
 
 import asyncio
 import csv
+import hmac
 import io
 import json
 import logging
 import os
+import threading
 import zipfile
 from contextlib import asynccontextmanager
 from datetime import datetime
@@ -19,18 +21,41 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from fastapi import Depends, FastAPI, File, HTTPException, Query, UploadFile
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 
+import agents
+import analytics
+import archive
 import auth
+import bot_events
+import bot_servers
+import engine
 import executor
+import fanout
+import http_cache
+import io_pool
+import log_index
+import loop_monitor
+import metrics
+import pipelines
+import profiler
+import queue_eta
 import queue_manager
+import resource_monitor
+import result_cache
+import storage
+import tracing
+import uploads
+import warm_pool
 from models import (
-    Bot, BotCreate, BotExecution, BotUpdate, ExecutionRequest,
+    AgentCompletion, AgentRegistration,
+    BatchExecutionRequest, Bot, BotCreate, BotExecution, BotUpdate, ExecutionRequest, FanoutRequest,
     BotSchedule, ScheduleCreate, ScheduleUpdate,
-    Stats, User, UserBotsUpdate, UserRoleUpdate,
+    Pipeline, PipelineCreate, PipelineRunRequest, PipelineUpdate,
+    QueueMoveRequest, Stats, TracingUpdate, User, UserBotsUpdate, UserRoleUpdate, gen_id,
 )
 
 DATA_DIR = Path(__file__).parent / "data"
@@ -40,21 +65,49 @@ SCHEDULES_FILE = DATA_DIR / "schedules.json"
 EJECUCIONES_DIR = Path(__file__).parent / "ejecuciones"
 
 MAX_HEADLESS = int(os.getenv("MAX_HEADLESS_WORKERS", "3"))
+# 0 cuando el escritorio de esta VM no debe usarse: los bots con UI quedan para agentes
+LOCAL_UI_WORKERS = int(os.getenv("LOCAL_UI_WORKERS", "1"))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "200"))
+SLA_CHECK_INTERVAL = int(os.getenv("QUEUE_SLA_CHECK_INTERVAL", "30"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LINUX_KEY_MAX_BYTES = 64 * 1024
+SERVERS_CSV_MAX_BYTES = int(os.getenv("SERVERS_CSV_MAX_MB", "20")) * 1024 * 1024
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 
 def _load(path: Path) -> list[dict]:
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return []
+    return storage.load(path)
+
+
+def _find_execution(execution_id: str) -> Optional[dict]:
+    """Ejecución por id: primero executions.json y si no está, el archivo (ver archive)."""
+    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+    return ex or archive.find(execution_id)
+
+
+def _with_live_progress(ex: Optional[dict]) -> Optional[dict]:
+    """Una ejecución en curso con el resumen de eventos al día: executions.json solo
+    guarda copias espaciadas (ver bot_events.record)."""
+    if ex and ex["status"] == "running" and ex.get("run_folder"):
+        progress = bot_events.load_progress(Path(__file__).parent / ex["run_folder"] / "logs")
+        if progress:
+            ex = {**ex, "progress": progress}
+    return ex
+
+
+def _versioned_response(request: Request, paths: list[Path], build, *extra, last_modified: bool = True) -> Response:
+    """Respuesta de lectura con ETag según la versión de los archivos de los que depende
+    (304 si el cliente ya la tiene, ver http_cache). La versión se toma antes de leer:
+    si el archivo cambia en el medio el ETag queda viejo y el próximo GET trae todo."""
+    versions = [storage.version(p) for p in paths]
+    tag = http_cache.etag(request.url.path, request.url.query, *extra, *(v for v, _ in versions))
+    mtimes = [m for _, m in versions if m is not None]
+    return http_cache.json_response(request, tag, build, max(mtimes) if mtimes and last_modified else None)
 
 
 def _save(path: Path, data: list[dict]):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    storage.save(path, data)
 
 
 def _init_default_bots():
@@ -104,6 +157,9 @@ def _recover_interrupted():
 # ── Lifespan ─────────────────────────────────────────────────────────────────
 
 _scheduler_task: Optional[asyncio.Task] = None
+_sla_task: Optional[asyncio.Task] = None
+_analytics_task: Optional[asyncio.Task] = None
+_archive_task: Optional[asyncio.Task] = None
 
 
 async def _scheduler_loop():
@@ -112,12 +168,39 @@ async def _scheduler_loop():
     logger = logging.getLogger("scheduler")
     while True:
         try:
-            await _check_schedules(logger)
+            with metrics.SCHEDULER_TICK.time():
+                await _check_schedules(logger)
         except Exception as e:
             logger.error("Error en scheduler: %s", e)
         await _aio.sleep(60)
 
 
+def _check_queue_sla():
+    bots = _load(BOTS_FILE)
+    if not any(b.get("queue_sla_seconds") for b in bots):
+        return
+    executions = _load(EXECUTIONS_FILE)
+    overview = queue_eta.queue_overview(executions, bots)
+    # Sin lock primero: la transacción reescribe executions.json (y cambia su ETag) aunque
+    # no marque nada, y breached() sigue listando las que ya estaban marcadas
+    marked = {ex["id"] for ex in executions if ex.get("sla_breached_at")}
+    if all(item["execution_id"] in marked for item in queue_eta.breached(overview)):
+        return
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        queue_eta.record_breaches(overview, executions)
+
+
+async def _sla_loop():
+    """Background task: marca las ejecuciones que superan el SLA de espera de su bot."""
+    logger = logging.getLogger("queue_sla")
+    while True:
+        await asyncio.sleep(SLA_CHECK_INTERVAL)
+        try:
+            await asyncio.to_thread(_check_queue_sla)
+        except Exception as e:
+            logger.error("Error revisando SLA de cola: %s", e)
+
+
 async def _check_schedules(logger):
     now = datetime.now()
     today_str = now.strftime("%Y-%m-%d")
@@ -182,16 +265,15 @@ async def _check_schedules(logger):
             triggered_by_name="Programación automática",
             input_data=safe_sched_input,
         )
-        executions = _load(EXECUTIONS_FILE)
-        executions.insert(0, execution.model_dump())
-        _save(EXECUTIONS_FILE, executions)
+        with storage.transaction(EXECUTIONS_FILE) as executions:
+            executions.insert(0, execution.model_dump())
 
         for key in executor.SENSITIVE_ENV_KEYS:
             val = sched_input.get(key.lower(), "") or sched_input.get(key, "")
             if val:
-                executor.store_execution_secret(execution.id, key, val)
+                await executor.store_execution_secret(execution.id, key, val)
 
-        await queue_manager.enqueue(execution.id, bot.get("requires_ui", False))
+        await queue_manager.enqueue(execution.id, bot.get("requires_ui", False), tags=bot.get("agent_tags", []))
 
 
 def _schedule_already_ran_today(schedule_id: str, today_str: str) -> bool:
@@ -205,9 +287,40 @@ def _schedule_already_ran_today(schedule_id: str, today_str: str) -> bool:
     return False
 
 
+async def _start_engine():
+    """Colas, workers, scheduler y warm pool: solo en el proceso que ejecuta (ver engine.py)."""
+    global _scheduler_task, _sla_task, _analytics_task, _archive_task
+    _recover_interrupted()
+    pipelines.recover_interrupted()
+    # Logs de antes del índice (o con status viejo): en segundo plano, puede tardar
+    threading.Thread(target=log_index.backfill, args=(EXECUTIONS_FILE,), name="log-index-backfill", daemon=True).start()
+    queue_manager.register_completion_hook(fanout.on_execution_finished)
+    queue_manager.register_completion_hook(pipelines.on_execution_finished)
+    queue_manager.init_workers(executor.run_execution, MAX_HEADLESS, LOCAL_UI_WORKERS)
+    agents.start()
+    _scheduler_task = asyncio.create_task(_scheduler_loop())
+    _sla_task = asyncio.create_task(_sla_loop())
+    _analytics_task = asyncio.create_task(analytics.sync_loop())
+    _archive_task = asyncio.create_task(archive.archive_loop())
+    await warm_pool.start(_load(BOTS_FILE))
+
+
+async def _stop_engine():
+    if _scheduler_task:
+        _scheduler_task.cancel()
+    if _sla_task:
+        _sla_task.cancel()
+    if _analytics_task:
+        _analytics_task.cancel()
+    if _archive_task:
+        _archive_task.cancel()
+    agents.shutdown()
+    queue_manager.stop_workers()
+    await warm_pool.shutdown()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _scheduler_task
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     EJECUCIONES_DIR.mkdir(parents=True, exist_ok=True)
     if not EXECUTIONS_FILE.exists():
@@ -217,13 +330,24 @@ async def lifespan(app: FastAPI):
     if not auth.USERS_FILE.exists():
         _save(auth.USERS_FILE, [])
     _init_default_bots()
-    _recover_interrupted()
-    queue_manager.init_workers(executor.run_execution, MAX_HEADLESS)
-    _scheduler_task = asyncio.create_task(_scheduler_loop())
+    await auth.init_http_client()
+    loop_monitor.start()
+    # Con ORQUESTADOR_ROLE=api este proceso solo sirve HTTP: el engine corre aparte
+    if engine.ROLE != "api":
+        await _start_engine()
     yield
-    if _scheduler_task:
-        _scheduler_task.cancel()
-    queue_manager.stop_workers()
+    if engine.ROLE != "api":
+        await _stop_engine()
+    loop_monitor.stop()
+    await auth.close_http_client()
+
+
+async def run_engine():
+    """Proceso de ejecución para el modo multi-proceso: `python main.py engine`."""
+    async with lifespan(app):
+        server = await engine.serve()
+        async with server:
+            await server.serve_forever()
 
 
 app = FastAPI(
@@ -233,6 +357,9 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+app.add_middleware(tracing.TracingMiddleware)
+app.add_middleware(metrics.HttpMetricsMiddleware)
+app.add_middleware(http_cache.CompressionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -242,6 +369,16 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(engine.EngineError)
+async def engine_error_handler(request: Request, exc: engine.EngineError):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status)
+
+
+@app.exception_handler(uploads.UploadError)
+async def upload_error_handler(request: Request, exc: uploads.UploadError):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status)
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  AUTH
 # ══════════════════════════════════════════════════════════════════════════════
@@ -254,8 +391,7 @@ def google_url():
 @app.get("/api/auth/callback")
 async def google_callback(code: str = Query(...), state: str = Query("")):
     try:
-        tokens = await auth.exchange_code(code)
-        user_info = await auth.get_google_user_info(tokens["access_token"])
+        user_info = await auth.get_google_identity(code)
     except Exception as e:
         frontend = os.getenv("FRONTEND_URL", "http://localhost:5175")
         return RedirectResponse(f"{frontend}/login?error=oauth_failed")
@@ -301,13 +437,66 @@ def get_bot(bot_id: str, current_user: dict = Depends(auth.get_current_user)):
     return bot
 
 
+def _find_inflight(executions: list[dict], bot_id: str, input_data: dict) -> Optional[dict]:
+    """Ejecución en cola o en curso del bot con el mismo input normalizado (single-flight)."""
+    fingerprint = result_cache.normalize_input(input_data)
+    for ex in executions:
+        if (
+            ex["bot_id"] == bot_id
+            and ex["status"] in ("queued", "running")
+            and not ex.get("children_ids")
+            and result_cache.normalize_input(ex.get("input_data", {})) == fingerprint
+        ):
+            return ex
+    return None
+
+
+def _create_execution(
+    bot: dict,
+    safe_input: dict,
+    use_cache: bool,
+    current_user: dict,
+) -> tuple[dict, Optional[dict], bool]:
+    """Parte de disco de execute_bot (corre en io_pool): caché de resultados y alta en
+    executions.json. Retorna (registro, ejecución en curso a la que se sumó o None,
+    servida desde caché)."""
+    cache_key = result_cache.cache_key(bot, safe_input)
+    cached = result_cache.find_cached(bot, cache_key) if cache_key and use_cache else None
+
+    execution = BotExecution(
+        bot_id=bot["id"],
+        bot_name=bot["name"],
+        triggered_by=current_user["email"],
+        triggered_by_name=current_user["name"],
+        input_data=safe_input,
+        cache_key=cache_key,
+    )
+    record = execution.model_dump()
+    if cached:
+        record.update(result_cache.materialize(record, cached))
+    inflight = None
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        # Búsqueda e inserción en la misma transacción: dos clics simultáneos no duplican
+        if bot.get("single_flight") and not cached:
+            inflight = _find_inflight(executions, bot["id"], safe_input)
+        if inflight:
+            inflight.setdefault("coalesced_requests", []).append({
+                "triggered_by": current_user["email"],
+                "triggered_by_name": current_user["name"],
+                "requested_at": datetime.now().isoformat(),
+            })
+        else:
+            executions.insert(0, record)
+    return record, inflight, bool(cached)
+
+
 @app.post("/api/bots/{bot_id}/execute")
 async def execute_bot(
     bot_id: str,
     body: ExecutionRequest = ExecutionRequest(),
     current_user: dict = Depends(auth.get_current_user),
 ):
-    bots = _load(BOTS_FILE)
+    bots = await io_pool.run(_load, BOTS_FILE)
     bot = next((b for b in bots if b["id"] == bot_id), None)
     if not bot:
         raise HTTPException(404, "Bot no encontrado")
@@ -316,94 +505,209 @@ async def execute_bot(
     if current_user["role"] not in ("superadmin", "admin"):
         if bot_id not in current_user.get("allowed_bot_ids", []):
             raise HTTPException(403, "Sin acceso a este bot")
+        if body.urgent:
+            raise HTTPException(403, "Solo administradores pueden encolar ejecuciones urgentes")
 
     safe_input = {k: v for k, v in body.input_data.items()
                    if k.upper() not in executor.SENSITIVE_ENV_KEYS}
 
-    execution = BotExecution(
-        bot_id=bot_id,
-        bot_name=bot["name"],
-        triggered_by=current_user["email"],
-        triggered_by_name=current_user["name"],
-        input_data=safe_input,
-    )
-    executions = _load(EXECUTIONS_FILE)
-    executions.insert(0, execution.model_dump())
-    _save(EXECUTIONS_FILE, executions)
+    record, inflight, cached = await io_pool.run(_create_execution, bot, safe_input, body.use_cache, current_user)
+    if inflight:
+        return {**inflight, "coalesced": True}
+    if cached:
+        return record
 
     for key in executor.SENSITIVE_ENV_KEYS:
         val = body.input_data.get(key.lower(), "") or body.input_data.get(key, "")
         if val:
-            executor.store_execution_secret(execution.id, key, val)
+            await executor.store_execution_secret(record["id"], key, val)
+
+    await queue_manager.enqueue(
+        record["id"], bot.get("requires_ui", False), front=body.urgent, tags=bot.get("agent_tags", []),
+    )
+    return record
+
+
+def _create_batch(
+    bot: dict,
+    body: BatchExecutionRequest,
+    current_user: dict,
+) -> tuple[str, list[dict], list[str], list[tuple[str, str, str]]]:
+    """Parte de disco de execute_bot_batch (corre en io_pool): caché de resultados y una
+    sola transacción sobre executions.json para todo el lote. Retorna (batch_id,
+    registros, ids a encolar, secretos (execution_id, clave, valor))."""
+    batch_id = gen_id()
+    existing = _load(EXECUTIONS_FILE) if bot.get("cache_results") else []
+    records: list[dict] = []
+    to_enqueue: list[str] = []
+    batch_secrets: list[tuple[str, str, str]] = []
+    for item in body.items:
+        input_data = {**body.input_data, **item.input_data}
+        safe_input = {k: v for k, v in input_data.items()
+                      if k.upper() not in executor.SENSITIVE_ENV_KEYS}
+        cache_key = result_cache.cache_key(bot, safe_input)
+        execution = BotExecution(
+            bot_id=bot["id"],
+            bot_name=bot["name"],
+            triggered_by=current_user["email"],
+            triggered_by_name=current_user["name"],
+            input_data=safe_input,
+            batch_id=batch_id,
+            cache_key=cache_key,
+        )
+        record = execution.model_dump()
+        records.append(record)
+        cached = result_cache.find_cached(bot, cache_key, existing) if cache_key and item.use_cache else None
+        if cached:
+            record.update(result_cache.materialize(record, cached))
+            continue
+        to_enqueue.append(execution.id)
+        for key in executor.SENSITIVE_ENV_KEYS:
+            val = input_data.get(key.lower(), "") or input_data.get(key, "")
+            if val:
+                batch_secrets.append((execution.id, key, val))
+
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        executions[0:0] = list(reversed(records))
+    return batch_id, records, to_enqueue, batch_secrets
+
+
+@app.post("/api/bots/{bot_id}/execute-batch")
+async def execute_bot_batch(
+    bot_id: str,
+    body: BatchExecutionRequest,
+    current_user: dict = Depends(auth.get_current_user),
+):
+    """Crea N ejecuciones del mismo bot en una sola escritura y las encola juntas."""
+    bots = await io_pool.run(_load, BOTS_FILE)
+    bot = next((b for b in bots if b["id"] == bot_id), None)
+    if not bot:
+        raise HTTPException(404, "Bot no encontrado")
+    if not bot.get("enabled", True):
+        raise HTTPException(400, "Bot deshabilitado")
+    if current_user["role"] not in ("superadmin", "admin"):
+        if bot_id not in current_user.get("allowed_bot_ids", []):
+            raise HTTPException(403, "Sin acceso a este bot")
+    if not body.items:
+        raise HTTPException(400, "El lote no tiene ejecuciones")
+    if len(body.items) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"El lote excede el máximo de {MAX_BATCH_SIZE} ejecuciones")
+
+    batch_id, records, to_enqueue, batch_secrets = await io_pool.run(_create_batch, bot, body, current_user)
+
+    for execution_id, key, val in batch_secrets:
+        await executor.store_execution_secret(execution_id, key, val)
+
+    if to_enqueue:
+        await queue_manager.enqueue_many(to_enqueue, bot.get("requires_ui", False), tags=bot.get("agent_tags", []))
+    return {
+        "batch_id": batch_id,
+        "executions": records,
+    }
+
+
+@app.post("/api/bots/{bot_id}/execute-fanout")
+async def execute_bot_fanout(
+    bot_id: str,
+    body: FanoutRequest,
+    current_user: dict = Depends(auth.get_current_user),
+):
+    """Divide una ejecución en N hijas (una por valor de `fanout_key`) y las fusiona al final."""
+    bots = await io_pool.run(_load, BOTS_FILE)
+    bot = next((b for b in bots if b["id"] == bot_id), None)
+    if not bot:
+        raise HTTPException(404, "Bot no encontrado")
+    if not bot.get("enabled", True):
+        raise HTTPException(400, "Bot deshabilitado")
+    if current_user["role"] not in ("superadmin", "admin"):
+        if bot_id not in current_user.get("allowed_bot_ids", []):
+            raise HTTPException(403, "Sin acceso a este bot")
+
+    values = list(dict.fromkeys(v.strip() for v in body.values if v.strip()))
+    if not values:
+        try:
+            values = await io_pool.run(bot_servers.server_ids, Path(bot["script_path"]).parent)
+        except Exception as e:
+            raise HTTPException(500, f"Error leyendo CSV de servidores: {e}")
+    if not values:
+        raise HTTPException(400, "No hay valores para dividir la ejecución")
+    if len(values) > MAX_BATCH_SIZE:
+        raise HTTPException(400, f"El fan-out excede el máximo de {MAX_BATCH_SIZE} ejecuciones")
 
-    await queue_manager.enqueue(execution.id, bot.get("requires_ui", False))
-    return execution.model_dump()
+    safe_input = {k: v for k, v in body.input_data.items()
+                  if k.upper() not in executor.SENSITIVE_ENV_KEYS}
+    secrets = {}
+    for key in executor.SENSITIVE_ENV_KEYS:
+        val = body.input_data.get(key.lower(), "") or body.input_data.get(key, "")
+        if val:
+            secrets[key] = val
+
+    parent, children = await fanout.start_fanout(
+        bot,
+        safe_input,
+        secrets,
+        body.fanout_key,
+        values,
+        body.max_parallel or MAX_HEADLESS,
+        current_user["email"],
+        current_user["name"],
+    )
+    return {**parent, "children": children}
 
 
 @app.get("/api/bots/{bot_id}/executions")
-def bot_executions(bot_id: str, current_user: dict = Depends(auth.get_current_user)):
-    return [e for e in _load(EXECUTIONS_FILE) if e["bot_id"] == bot_id]
+def bot_executions(
+    bot_id: str,
+    request: Request,
+    archived: bool = Query(False, description="true = página de ejecuciones archivadas (ver archive)"),
+    before: Optional[str] = Query(None, description="Con archived: solo queued_at anteriores a esto"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(auth.get_current_user),
+):
+    if archived:
+        return _versioned_response(request, [archive.index_file()], lambda: archive.page(before, limit, bot_id))
+    return _versioned_response(
+        request, [EXECUTIONS_FILE], lambda: [e for e in _load(EXECUTIONS_FILE) if e["bot_id"] == bot_id],
+    )
 
 
 @app.get("/api/bots/{bot_id}/servers")
-def get_bot_servers(bot_id: str, current_user: dict = Depends(auth.get_current_user)):
-    """Retorna la lista de servidores del CSV Consolidado del bot."""
+def get_bot_servers(bot_id: str, request: Request, current_user: dict = Depends(auth.get_current_user)):
+    """Retorna la lista de servidores del CSV Consolidado del bot (cacheada, ver bot_servers)."""
     bot = next((b for b in _load(BOTS_FILE) if b["id"] == bot_id), None)
     if not bot:
         raise HTTPException(404, "Bot no encontrado")
 
-    bot_dir = Path(bot["script_path"]).parent
-    csv_files = sorted(bot_dir.glob("Consolidado*.csv"))
-    if not csv_files:
-        return []
-
-    servers: dict = {}
     try:
-        with open(csv_files[0], "r", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                tipo = row.get("Tipo", "").strip().lower() or "windows"
-                name = row.get("Servidor", "").strip()
-                host = row.get("Host", "").strip()
-                port_str = row.get("Puerto", "").strip()
-                path = row.get("Ruta", "").strip()
-
-                if not name or not path:
-                    continue
-
-                if name not in servers:
-                    servers[name] = {
-                        "id": name,
-                        "name": name,
-                        "tipo": tipo,
-                        "host": host,
-                        "port": int(port_str) if port_str else 22,
-                        "rutas": [],
-                    }
-
-                if path not in servers[name]["rutas"]:
-                    servers[name]["rutas"].append(path)
-
+        servers = bot_servers.load(Path(bot["script_path"]).parent)
     except Exception as e:
         raise HTTPException(500, f"Error leyendo CSV de servidores: {e}")
+    return http_cache.json_response(request, servers.etag, lambda: servers.body)
 
-    result = []
-    for info in servers.values():
-        rutas = info["rutas"]
-        if len(rutas) == 1:
-            desc = rutas[0]
-        else:
-            desc = f"{rutas[0]}  (+{len(rutas) - 1} más)"
-        result.append({
-            "id": info["id"],
-            "name": info["name"],
-            "tipo": info["tipo"],
-            "host": info["host"],
-            "rutas_count": len(rutas),
-            "descripcion": desc,
-        })
 
-    return result
+@app.put("/api/bots/{bot_id}/servers")
+async def upload_bot_servers(bot_id: str, request: Request, current_user: dict = Depends(auth.require_admin)):
+    """Reemplaza el CSV Consolidado del bot con el cuerpo del request (text/csv, sin
+    multipart). Se guarda en streaming y solo si tiene al menos un servidor válido."""
+    uploads.check_length(request.headers.get("content-length"), SERVERS_CSV_MAX_BYTES)
+    bot = next((b for b in await io_pool.run(_load, BOTS_FILE) if b["id"] == bot_id), None)
+    if not bot:
+        raise HTTPException(404, "Bot no encontrado")
+
+    bot_dir = Path(bot["script_path"]).parent
+    existing = await io_pool.run(lambda: sorted(bot_dir.glob(bot_servers.CSV_PATTERN)))
+    target = existing[0] if existing else bot_dir / "Consolidado.csv"
+
+    def validate(tmp: Path):
+        try:
+            servers = bot_servers.parse(tmp)
+        except (UnicodeDecodeError, ValueError, csv.Error) as e:
+            raise uploads.UploadError(400, f"CSV de servidores inválido: {e}")
+        if not servers:
+            raise uploads.UploadError(400, "El CSV no tiene servidores (columnas Servidor y Ruta)")
+
+    saved = await uploads.receive(request.stream(), target, SERVERS_CSV_MAX_BYTES, validate)
+    return {**saved, "servers": (await io_pool.run(bot_servers.load, bot_dir)).count}
 
 
 # ── Linux Keys ────────────────────────────────────────────────────────────────
@@ -432,7 +736,7 @@ async def upload_linux_key(
     current_user: dict = Depends(auth.get_current_user),
 ):
     """Sube un archivo .ppk a la carpeta llaves/ del bot."""
-    bot = next((b for b in _load(BOTS_FILE) if b["id"] == bot_id), None)
+    bot = next((b for b in await io_pool.run(_load, BOTS_FILE) if b["id"] == bot_id), None)
     if not bot:
         raise HTTPException(404, "Bot no encontrado")
 
@@ -444,13 +748,8 @@ async def upload_linux_key(
         raise HTTPException(400, "Nombre de archivo inválido")
 
     keys_dir = Path(bot["script_path"]).parent / "llaves"
-    keys_dir.mkdir(parents=True, exist_ok=True)
-
-    dest = keys_dir / safe_name
-    content = await file.read()
-    dest.write_bytes(content)
-
-    return {"name": safe_name, "size": len(content)}
+    saved = await uploads.receive(uploads.file_chunks(file), keys_dir / safe_name, LINUX_KEY_MAX_BYTES)
+    return {"name": safe_name, "size": saved["size"]}
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -458,55 +757,148 @@ async def upload_linux_key(
 # ══════════════════════════════════════════════════════════════════════════════
 
 @app.get("/api/executions")
-def list_executions(current_user: dict = Depends(auth.get_current_user)):
-    return _load(EXECUTIONS_FILE)
+def list_executions(
+    request: Request,
+    archived: bool = Query(False, description="true = página de ejecuciones archivadas (ver archive)"),
+    before: Optional[str] = Query(None, description="Con archived: solo queued_at anteriores a esto"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(auth.get_current_user),
+):
+    """Ejecuciones de executions.json; las viejas se piden de a páginas con archived=true,
+    de la más nueva a la más vieja (before = queued_at de la última recibida)."""
+    if archived:
+        return _versioned_response(request, [archive.index_file()], lambda: archive.page(before, limit))
+    return _versioned_response(request, [EXECUTIONS_FILE], lambda: _load(EXECUTIONS_FILE))
+
+
+@app.get("/api/executions/search")
+def search_execution_logs(
+    q: str = Query(..., min_length=1, max_length=200, description="Palabras a buscar (todas); `palabra*` = prefijo"),
+    bot_id: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, pattern="^(running|completed|failed|cancelled|interrupted)$"),
+    date_from: Optional[str] = Query(None, description="Inicio desde (YYYY-MM-DD o ISO)"),
+    date_to: Optional[str] = Query(None, description="Inicio hasta (YYYY-MM-DD incluye el día)"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: dict = Depends(auth.get_current_user),
+):
+    """Busca en los run.log de todas las ejecuciones (índice FTS5, ver log_index)."""
+    if not q.strip():
+        raise HTTPException(400, "La búsqueda está vacía")
+    result = log_index.search(q, bot_id, status, date_from, date_to, limit)
+    if not result["enabled"]:
+        raise HTTPException(503, "El índice de logs está desactivado")
+    return result
 
 
 @app.get("/api/executions/{execution_id}")
 def get_execution(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
-    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+    ex = _with_live_progress(_find_execution(execution_id))
     if not ex:
         raise HTTPException(404, "Ejecución no encontrada")
     return ex
 
 
+@app.get("/api/executions/{execution_id}/queue-position")
+def execution_queue_position(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
+    """Posición en la cola y ETA (inicio/fin en segundos desde ahora) de una ejecución."""
+    executions = _load(EXECUTIONS_FILE)
+    ex = next((e for e in executions if e["id"] == execution_id), None)
+    if not ex:
+        raise HTTPException(404, "Ejecución no encontrada")
+    position = queue_eta.find_position(queue_eta.queue_overview(executions, _load(BOTS_FILE)), execution_id)
+    return {"execution_id": execution_id, "status": ex["status"], "queue_position": position}
+
+
+@app.get("/api/executions/{execution_id}/events")
+def get_execution_events(
+    execution_id: str,
+    after: int = Query(0, ge=0, description="Solo eventos con seq mayor a este"),
+    current_user: dict = Depends(auth.get_current_user),
+):
+    """Historial de eventos estructurados que reportó el bot (ver bot_events)."""
+    ex = _find_execution(execution_id)
+    if not ex:
+        raise HTTPException(404, "Ejecución no encontrada")
+    if not ex.get("run_folder"):
+        return []
+    return bot_events.read_events(Path(__file__).parent / ex["run_folder"] / "logs", after)
+
+
 @app.get("/api/executions/{execution_id}/stream")
 async def stream_execution(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
-    """SSE: emite el estado de una ejecución cada segundo hasta que termine."""
-    import asyncio
+    """SSE: emite el estado de una ejecución cada segundo hasta que termine. Los eventos
+    que reporta el bot (bot_events) salen además como eventos SSE con nombre `bot_event`."""
 
     async def generator():
+        events_offset = 0
         while True:
-            ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+            ex = await io_pool.run(lambda: _with_live_progress(_find_execution(execution_id)))
             if not ex:
                 yield {"data": json.dumps({"error": "not_found"})}
                 return
+            if ex.get("progress") and ex.get("run_folder"):
+                events_file = Path(__file__).parent / ex["run_folder"] / "logs" / bot_events.EVENTS_FILENAME
+                text, events_offset = await io_pool.run(io_pool.read_text_from, events_file, events_offset)
+                # Una línea a medio escribir se vuelve a leer en la próxima vuelta
+                complete, _, partial = text.rpartition("\n")
+                events_offset -= len(partial.encode("utf-8"))
+                for line in complete.splitlines():
+                    yield {"event": "bot_event", "data": line}
             yield {"data": json.dumps(ex)}
             if ex["status"] in ("completed", "failed", "cancelled", "interrupted"):
                 return
             await asyncio.sleep(1)
 
-    return EventSourceResponse(generator())
+    return EventSourceResponse(metrics.tracked_stream(generator(), "execution"))
 
 
-@app.post("/api/executions/{execution_id}/cancel")
-def cancel_execution(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
-    executions = _load(EXECUTIONS_FILE)
-    ex = next((e for e in executions if e["id"] == execution_id), None)
-    if not ex:
-        raise HTTPException(404, "Ejecución no encontrada")
-    if ex["status"] not in ("queued", "running"):
-        raise HTTPException(400, "La ejecución ya finalizó")
-    # Intentar terminar proceso en ejecución
-    killed = executor.cancel_running_process(execution_id)
+def _mark_cancelled(ex: dict, executions: Optional[list[dict]] = None) -> list[dict]:
+    """Marca la ejecución como cancelada en memoria (y las hijas pendientes de un fan-out,
+    si se pasa `executions`). El llamador persiste la lista y después llama a
+    _stop_cancelled con lo retornado.
 
+    Detener procesos va aparte porque en modo multi-proceso es una llamada al engine,
+    y el engine también escribe executions.json: no puede hacerse con el lock tomado."""
     ex["status"] = "cancelled"
     ex["completed_at"] = datetime.now().isoformat()
-    if killed:
-        ex["exit_code"] = -9
-        ex["error_message"] = "Proceso terminado por cancelación"
-    _save(EXECUTIONS_FILE, executions)
-    return {"ok": True, "killed": killed}
+    marked = [ex]
+    if ex.get("children_ids") and executions is not None:
+        children = set(ex["children_ids"])
+        for child in executions:
+            if child["id"] in children and child["status"] in ("queued", "running"):
+                marked += _mark_cancelled(child)
+    return marked
+
+
+def _stop_cancelled(marked: list[dict]) -> int:
+    """Saca de la cola o termina las ejecuciones ya guardadas como canceladas.
+    Retorna cuántos procesos se terminaron."""
+    killed = 0
+    for ex in marked:
+        if ex.get("children_ids"):
+            fanout.drop_pending(ex["id"])
+        if queue_manager.remove(ex["id"]):
+            # Los hooks (fan-out, pipelines) ven el estado "cancelled" ya guardado
+            queue_manager.notify_removed(ex["id"])
+        elif executor.cancel_running_process(ex["id"]) or agents.request_cancel(ex["id"]):
+            executor.update_execution(ex["id"], {
+                "exit_code": -9,
+                "error_message": "Proceso terminado por cancelación",
+            })
+            killed += 1
+    return killed
+
+
+@app.post("/api/executions/{execution_id}/cancel")
+def cancel_execution(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        ex = next((e for e in executions if e["id"] == execution_id), None)
+        if not ex:
+            raise HTTPException(404, "Ejecución no encontrada")
+        if ex["status"] not in ("queued", "running"):
+            raise HTTPException(400, "La ejecución ya finalizó")
+        marked = _mark_cancelled(ex, executions)
+    return {"ok": True, "killed": _stop_cancelled(marked) > 0}
 
 
 @app.delete("/api/executions/{execution_id}")
@@ -518,6 +910,8 @@ def delete_execution(execution_id: str, current_user: dict = Depends(auth.get_cu
     executions = _load(EXECUTIONS_FILE)
     ex = next((e for e in executions if e["id"] == execution_id), None)
     if not ex:
+        if archive.find(execution_id):
+            raise HTTPException(409, "La ejecución está archivada y no se puede eliminar")
         raise HTTPException(404, "Ejecución no encontrada")
     
     # No permitir eliminar ejecuciones en curso
@@ -535,25 +929,39 @@ def delete_execution(execution_id: str, current_user: dict = Depends(auth.get_cu
                 raise HTTPException(500, f"Error eliminando archivos: {e}")
     
     # Eliminar entrada del JSON
-    executions = [e for e in executions if e["id"] != execution_id]
-    _save(EXECUTIONS_FILE, executions)
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        executions[:] = [e for e in executions if e["id"] != execution_id]
+    log_index.remove([execution_id])
     
     return {"ok": True, "message": "Ejecución eliminada correctamente"}
 
 
 @app.get("/api/executions/{execution_id}/files")
-def list_execution_files(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
-    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+def list_execution_files(execution_id: str, request: Request, current_user: dict = Depends(auth.get_current_user)):
+    ex = _find_execution(execution_id)
     if not ex or not ex.get("run_folder"):
         return {"logs": [], "resultados": []}
-    return executor.list_execution_files(ex["run_folder"])
+    files = executor.list_execution_files(ex["run_folder"])
+    return http_cache.json_response(request, http_cache.content_etag(files), lambda: files)
+
+
+@app.get("/api/executions/{execution_id}/resources")
+def execution_resources(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
+    """Resumen y serie temporal de CPU/memoria/IO del árbol de procesos de la ejecución."""
+    ex = _find_execution(execution_id)
+    if not ex:
+        raise HTTPException(404, "Ejecución no encontrada")
+    samples = []
+    if ex.get("run_folder"):
+        samples = resource_monitor.read_samples(Path(__file__).parent / ex["run_folder"])
+    return {"summary": ex.get("resources") or {}, "samples": samples}
 
 
 @app.get("/api/executions/{execution_id}/download/{file_path:path}")
 def download_execution_file(
     execution_id: str, file_path: str, current_user: dict = Depends(auth.get_current_user)
 ):
-    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+    ex = _find_execution(execution_id)
     if not ex or not ex.get("run_folder"):
         raise HTTPException(404, "Ejecución sin archivos")
     full = executor.get_execution_file_path(ex["run_folder"], file_path)
@@ -565,7 +973,7 @@ def download_execution_file(
 @app.get("/api/executions/{execution_id}/file-text")
 def execution_file_text(execution_id: str, file_path: str, current_user: dict = Depends(auth.get_current_user)):
     """Devuelve un archivo de la ejecución como texto UTF-8 para previsualizar en el frontend."""
-    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+    ex = _find_execution(execution_id)
     if not ex or not ex.get("run_folder"):
         raise HTTPException(404, "Ejecución sin archivos")
     full = executor.get_execution_file_path(ex["run_folder"], file_path)
@@ -581,7 +989,7 @@ def execution_file_text(execution_id: str, file_path: str, current_user: dict =
 @app.get("/api/executions/{execution_id}/stream-log")
 async def stream_log(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
     """SSE: stream del contenido de run.log en tiempo real."""
-    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+    ex = await io_pool.run(_find_execution, execution_id)
     if not ex:
         raise HTTPException(404, "Ejecución no encontrada")
     
@@ -595,49 +1003,38 @@ async def stream_log(execution_id: str, current_user: dict = Depends(auth.get_cu
         iteration = 0
         
         # Enviar contenido existente primero
-        if log_file and log_file.exists():
+        if log_file:
             try:
-                with open(log_file, "r", encoding="utf-8", errors="replace") as f:
-                    existing_content = f.read()
-                    if existing_content:
-                        yield {"data": json.dumps({"content": existing_content, "append": False})}
-                        last_size = log_file.stat().st_size
+                existing_content, last_size = await io_pool.run(io_pool.read_text_from, log_file)
+                if existing_content:
+                    yield {"data": json.dumps({"content": existing_content, "append": False})}
             except Exception as e:
                 yield {"data": json.dumps({"error": f"read_error: {str(e)}"})}
         
         while iteration < max_iterations:
             # Verificar estado de la ejecución
-            current_ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+            current_ex = await io_pool.run(_find_execution, execution_id)
             if not current_ex:
                 yield {"data": json.dumps({"error": "not_found"})}
                 return
             
             # Si el archivo existe, leer contenido nuevo
-            if log_file and log_file.exists():
+            if log_file:
                 try:
-                    current_size = log_file.stat().st_size
-                    if current_size > last_size:
-                        with open(log_file, "r", encoding="utf-8", errors="replace") as f:
-                            f.seek(last_size)
-                            new_content = f.read()
-                            if new_content:
-                                yield {"data": json.dumps({"content": new_content, "append": True})}
-                                last_size = current_size
+                    new_content, last_size = await io_pool.run(io_pool.read_text_from, log_file, last_size)
+                    if new_content:
+                        yield {"data": json.dumps({"content": new_content, "append": True})}
                 except Exception as e:
                     yield {"data": json.dumps({"error": f"read_error: {str(e)}"})}
             
             # Si la ejecución terminó, enviar señal final
             if current_ex["status"] in ("completed", "failed", "cancelled", "interrupted"):
                 # Leer cualquier contenido final
-                if log_file and log_file.exists():
+                if log_file:
                     try:
-                        current_size = log_file.stat().st_size
-                        if current_size > last_size:
-                            with open(log_file, "r", encoding="utf-8", errors="replace") as f:
-                                f.seek(last_size)
-                                new_content = f.read()
-                                if new_content:
-                                    yield {"data": json.dumps({"content": new_content, "append": True})}
+                        new_content, last_size = await io_pool.run(io_pool.read_text_from, log_file, last_size)
+                        if new_content:
+                            yield {"data": json.dumps({"content": new_content, "append": True})}
                     except Exception:
                         pass
                 
@@ -649,12 +1046,12 @@ async def stream_log(execution_id: str, current_user: dict = Depends(auth.get_cu
         
         yield {"data": json.dumps({"done": True, "timeout": True})}
     
-    return EventSourceResponse(generator())
+    return EventSourceResponse(metrics.tracked_stream(generator(), "log"))
 
 
 @app.get("/api/executions/{execution_id}/download-zip")
 def download_execution_zip(execution_id: str, current_user: dict = Depends(auth.get_current_user)):
-    ex = next((e for e in _load(EXECUTIONS_FILE) if e["id"] == execution_id), None)
+    ex = _find_execution(execution_id)
     if not ex or not ex.get("run_folder"):
         raise HTTPException(404, "Ejecución sin archivos")
 
@@ -679,6 +1076,48 @@ def download_execution_zip(execution_id: str, current_user: dict = Depends(auth.
     return StreamingResponse(buf, media_type="application/zip", headers={"Content-Disposition": f'attachment; filename="{zip_name}"'})
 
 
+# ── Lotes ────────────────────────────────────────────────────────────────────
+
+def _batch_summary(batch_id: str, batch: list[dict]) -> dict:
+    counts = {s: 0 for s in ("queued", "running", "completed", "failed", "cancelled", "interrupted")}
+    for e in batch:
+        counts[e["status"]] = counts.get(e["status"], 0) + 1
+    finished = len(batch) - counts["queued"] - counts["running"]
+    return {
+        "batch_id": batch_id,
+        "bot_id": batch[0]["bot_id"],
+        "total": len(batch),
+        "finished": finished,
+        "progress": round(finished / len(batch), 4),
+        "done": finished == len(batch),
+        "counts": counts,
+        "execution_ids": [e["id"] for e in batch],
+    }
+
+
+@app.get("/api/batches/{batch_id}")
+def get_batch(batch_id: str, current_user: dict = Depends(auth.get_current_user)):
+    batch = [e for e in _load(EXECUTIONS_FILE) if e.get("batch_id") == batch_id]
+    if not batch:
+        raise HTTPException(404, "Lote no encontrado")
+    return _batch_summary(batch_id, batch)
+
+
+@app.post("/api/batches/{batch_id}/cancel")
+def cancel_batch(batch_id: str, current_user: dict = Depends(auth.get_current_user)):
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        batch = [e for e in executions if e.get("batch_id") == batch_id]
+        if not batch:
+            raise HTTPException(404, "Lote no encontrado")
+        marked: list[dict] = []
+        for ex in batch:
+            if ex["status"] in ("queued", "running"):
+                marked += _mark_cancelled(ex, executions)
+    cancelled = len(marked)
+    killed = _stop_cancelled(marked)
+    return {"ok": True, "cancelled": cancelled, "killed": killed, **_batch_summary(batch_id, batch)}
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  ADMIN — USUARIOS
 # ══════════════════════════════════════════════════════════════════════════════
@@ -750,27 +1189,279 @@ def admin_delete_bot(bot_id: str, current_user: dict = Depends(auth.require_supe
 # ══════════════════════════════════════════════════════════════════════════════
 
 @app.get("/api/stats")
-def get_stats(current_user: dict = Depends(auth.get_current_user)):
+def get_stats(request: Request, current_user: dict = Depends(auth.get_current_user)):
+    today = datetime.now().strftime("%Y-%m-%d")
+    # executions_today cambia a medianoche sin que cambie ningún archivo: sin Last-Modified
+    return _versioned_response(
+        request, [EXECUTIONS_FILE, BOTS_FILE, archive.index_file()], lambda: _stats(today), today, last_modified=False,
+    )
+
+
+def _stats(today: str) -> Stats:
     executions = _load(EXECUTIONS_FILE)
     bots = _load(BOTS_FILE)
-    today = datetime.now().strftime("%Y-%m-%d")
+    archived = archive.totals()
 
     stats = Stats(
-        total_executions=len(executions),
+        total_executions=len(executions) + archived["total"],
         executions_today=sum(1 for e in executions if e.get("queued_at", "").startswith(today)),
         executions_running=sum(1 for e in executions if e["status"] == "running"),
         executions_queued=sum(1 for e in executions if e["status"] == "queued"),
-        executions_completed=sum(1 for e in executions if e["status"] == "completed"),
-        executions_failed=sum(1 for e in executions if e["status"] == "failed"),
+        executions_completed=sum(1 for e in executions if e["status"] == "completed") + archived.get("completed", 0),
+        executions_failed=sum(1 for e in executions if e["status"] == "failed") + archived.get("failed", 0),
+        executions_archived=archived["total"],
         total_bots=len(bots),
         bots_enabled=sum(1 for b in bots if b.get("enabled", True)),
     )
     return stats
 
 
+def _csv_param(value: Optional[str]) -> list[str]:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+
+@app.get("/api/analytics/executions")
+def get_execution_analytics(
+    group_by: str = Query("bot", description="Dimensiones separadas por coma: bot, status, source, user, agent, failure_reason y/o un bucket hour|day|week|month"),
+    metrics: str = Query("count,failure_rate,avg_duration"),
+    bot_id: Optional[str] = Query(None, description="Uno o varios, separados por coma"),
+    status: Optional[str] = Query(None),
+    source: Optional[str] = Query(None, description="scheduler, manual, batch, fanout, pipeline, cache"),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None, description="YYYY-MM-DD incluye el día"),
+    current_user: dict = Depends(auth.get_current_user),
+):
+    """Agregaciones sobre la historia de ejecuciones terminadas (ver analytics), p. ej.
+    duración promedio por bot y semana: group_by=bot,week&metrics=avg_duration."""
+    try:
+        return analytics.query(
+            _csv_param(group_by), _csv_param(metrics) or ["count"],
+            _csv_param(bot_id), _csv_param(status), _csv_param(source), date_from, date_to,
+        )
+    except analytics.AnalyticsError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.post("/api/admin/analytics/rebuild")
+def rebuild_analytics(current_user: dict = Depends(auth.require_admin)):
+    """Rehace la historia analítica desde executions.json (refleja ejecuciones borradas)."""
+    return {"ok": True, "executions": analytics.rebuild()}
+
+
+def _visible_queue_items(items: list[dict], current_user: dict) -> list[dict]:
+    if current_user["role"] in ("superadmin", "admin"):
+        return items
+    allowed = set(current_user.get("allowed_bot_ids", []))
+    return [i for i in items if i["bot_id"] in allowed]
+
+
 @app.get("/api/queue-status")
 def queue_status(current_user: dict = Depends(auth.get_current_user)):
-    return queue_manager.get_queue_status()
+    """Tamaño de cada cola y, por cola, ocupación de workers y la lista de espera con
+    posición, ETA y estado de SLA (los usuarios solo ven los items de sus bots)."""
+    overview = queue_eta.queue_overview(_load(EXECUTIONS_FILE), _load(BOTS_FILE))
+    for queue in overview.values():
+        queue["queued"] = _visible_queue_items(queue["queued"], current_user)
+        queue["running"] = _visible_queue_items(queue["running"], current_user)
+    return {**queue_manager.get_queue_status(), "queues": overview}
+
+
+@app.get("/api/admin/queue")
+def admin_list_queue(current_user: dict = Depends(auth.require_admin)):
+    """Contenido de cada cola en orden de salida."""
+    by_id = {e["id"]: e for e in _load(EXECUTIONS_FILE)}
+    result = {}
+    for kind, state in queue_manager.snapshot().items():
+        result[kind] = {
+            "workers": state["workers"],
+            "running": list(state["running"]),
+            "queued": [
+                {
+                    "position": position,
+                    "execution_id": eid,
+                    "bot_id": by_id.get(eid, {}).get("bot_id"),
+                    "bot_name": by_id.get(eid, {}).get("bot_name"),
+                    "status": by_id.get(eid, {}).get("status"),
+                    "queued_at": by_id.get(eid, {}).get("queued_at"),
+                    "triggered_by_name": by_id.get(eid, {}).get("triggered_by_name"),
+                }
+                for position, eid in enumerate(state["queued"], start=1)
+            ],
+        }
+    return result
+
+
+@app.post("/api/admin/queue/{execution_id}/move")
+def admin_move_queued(execution_id: str, body: QueueMoveRequest, current_user: dict = Depends(auth.require_admin)):
+    if not queue_manager.move(execution_id, front=body.position == "front"):
+        raise HTTPException(404, "La ejecución no está en cola")
+    return {"ok": True}
+
+
+@app.delete("/api/admin/queue/{execution_id}")
+def admin_remove_queued(execution_id: str, current_user: dict = Depends(auth.require_admin)):
+    """Saca una ejecución de la cola y la marca cancelada."""
+    with storage.transaction(EXECUTIONS_FILE) as executions:
+        ex = next((e for e in executions if e["id"] == execution_id), None)
+        if not ex or ex["status"] != "queued":
+            raise HTTPException(404, "La ejecución no está en cola")
+        marked = _mark_cancelled(ex, executions)
+    _stop_cancelled(marked)
+    return {"ok": True}
+
+
+@app.get("/api/queue/sla-alerts")
+def queue_sla_alerts(current_user: dict = Depends(auth.get_current_user)):
+    """Ejecuciones en espera que superaron el SLA de su bot."""
+    overview = queue_eta.queue_overview(_load(EXECUTIONS_FILE), _load(BOTS_FILE))
+    return _visible_queue_items(queue_eta.breached(overview), current_user)
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  AGENTES REMOTOS (ver agents.py)
+# ══════════════════════════════════════════════════════════════════════════════
+
+def _agent_auth(x_agent_token: str = Header("")):
+    if not agents.enabled():
+        raise HTTPException(403, "Agentes remotos deshabilitados (AGENT_TOKEN no configurado)")
+    # compare_digest: tiempo constante; con bytes para no fallar ante un header no ASCII
+    if not hmac.compare_digest(x_agent_token.encode(), agents.AGENT_TOKEN.encode()):
+        raise HTTPException(401, "Token de agente inválido")
+
+
+async def _unless_disconnected(request: Request, coro):
+    """Corre `coro` y la cancela si el cliente corta la conexión (long-poll)."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=1.0)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                return None
+    finally:
+        task.cancel()
+
+
+@app.post("/api/agents/register", dependencies=[Depends(_agent_auth)])
+def register_agent(body: AgentRegistration):
+    return agents.register(body.model_dump())
+
+
+@app.delete("/api/agents/{agent_id}", dependencies=[Depends(_agent_auth)])
+async def unregister_agent(agent_id: str):
+    await agents.unregister(agent_id)
+    return {"ok": True}
+
+
+@app.post("/api/agents/{agent_id}/lease", dependencies=[Depends(_agent_auth)])
+async def lease_execution(agent_id: str, request: Request, wait: float = Query(25, ge=0, le=60)):
+    """Long-poll: retorna un trabajo o 204 si no hubo ninguno en `wait` segundos."""
+    job = await _unless_disconnected(request, agents.acquire(agent_id, wait))
+    if job is None:
+        return Response(status_code=204)
+    return job
+
+
+async def _renew_lease(agent_id: str, execution_id: str) -> tuple[Path, dict]:
+    lease = await agents.renew(agent_id, execution_id)
+    return Path(lease.pop("run_folder")), lease
+
+
+@app.post("/api/agents/{agent_id}/leases/{execution_id}/heartbeat", dependencies=[Depends(_agent_auth)])
+async def agent_heartbeat(agent_id: str, execution_id: str):
+    _, lease = await _renew_lease(agent_id, execution_id)
+    return lease
+
+
+@app.post("/api/agents/{agent_id}/leases/{execution_id}/log", dependencies=[Depends(_agent_auth)])
+async def agent_append_log(agent_id: str, execution_id: str, request: Request):
+    """Agrega al run.log los bytes del body (salida nueva del script)."""
+    run_folder, lease = await _renew_lease(agent_id, execution_id)
+    await agents.append_log(execution_id, run_folder, await request.body())
+    return lease
+
+
+@app.put("/api/agents/{agent_id}/leases/{execution_id}/files/{file_path:path}", dependencies=[Depends(_agent_auth)])
+async def agent_upload_file(agent_id: str, execution_id: str, file_path: str, request: Request):
+    run_folder, _ = await _renew_lease(agent_id, execution_id)
+    target = agents.artifact_path(run_folder, file_path)
+    if target is None:
+        raise HTTPException(400, "Ruta inválida: debe estar dentro de logs/ o resultados/")
+    size = await agents.save_artifact(target, request.stream())
+    return {"ok": True, "size": size}
+
+
+@app.post("/api/agents/{agent_id}/leases/{execution_id}/complete", dependencies=[Depends(_agent_auth)])
+async def agent_complete(agent_id: str, execution_id: str, body: AgentCompletion):
+    status = await agents.complete(agent_id, execution_id, body.model_dump())
+    return {"ok": True, "status": status}
+
+
+@app.get("/api/admin/agents")
+def admin_list_agents(current_user: dict = Depends(auth.require_admin)):
+    return {"enabled": agents.enabled(), "agents": agents.list_agents()}
+
+
+# ══════════════════════════════════════════════════════════════════════════════
+#  ADMIN — DIAGNÓSTICO (tracing, profiling y lag del event loop)
+# ══════════════════════════════════════════════════════════════════════════════
+
+@app.get("/api/admin/tracing")
+def get_tracing(current_user: dict = Depends(auth.require_admin)):
+    return tracing.status()
+
+
+@app.put("/api/admin/tracing")
+def update_tracing(body: TracingUpdate, current_user: dict = Depends(auth.require_admin)):
+    try:
+        tracing.configure(body.enabled, body.trace_file)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return tracing.status()
+
+
+@app.get("/api/admin/tracing/spans")
+def get_tracing_spans(
+    limit: int = Query(1000, ge=0, le=tracing.BUFFER_SIZE),
+    name: str = Query("", description="Prefijo del nombre del span (ej. storage.)"),
+    format: str = Query("otlp", pattern="^(otlp|raw)$"),
+    current_user: dict = Depends(auth.require_admin),
+):
+    spans = tracing.recent_spans(limit, name)
+    return tracing.to_otlp(spans) if format == "otlp" else spans
+
+
+@app.delete("/api/admin/tracing/spans")
+def clear_tracing_spans(current_user: dict = Depends(auth.require_admin)):
+    tracing.clear()
+    return {"ok": True}
+
+
+@app.get("/api/admin/loop-lag")
+def get_loop_lag(current_user: dict = Depends(auth.require_admin)):
+    """Últimos bloqueos del event loop de este proceso, con el stack que lo frenaba."""
+    return loop_monitor.status()
+
+
+@app.post("/api/admin/profile")
+async def run_profile(
+    seconds: float = Query(10, gt=0, le=profiler.MAX_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=1000),
+    include_idle: bool = Query(False),
+    current_user: dict = Depends(auth.require_admin),
+):
+    """Muestrea el CPU de todo el proceso durante N segundos y devuelve las pilas en formato
+    folded (flamegraph.pl / speedscope). El muestreo corre en un thread aparte."""
+    try:
+        counts, samples = await asyncio.to_thread(profiler.sample, seconds, interval_ms / 1000, include_idle)
+    except profiler.ProfilerBusy:
+        raise HTTPException(409, "Ya hay un perfil en curso")
+    filename = f"profile_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.folded"
+    return PlainTextResponse(
+        profiler.folded(counts),
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Profile-Samples": str(samples)},
+    )
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -851,6 +1542,110 @@ def delete_schedule(schedule_id: str, current_user: dict = Depends(auth.get_curr
     return {"ok": True}
 
 
+# ══════════════════════════════════════════════════════════════════════════════
+#  PIPELINES
+# ══════════════════════════════════════════════════════════════════════════════
+
+@app.get("/api/pipelines")
+def list_pipelines(current_user: dict = Depends(auth.get_current_user)):
+    items = _load(pipelines.PIPELINES_FILE)
+    if current_user["role"] in ("superadmin", "admin"):
+        return items
+    allowed = set(current_user.get("allowed_bot_ids", []))
+    return [p for p in items if all(s["bot_id"] in allowed for s in p["steps"])]
+
+
+@app.post("/api/pipelines")
+def create_pipeline(body: PipelineCreate, current_user: dict = Depends(auth.require_admin)):
+    error = pipelines.validate_steps(body.steps, _load(BOTS_FILE))
+    if error:
+        raise HTTPException(400, error)
+    pipeline = Pipeline(**body.model_dump(), created_by=current_user["email"])
+    with storage.transaction(pipelines.PIPELINES_FILE) as items:
+        items.append(pipeline.model_dump())
+    return pipeline.model_dump()
+
+
+@app.put("/api/pipelines/{pipeline_id}")
+def update_pipeline(pipeline_id: str, body: PipelineUpdate, current_user: dict = Depends(auth.require_admin)):
+    if body.steps is not None:
+        error = pipelines.validate_steps(body.steps, _load(BOTS_FILE))
+        if error:
+            raise HTTPException(400, error)
+    with storage.transaction(pipelines.PIPELINES_FILE) as items:
+        pipeline = next((p for p in items if p["id"] == pipeline_id), None)
+        if not pipeline:
+            raise HTTPException(404, "Pipeline no encontrado")
+        for k, v in body.model_dump(exclude_none=True).items():
+            pipeline[k] = v
+    return pipeline
+
+
+@app.delete("/api/pipelines/{pipeline_id}")
+def delete_pipeline(pipeline_id: str, current_user: dict = Depends(auth.require_admin)):
+    with storage.transaction(pipelines.PIPELINES_FILE) as items:
+        items[:] = [p for p in items if p["id"] != pipeline_id]
+    return {"ok": True}
+
+
+@app.post("/api/pipelines/{pipeline_id}/run")
+async def run_pipeline(
+    pipeline_id: str,
+    body: PipelineRunRequest = PipelineRunRequest(),
+    current_user: dict = Depends(auth.get_current_user),
+):
+    pipeline = next((p for p in _load(pipelines.PIPELINES_FILE) if p["id"] == pipeline_id), None)
+    if not pipeline:
+        raise HTTPException(404, "Pipeline no encontrado")
+    if not pipeline.get("enabled", True):
+        raise HTTPException(400, "Pipeline deshabilitado")
+    if current_user["role"] not in ("superadmin", "admin"):
+        allowed = set(current_user.get("allowed_bot_ids", []))
+        if any(s["bot_id"] not in allowed for s in pipeline["steps"]):
+            raise HTTPException(403, "Sin acceso a todos los bots del pipeline")
+
+    safe_input = {k: v for k, v in body.input_data.items()
+                  if k.upper() not in executor.SENSITIVE_ENV_KEYS}
+    secrets = {}
+    for key in executor.SENSITIVE_ENV_KEYS:
+        val = body.input_data.get(key.lower(), "") or body.input_data.get(key, "")
+        if val:
+            secrets[key] = val
+
+    return await pipelines.start_run(
+        pipeline, safe_input, secrets, current_user["email"], current_user["name"],
+    )
+
+
+@app.get("/api/pipelines/{pipeline_id}/runs")
+def list_pipeline_runs(pipeline_id: str, current_user: dict = Depends(auth.get_current_user)):
+    return [r for r in _load(pipelines.PIPELINE_RUNS_FILE) if r["pipeline_id"] == pipeline_id]
+
+
+@app.get("/api/pipeline-runs/{run_id}")
+def get_pipeline_run(run_id: str, current_user: dict = Depends(auth.get_current_user)):
+    run = pipelines.load_run(run_id)
+    if not run:
+        raise HTTPException(404, "Run de pipeline no encontrado")
+    ids = set(run["step_executions"].values())
+    steps = {e["pipeline_step"]: e for e in _load(EXECUTIONS_FILE) if e["id"] in ids}
+    for execution_id in ids - {e["id"] for e in steps.values()}:
+        ex = archive.find(execution_id)  # Runs viejos: los pasos ya pueden estar archivados
+        if ex:
+            steps[ex["pipeline_step"]] = ex
+    return {**run, "steps": steps}
+
+
+@app.post("/api/pipeline-runs/{run_id}/cancel")
+def cancel_pipeline_run(run_id: str, current_user: dict = Depends(auth.get_current_user)):
+    marked: list[dict] = []
+    run = pipelines.cancel_run(run_id, lambda ex, executions: marked.extend(_mark_cancelled(ex, executions)))
+    _stop_cancelled(marked)
+    if not run:
+        raise HTTPException(404, "Run de pipeline no encontrado")
+    return run
+
+
 # ══════════════════════════════════════════════════════════════════════════════
 #  HEALTH
 # ══════════════════════════════════════════════════════════════════════════════
@@ -860,8 +1655,32 @@ def health():
     return {"status": "ok", "timestamp": datetime.now().isoformat()}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics(authorization: str = Header("")):
+    """Métricas en formato Prometheus. Si METRICS_TOKEN está definido se exige como Bearer."""
+    if METRICS_TOKEN and not hmac.compare_digest(authorization.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        raise HTTPException(401, "Token de métricas inválido")
+    counts: dict[str, int] = {}
+    for ex in _load(EXECUTIONS_FILE):
+        counts[ex.get("status", "")] = counts.get(ex.get("status", ""), 0) + 1
+    metrics.EXECUTIONS.clear()
+    for status, count in counts.items():
+        metrics.EXECUTIONS.set(count, status=status)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ── Arranque ─────────────────────────────────────────────────────────────────
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8002, reload=False)
+    import sys
+
+    if sys.argv[1:] == ["engine"]:
+        engine.set_role("engine")
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+        try:
+            asyncio.run(run_engine())
+        except KeyboardInterrupt:
+            pass
+    else:
+        import uvicorn
+        uvicorn.run("main:app", host="0.0.0.0", port=8002, reload=False)
@@ -0,0 +1,246 @@
+"""Métricas in-process en formato de exposición de Prometheus (text/plain 0.0.4).
+
+Implementación mínima sin dependencias: Counter, Gauge e Histogram con labels,
+protegidos por un lock (los handlers sync corren en el threadpool). Registrar una
+observación cuesta un dict lookup + bisect; el render solo ocurre al scrapear /metrics.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Para tiempos de cola y duraciones de bots (segundos a horas)
+LONG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200, 14400)
+
+_registry: list["_Metric"] = []
+_collectors: list[Callable[[], None]] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key → [conteos por bucket..., +Inf], suma
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][idx] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(c), s[0]) for k, (c, s) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def register_collector(fn: Callable[[], None]):
+    """Registra una función que actualiza gauges justo antes de cada scrape."""
+    _collectors.append(fn)
+
+
+def render() -> str:
+    for fn in _collectors:
+        try:
+            fn()
+        except Exception:
+            pass
+    lines: list[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def elapsed_since(iso_timestamp: Optional[str]) -> Optional[float]:
+    """Segundos desde un timestamp ISO local (como los de las ejecuciones)."""
+    if not iso_timestamp:
+        return None
+    from datetime import datetime
+    try:
+        return (datetime.now() - datetime.fromisoformat(iso_timestamp)).total_seconds()
+    except ValueError:
+        return None
+
+
+async def tracked_stream(stream: AsyncIterator, name: str) -> AsyncIterator:
+    """Envuelve el generador de un endpoint SSE para contar sus suscriptores abiertos."""
+    SSE_SUBSCRIBERS.inc(stream=name)
+    try:
+        async for item in stream:
+            yield item
+    finally:
+        SSE_SUBSCRIBERS.dec(stream=name)
+
+
+class HttpMetricsMiddleware:
+    """Middleware ASGI que mide la latencia hasta el inicio de la respuesta por ruta.
+
+    Se usa la plantilla de la ruta (/api/executions/{execution_id}) para no generar
+    una serie por id. En streams SSE se mide el tiempo hasta el primer byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        observed = False
+
+        async def send_wrapper(message):
+            nonlocal observed
+            if message["type"] == "http.response.start" and not observed:
+                observed = True
+                route = scope.get("route")
+                HTTP_LATENCY.observe(
+                    time.perf_counter() - t0,
+                    method=scope.get("method", ""),
+                    route=getattr(route, "path", "unmatched"),
+                    status=message.get("status", 0),
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# ── Métricas del orquestador ─────────────────────────────────────────────────
+
+QUEUE_DEPTH = Gauge("orquestador_queue_depth", "Ejecuciones esperando en cada cola", ("queue",))
+WORKERS = Gauge("orquestador_workers", "Workers por cola y estado", ("queue", "state"))
+QUEUE_WAIT = Histogram(
+    "orquestador_queue_wait_seconds", "Tiempo entre encolado e inicio de una ejecución",
+    ("bot_id",), LONG_BUCKETS,
+)
+RUN_DURATION = Histogram(
+    "orquestador_run_duration_seconds", "Duración de las ejecuciones de bots",
+    ("bot_id", "status"), LONG_BUCKETS,
+)
+EXECUTIONS = Gauge("orquestador_executions", "Ejecuciones registradas por estado", ("status",))
+SCHEDULER_TICK = Histogram("orquestador_scheduler_tick_seconds", "Duración de cada revisión del scheduler")
+PERSISTENCE = Histogram(
+    "orquestador_persistence_seconds", "Latencia de lectura/escritura de los archivos JSON",
+    ("op", "file"),
+)
+SSE_SUBSCRIBERS = Gauge("orquestador_sse_subscribers", "Conexiones SSE abiertas", ("stream",))
+HTTP_LATENCY = Histogram(
+    "orquestador_http_request_seconds", "Latencia de requests HTTP por ruta",
+    ("method", "route", "status"),
+)
@@ -36,6 +36,8 @@ class UserBotsUpdate(BaseModel):
 
 # ── Bots ────────────────────────────────────────────────────────────────────
 
+BotPriority = Literal["normal", "low", "idle"]
+
 class Bot(BaseModel):
     id: str = Field(default_factory=gen_id)
     name: str
@@ -48,6 +50,20 @@ class Bot(BaseModel):
     icon: str = "Bot"
     supports_data_input: bool = False
     supports_scheduling: bool = False
+    cache_results: bool = False          # Reutilizar resultados de runs idénticos
+    cache_ttl_hours: float = 24.0
+    single_flight: bool = False          # Unir pedidos idénticos a la ejecución en curso
+    warm_pool_size: int = 0              # Intérpretes pre-lanzados (0 = desactivado)
+    warm_preload_modules: list[str] = []
+    warm_max_runs: int = 1               # Ejecuciones por intérprete antes de reciclarlo
+    warm_max_rss_mb: int = 0             # Reciclar si supera esta memoria (0 = sin límite)
+    limit_memory_mb: int = 0             # Límites de recursos (0 = sin límite), ver resource_limits
+    limit_cpu_seconds: int = 0
+    limit_open_files: int = 0
+    limit_wall_seconds: int = 0
+    priority: BotPriority = "normal"
+    queue_sla_seconds: int = 0           # Espera máxima en cola antes de alertar (0 = sin SLA)
+    agent_tags: list[str] = []           # Solo corre en agentes remotos con todos estos tags
     created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
 
 
@@ -62,6 +78,20 @@ class BotCreate(BaseModel):
     icon: str = "Bot"
     supports_data_input: bool = False
     supports_scheduling: bool = False
+    cache_results: bool = False          # Reutilizar resultados de runs idénticos
+    cache_ttl_hours: float = 24.0
+    single_flight: bool = False          # Unir pedidos idénticos a la ejecución en curso
+    warm_pool_size: int = 0              # Intérpretes pre-lanzados (0 = desactivado)
+    warm_preload_modules: list[str] = []
+    warm_max_runs: int = 1               # Ejecuciones por intérprete antes de reciclarlo
+    warm_max_rss_mb: int = 0             # Reciclar si supera esta memoria (0 = sin límite)
+    limit_memory_mb: int = 0             # Límites de recursos (0 = sin límite), ver resource_limits
+    limit_cpu_seconds: int = 0
+    limit_open_files: int = 0
+    limit_wall_seconds: int = 0
+    priority: BotPriority = "normal"
+    queue_sla_seconds: int = 0           # Espera máxima en cola antes de alertar (0 = sin SLA)
+    agent_tags: list[str] = []           # Solo corre en agentes remotos con todos estos tags
 
 
 class BotUpdate(BaseModel):
@@ -75,6 +105,20 @@ class BotUpdate(BaseModel):
     icon: Optional[str] = None
     supports_data_input: Optional[bool] = None
     supports_scheduling: Optional[bool] = None
+    cache_results: Optional[bool] = None
+    cache_ttl_hours: Optional[float] = None
+    single_flight: Optional[bool] = None
+    warm_pool_size: Optional[int] = None
+    warm_preload_modules: Optional[list[str]] = None
+    warm_max_runs: Optional[int] = None
+    warm_max_rss_mb: Optional[int] = None
+    limit_memory_mb: Optional[int] = None
+    limit_cpu_seconds: Optional[int] = None
+    limit_open_files: Optional[int] = None
+    limit_wall_seconds: Optional[int] = None
+    priority: Optional[BotPriority] = None
+    queue_sla_seconds: Optional[int] = None
+    agent_tags: Optional[list[str]] = None
 
 
 # ── Ejecuciones ─────────────────────────────────────────────────────────────
@@ -97,10 +141,95 @@ class BotExecution(BaseModel):
     error_message: str = ""
     duration_seconds: float = 0.0
     input_data: dict = {}
+    batch_id: Optional[str] = None
+    parent_id: Optional[str] = None      # Hija de un fan-out
+    fanout_value: Optional[str] = None   # Valor asignado a esta hija (p. ej. servidor)
+    children_ids: list[str] = []         # Solo en el padre de un fan-out
+    pipeline_run_id: Optional[str] = None
+    pipeline_step: Optional[str] = None
+    upstream_run_folders: dict[str, str] = {}  # step → run_folder de los pasos previos
+    cache_key: Optional[str] = None
+    cached_from: Optional[str] = None    # Ejecución original cuando se sirvió desde caché
+    coalesced_requests: list[dict] = []  # Pedidos idénticos unidos a esta ejecución (single-flight)
+    resources: dict = {}                 # Resumen de CPU/memoria/IO (ver resource_monitor)
+    failure_reason: Optional[str] = None  # memory_limit | cpu_limit | open_files_limit | time_limit | agent_lost
+    sla_breached_at: Optional[str] = None  # Cuándo superó el SLA de espera en cola de su bot
+    agent_id: Optional[str] = None       # Agente remoto que la ejecutó (None = worker local)
+    agent_name: Optional[str] = None
+    lease_attempts: int = 0              # Leases otorgados (más de 1 = se reintentó tras perder un agente)
+    progress: Optional[dict] = None      # Resumen de los eventos del bot (ver bot_events)
 
 
 class ExecutionRequest(BaseModel):
     input_data: dict = {}
+    use_cache: bool = True               # Solo aplica a bots con cache_results
+    urgent: bool = False                 # Encolar al frente (solo admins)
+
+
+class BatchExecutionRequest(BaseModel):
+    input_data: dict = {}  # Común a todos los items; cada item puede sobrescribir claves
+    items: list[ExecutionRequest]
+
+
+class FanoutRequest(BaseModel):
+    input_data: dict = {}
+    fanout_key: str = "servidores"
+    values: list[str] = []               # Vacío → servidores del CSV Consolidado del bot
+    max_parallel: Optional[int] = None   # Vacío → MAX_HEADLESS_WORKERS
+
+
+# ── Pipelines ────────────────────────────────────────────────────────────────
+
+PipelineRunStatus = Literal["running", "completed", "failed", "cancelled", "interrupted"]
+
+
+class PipelineStep(BaseModel):
+    id: str                              # Clave única del paso dentro del pipeline
+    bot_id: str
+    depends_on: list[str] = []
+    input_data: dict = {}
+
+
+class Pipeline(BaseModel):
+    id: str = Field(default_factory=gen_id)
+    name: str
+    description: str = ""
+    enabled: bool = True
+    steps: list[PipelineStep]
+    created_by: str = ""
+    created_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+
+
+class PipelineCreate(BaseModel):
+    name: str
+    description: str = ""
+    enabled: bool = True
+    steps: list[PipelineStep]
+
+
+class PipelineUpdate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+    enabled: Optional[bool] = None
+    steps: Optional[list[PipelineStep]] = None
+
+
+class PipelineRun(BaseModel):
+    id: str = Field(default_factory=gen_id)
+    pipeline_id: str
+    pipeline_name: str
+    status: PipelineRunStatus = "running"
+    started_at: str = Field(default_factory=lambda: datetime.now().isoformat())
+    completed_at: Optional[str] = None
+    triggered_by: str
+    triggered_by_name: str = ""
+    input_data: dict = {}
+    step_executions: dict[str, str] = {}  # step → execution_id
+    skipped_steps: list[str] = []
+
+
+class PipelineRunRequest(BaseModel):
+    input_data: dict = {}                # Común a todos los pasos; sobrescribe los valores del paso
 
 
 # ── Programación ─────────────────────────────────────────────────────────────
@@ -156,5 +285,32 @@ class Stats(BaseModel):
     executions_queued: int = 0
     executions_completed: int = 0
     executions_failed: int = 0
+    executions_archived: int = 0
     total_bots: int = 0
     bots_enabled: int = 0
+
+
+# ── Diagnóstico ──────────────────────────────────────────────────────────────
+
+class AgentRegistration(BaseModel):
+    name: str
+    requires_ui: bool = False            # Tiene sesión de escritorio para bots con UI
+    tags: list[str] = []
+    slots: int = Field(1, ge=1, le=64)
+
+
+class AgentCompletion(BaseModel):
+    exit_code: int
+    error_message: str = ""
+    duration_seconds: float = 0.0
+    resources: dict = {}
+    failure_reason: Optional[str] = None
+
+
+class QueueMoveRequest(BaseModel):
+    position: Literal["front", "back"]
+
+
+class TracingUpdate(BaseModel):
+    enabled: bool
+    trace_file: Optional[str] = None  # Nombre en data/traces/; "" desactiva el archivo OTLP; None lo deja igual
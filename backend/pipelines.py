@@ -0,0 +1,267 @@
+"""Pipelines (DAG de bots) para el Orquestador de Bots.
+
+Un pipeline es un grafo de pasos, cada uno con un bot y sus dependencias. Al lanzar
+un run se encolan los pasos sin dependencias; cada vez que un paso termina OK, el
+hook de queue_manager encola de inmediato los pasos cuyas dependencias ya se
+completaron. Las ramas independientes corren en paralelo y la latencia total es la
+del camino crítico.
+
+Cada paso recibe la carpeta de sus pasos previos por env:
+    EJECUCION_UPSTREAM_DIR            (si depende de un único paso)
+    EJECUCION_UPSTREAM_<PASO>_DIR     (uno por dependencia)
+
+Si un paso falla o se cancela, sus descendientes se omiten y el run queda "failed".
+"""
+
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import engine
+import executor
+import io_pool
+import queue_manager
+import storage
+from models import BotExecution, PipelineRun, PipelineStep
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).parent / "data"
+PIPELINES_FILE = DATA_DIR / "pipelines.json"
+PIPELINE_RUNS_FILE = DATA_DIR / "pipeline_runs.json"
+
+FINAL_STATUSES = ("completed", "failed", "cancelled", "interrupted")
+
+# run_id → datos sensibles del run (nunca se persisten); se aplican a cada paso
+_run_secrets: dict[str, dict[str, str]] = {}
+
+
+# ── Validación ───────────────────────────────────────────────────────────────
+
+def validate_steps(steps: list[PipelineStep], bots: list[dict]) -> Optional[str]:
+    """Devuelve un mensaje de error si el grafo es inválido, o None si es un DAG válido."""
+    if not steps:
+        return "El pipeline no tiene pasos"
+    bot_ids = {b["id"] for b in bots}
+    step_ids = [s.id for s in steps]
+    if len(set(step_ids)) != len(step_ids):
+        return "Hay pasos con id duplicado"
+    for step in steps:
+        if step.bot_id not in bot_ids:
+            return f"Paso '{step.id}': bot {step.bot_id} no encontrado"
+        for dep in step.depends_on:
+            if dep not in step_ids:
+                return f"Paso '{step.id}': depende de un paso inexistente '{dep}'"
+            if dep == step.id:
+                return f"Paso '{step.id}': no puede depender de sí mismo"
+
+    # Kahn: si no se pueden ordenar todos los pasos, hay un ciclo
+    indegree = {s.id: len(set(s.depends_on)) for s in steps}
+    dependents: dict[str, list[str]] = {s.id: [] for s in steps}
+    for s in steps:
+        for dep in set(s.depends_on):
+            dependents[dep].append(s.id)
+    ready = [sid for sid, n in indegree.items() if n == 0]
+    visited = 0
+    while ready:
+        sid = ready.pop()
+        visited += 1
+        for child in dependents[sid]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    if visited != len(steps):
+        return "El pipeline tiene dependencias circulares"
+    return None
+
+
+# ── Runs ─────────────────────────────────────────────────────────────────────
+
+def load_run(run_id: str) -> Optional[dict]:
+    return next((r for r in storage.load(PIPELINE_RUNS_FILE) if r["id"] == run_id), None)
+
+
+def recover_interrupted():
+    """Al arrancar, marca como interrumpidos los runs que quedaron en curso."""
+    if not PIPELINE_RUNS_FILE.exists():
+        return
+    with storage.transaction(PIPELINE_RUNS_FILE) as runs:
+        for run in runs:
+            if run.get("status") == "running":
+                run["status"] = "interrupted"
+                run["completed_at"] = datetime.now().isoformat()
+
+
+@engine.command
+async def start_run(
+    pipeline: dict,
+    input_data: dict,
+    secrets: dict[str, str],
+    triggered_by: str,
+    triggered_by_name: str,
+) -> dict:
+    run = PipelineRun(
+        pipeline_id=pipeline["id"],
+        pipeline_name=pipeline["name"],
+        triggered_by=triggered_by,
+        triggered_by_name=triggered_by_name,
+        input_data=input_data,
+    )
+    await io_pool.run(_insert_run, run.model_dump())
+    if secrets:
+        _run_secrets[run.id] = secrets
+    await _advance(run.id)
+    logger.info("Pipeline %s: run %s iniciado", pipeline["id"], run.id)
+    return await io_pool.run(load_run, run.id)
+
+
+def _insert_run(run: dict):
+    with storage.transaction(PIPELINE_RUNS_FILE) as runs:
+        runs.insert(0, run)
+
+
+def cancel_run(run_id: str, cancel_execution) -> Optional[dict]:
+    """Marca el run como cancelado y cancela sus pasos en curso con `cancel_execution(ex, executions)`."""
+    with storage.transaction(PIPELINE_RUNS_FILE) as runs:
+        run = next((r for r in runs if r["id"] == run_id), None)
+        if not run or run["status"] != "running":
+            return run
+        run["status"] = "cancelled"
+        run["completed_at"] = datetime.now().isoformat()
+    drop_run_secrets(run_id)
+
+    execution_ids = set(run["step_executions"].values())
+    with storage.transaction(executor.EXECUTIONS_FILE) as executions:
+        for ex in executions:
+            if ex["id"] in execution_ids and ex["status"] in ("queued", "running"):
+                cancel_execution(ex, executions)
+    return run
+
+
+@engine.command
+def drop_run_secrets(run_id: str):
+    _run_secrets.pop(run_id, None)
+
+
+async def on_execution_finished(execution_id: str):
+    """Hook de queue_manager: desbloquea los pasos dependientes del paso terminado."""
+    execution = await io_pool.run(executor.load_execution, execution_id)
+    if not execution or not execution.get("pipeline_run_id"):
+        return
+    await _advance(execution["pipeline_run_id"])
+
+
+async def _advance(run_id: str):
+    """Encola todos los pasos listos y cierra el run cuando ya no queda nada por hacer.
+    Las lecturas y transacciones sobre los JSON van en io_pool (_register_ready)."""
+    to_enqueue, finished = await io_pool.run(_register_ready, run_id)
+    if finished:
+        _run_secrets.pop(run_id, None)
+        return
+    secrets = _run_secrets.get(run_id, {})
+    for bot, step_id, execution_id in to_enqueue:
+        for key, val in secrets.items():
+            await executor.store_execution_secret(execution_id, key, val)
+        await queue_manager.enqueue(execution_id, bot.get("requires_ui", False), tags=bot.get("agent_tags", []))
+        logger.info("Pipeline run %s: paso '%s' encolado (%s)", run_id, step_id, execution_id)
+
+
+def _register_ready(run_id: str) -> tuple[list[tuple[dict, str, str]], bool]:
+    """Da de alta los pasos listos del run y lo cierra si no queda nada por hacer.
+    Retorna ([(bot, paso, execution_id) a encolar], si el run terminó)."""
+    run = load_run(run_id)
+    if not run or run["status"] != "running":
+        return [], False
+    pipeline = next((p for p in storage.load(PIPELINES_FILE) if p["id"] == run["pipeline_id"]), None)
+    if not pipeline:
+        return [], _finish_run(run_id, "failed")
+    steps = [PipelineStep(**s) for s in pipeline["steps"]]
+    executions = {e["id"]: e for e in storage.load(executor.EXECUTIONS_FILE)}
+    bots = {b["id"]: b for b in storage.load(executor.BOTS_FILE)}
+
+    def step_status(step_id: str) -> Optional[str]:
+        ex_id = run["step_executions"].get(step_id)
+        ex = executions.get(ex_id) if ex_id else None
+        return ex["status"] if ex else None
+
+    # Propagar omisiones: un paso se omite si alguna dependencia falló o se omitió
+    skipped = set(run.get("skipped_steps", []))
+    changed = True
+    while changed:
+        changed = False
+        for step in steps:
+            if step.id in skipped or step.id in run["step_executions"]:
+                continue
+            if any(dep in skipped or step_status(dep) in ("failed", "cancelled", "interrupted")
+                   for dep in step.depends_on):
+                skipped.add(step.id)
+                changed = True
+
+    ready = [
+        step for step in steps
+        if step.id not in run["step_executions"]
+        and step.id not in skipped
+        and all(step_status(dep) == "completed" for dep in step.depends_on)
+    ]
+
+    new_executions: list[tuple[PipelineStep, BotExecution]] = []
+    for step in ready:
+        bot = bots.get(step.bot_id)
+        if not bot or not bot.get("enabled", True):
+            skipped.add(step.id)
+            continue
+        upstream = {
+            dep: executions[run["step_executions"][dep]].get("run_folder", "")
+            for dep in step.depends_on
+        }
+        merged_input = {**step.input_data, **run.get("input_data", {})}
+        new_executions.append((step, BotExecution(
+            bot_id=bot["id"],
+            bot_name=bot["name"],
+            triggered_by=run["triggered_by"],
+            triggered_by_name=run.get("triggered_by_name", ""),
+            input_data={k: v for k, v in merged_input.items()
+                        if k.upper() not in executor.SENSITIVE_ENV_KEYS},
+            pipeline_run_id=run_id,
+            pipeline_step=step.id,
+            upstream_run_folders=upstream,
+        )))
+
+    # Registrar los pasos en el run de forma atómica: si dos hooks llegan a la vez,
+    # solo el primero lanza cada paso
+    to_enqueue: list[tuple[PipelineStep, BotExecution]] = []
+    with storage.transaction(PIPELINE_RUNS_FILE) as runs:
+        stored = next((r for r in runs if r["id"] == run_id), None)
+        if not stored or stored["status"] != "running":
+            return [], False
+        for step, execution in new_executions:
+            if step.id not in stored["step_executions"]:
+                stored["step_executions"][step.id] = execution.id
+                to_enqueue.append((step, execution))
+        stored["skipped_steps"] = sorted(skipped | set(stored.get("skipped_steps", [])))
+        run = stored
+
+    if to_enqueue:
+        with storage.transaction(executor.EXECUTIONS_FILE) as stored_execs:
+            stored_execs[0:0] = [e.model_dump() for _, e in reversed(to_enqueue)]
+        return [(bots[step.bot_id], step.id, execution.id) for step, execution in to_enqueue], False
+
+    # Sin pasos nuevos: ¿queda algo en curso?
+    statuses = [step_status(s.id) for s in steps if s.id in run["step_executions"]]
+    if any(st not in FINAL_STATUSES for st in statuses):
+        return [], False
+    failed = bool(run["skipped_steps"]) or any(st != "completed" for st in statuses)
+    return [], _finish_run(run_id, "failed" if failed else "completed")
+
+
+def _finish_run(run_id: str, status: str) -> bool:
+    """Cierra el run si sigue en curso. Retorna True si lo cerró esta llamada."""
+    with storage.transaction(PIPELINE_RUNS_FILE) as runs:
+        run = next((r for r in runs if r["id"] == run_id), None)
+        if not run or run["status"] != "running":
+            return False
+        run["status"] = status
+        run["completed_at"] = datetime.now().isoformat()
+    logger.info("Pipeline run %s finalizado con status=%s", run_id, status)
+    return True
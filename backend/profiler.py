@@ -0,0 +1,75 @@
+"""Profiler de CPU por muestreo, sin dependencias.
+
+Un thread toma cada `interval` segundos el stack de todos los threads del proceso
+(sys._current_frames) y acumula las pilas en formato "folded" de Brendan Gregg:
+
+    MainThread;main (main.py:10);handler (main.py:42) 17
+
+Esa salida se abre directo en flamegraph.pl, speedscope.app o inferno.
+Las pilas de threads ociosos (esperando en un lock, una cola o el selector del
+event loop) se descartan salvo include_idle=True, para que el perfil refleje CPU.
+Solo puede correr un perfil a la vez.
+"""
+
+import os
+import sys
+import threading
+import time
+
+MAX_SECONDS = 120
+
+# (archivo, función) del frame superior de un thread que está esperando, no trabajando
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+}
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+def sample(seconds: float, interval: float = 0.005, include_idle: bool = False) -> tuple[dict[str, int], int]:
+    """Muestrea durante `seconds` segundos. Retorna (pilas → cantidad, muestras tomadas).
+    Bloquea el thread que lo llama: usar con asyncio.to_thread desde el event loop."""
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy()
+    try:
+        own = threading.get_ident()
+        counts: dict[str, int] = {}
+        samples = 0
+        deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not include_idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                key = ";".join(reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            samples += 1
+            time.sleep(interval)
+        return counts, samples
+    finally:
+        _lock.release()
+
+
+def folded(counts: dict[str, int]) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
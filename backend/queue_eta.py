@@ -0,0 +1,169 @@
+"""Posición en cola, ETA y SLA de espera de las ejecuciones encoladas.
+
+La ETA se obtiene simulando las colas: cada worker queda libre cuando su ejecución
+actual alcanza la duración típica de su bot (p50 de las últimas HISTORY_SIZE
+ejecuciones completadas); las ejecuciones en espera se asignan en orden al primer
+worker libre. Se calcula con el p50 (estimación) y con el p90 (pesimista).
+
+Cada bot puede definir `queue_sla_seconds`: si una ejecución espera más que eso se
+marca `sla_breached_at`, se registra en el log y en /metrics, y aparece en
+/api/queue/sla-alerts.
+"""
+
+import heapq
+import logging
+import statistics
+import time
+from datetime import datetime
+from typing import Optional
+
+import metrics
+import queue_manager
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = 50
+DEFAULT_DURATION = 60.0   # Bots sin historial
+MIN_REMAINING = 1.0       # Un run que ya superó su duración típica "termina pronto"
+
+SLA_BREACHES = metrics.Counter(
+    "orquestador_queue_sla_breaches_total", "Ejecuciones que superaron el SLA de espera de su bot", ("bot_id",),
+)
+
+
+def duration_profile(executions: list[dict]) -> dict[str, dict]:
+    """p50/p90 de duración por bot con las últimas ejecuciones completadas (lista: más nueva primero)."""
+    samples: dict[str, list[float]] = {}
+    for ex in executions:
+        if ex.get("status") != "completed" or not ex.get("duration_seconds") or ex.get("cached_from"):
+            continue
+        bucket = samples.setdefault(ex["bot_id"], [])
+        if len(bucket) < HISTORY_SIZE:
+            bucket.append(float(ex["duration_seconds"]))
+    profile = {}
+    for bot_id, values in samples.items():
+        values.sort()
+        profile[bot_id] = {
+            "p50": statistics.median(values),
+            "p90": values[min(len(values) - 1, int(len(values) * 0.9))],
+            "samples": len(values),
+        }
+    return profile
+
+
+def _typical(profile: dict, bot_id: str, key: str) -> float:
+    entry = profile.get(bot_id)
+    return entry[key] if entry else DEFAULT_DURATION
+
+
+def _wait_seconds(ex: dict, now: datetime) -> float:
+    try:
+        return max((now - datetime.fromisoformat(ex["queued_at"])).total_seconds(), 0.0)
+    except (KeyError, ValueError):
+        return 0.0
+
+
+def _simulate(workers: int, running: list[tuple[str, float]], queued: list[dict], profile: dict, key: str) -> list[tuple[float, float]]:
+    """(inicio, fin) estimados en segundos desde ahora para cada ejecución en espera."""
+    now = time.time()
+    slots = [max(_typical(profile, bot_id, key) - (now - started), MIN_REMAINING) for bot_id, started in running]
+    # Sin workers iniciados (arranque) se estima como si hubiera uno libre
+    slots += [0.0] * max(workers - len(slots), 1 if not slots else 0)
+    heapq.heapify(slots)
+    result = []
+    for ex in queued:
+        start = heapq.heappop(slots)
+        end = start + _typical(profile, ex["bot_id"], key)
+        heapq.heappush(slots, end)
+        result.append((start, end))
+    return result
+
+
+def queue_overview(executions: list[dict], bots: list[dict]) -> dict:
+    """Por cola: workers, ocupación y la lista de espera con posición, ETA y estado de SLA."""
+    by_id = {ex["id"]: ex for ex in executions}
+    slas = {b["id"]: int(b.get("queue_sla_seconds", 0) or 0) for b in bots}
+    profile = duration_profile(executions)
+    now = datetime.now()
+    overview = {}
+    for kind, state in queue_manager.snapshot().items():
+        active = [(eid, by_id[eid]["bot_id"], started) for eid, started in state["running"].items() if eid in by_id]
+        running = [(bot_id, started) for _, bot_id, started in active]
+        # Por las dudas: solo cuentan las que siguen en estado queued
+        queued = [by_id[eid] for eid in state["queued"] if by_id.get(eid, {}).get("status") == "queued"]
+        p50 = _simulate(state["workers"], running, queued, profile, "p50")
+        p90 = _simulate(state["workers"], running, queued, profile, "p90")
+        items = []
+        for position, (ex, (start, end), (start_p90, _)) in enumerate(zip(queued, p50, p90), start=1):
+            wait = _wait_seconds(ex, now)
+            sla = slas.get(ex["bot_id"], 0)
+            if not sla:
+                sla_status = None
+            elif wait > sla:
+                sla_status = "breached"
+            elif wait + start > sla:
+                sla_status = "at_risk"
+            else:
+                sla_status = "ok"
+            items.append({
+                "execution_id": ex["id"],
+                "bot_id": ex["bot_id"],
+                "bot_name": ex.get("bot_name", ""),
+                "position": position,
+                "wait_seconds": round(wait, 1),
+                "eta_start_seconds": round(start, 1),
+                "eta_start_p90_seconds": round(start_p90, 1),
+                "eta_finish_seconds": round(end, 1),
+                "sla_seconds": sla or None,
+                "sla_status": sla_status,
+            })
+        overview[kind] = {
+            "workers": state["workers"],
+            "busy": len(state["running"]),
+            "running": [
+                {
+                    "execution_id": eid,
+                    "bot_id": bot_id,
+                    "elapsed_seconds": round(time.time() - started, 1),
+                    "eta_finish_seconds": round(max(_typical(profile, bot_id, "p50") - (time.time() - started), 0.0), 1),
+                }
+                for eid, bot_id, started in active
+            ],
+            "queued": items,
+            "oldest_wait_seconds": max((i["wait_seconds"] for i in items), default=0.0),
+        }
+    return overview
+
+
+def find_position(overview: dict, execution_id: str) -> Optional[dict]:
+    for kind, queue in overview.items():
+        for item in queue["queued"]:
+            if item["execution_id"] == execution_id:
+                return {"queue": kind, "ahead": item["position"] - 1, **item}
+        for item in queue["running"]:
+            if item["execution_id"] == execution_id:
+                return {"queue": kind, "position": 0, "ahead": 0, **item}
+    return None
+
+
+def breached(overview: dict) -> list[dict]:
+    return [item for queue in overview.values() for item in queue["queued"] if item["sla_status"] == "breached"]
+
+
+def record_breaches(overview: dict, executions: list[dict]) -> list[str]:
+    """Marca sla_breached_at en las ejecuciones que acaban de superar su SLA (in-place).
+    Retorna los ids marcados; el llamador persiste la lista."""
+    by_id = {ex["id"]: ex for ex in executions}
+    marked = []
+    for item in breached(overview):
+        ex = by_id.get(item["execution_id"])
+        if ex is None or ex.get("sla_breached_at") or ex.get("status") != "queued":
+            continue
+        ex["sla_breached_at"] = datetime.now().isoformat()
+        SLA_BREACHES.inc(bot_id=ex["bot_id"])
+        logger.warning(
+            "SLA de cola superado: ejecución %s del bot %s espera %.0fs (SLA %ss, posición %d)",
+            ex["id"], ex["bot_id"], item["wait_seconds"], item["sla_seconds"], item["position"],
+        )
+        marked.append(ex["id"])
+    return marked
@@ -2,62 +2,255 @@
 
 - ui_queue: bots que requieren UI de escritorio (max 1 simultáneo)
 - headless_queue: bots headless (max N simultáneos, configurable)
+
+Las colas son ExecutionQueue (no asyncio.Queue) para poder listarlas, quitar una
+ejecución por id y reordenarla, todo en O(1): una ejecución cancelada sale de la
+cola en el momento y una urgente puede pasar al frente.
+
+De las mismas colas consumen los workers locales y los agentes remotos (agents.py)
+vía lease(). Las ejecuciones de bots con `agent_tags` solo las toma un agente que
+tenga todos esos tags; los workers locales toman solo las que no exigen tags.
 """
 
 import asyncio
 import logging
-from typing import Callable, Awaitable
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Awaitable, Iterable, Optional
+
+import engine
+import metrics
+import tracing
 
 logger = logging.getLogger(__name__)
 
-ui_queue: asyncio.Queue = asyncio.Queue()
-headless_queue: asyncio.Queue = asyncio.Queue()
+
+class ExecutionQueue:
+    """Cola FIFO de execution_ids sobre un OrderedDict (id → tags que exige su bot).
+
+    get() se usa desde el event loop; remove/move pueden llamarse desde los handlers
+    sync (threadpool): las mutaciones del dict van bajo un lock.
+    """
+
+    def __init__(self):
+        self._items: OrderedDict[str, frozenset[str]] = OrderedDict()
+        self._waiters: set[asyncio.Future] = set()
+        self._lock = threading.Lock()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, execution_id: str) -> bool:
+        return execution_id in self._items
+
+    def list(self) -> list[str]:
+        with self._lock:
+            return list(self._items)
+
+    def put_nowait(self, execution_id: str, front: bool = False, tags: Iterable[str] = ()):
+        """Agrega al final (o al frente). Debe llamarse desde el event loop."""
+        with self._lock:
+            self._items[execution_id] = frozenset(tags)
+            if front:
+                self._items.move_to_end(execution_id, last=False)
+        # Se despierta a todos: cada consumidor decide con su predicado si le sirve
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def put(self, execution_id: str, front: bool = False, tags: Iterable[str] = ()):
+        self.put_nowait(execution_id, front, tags)
+
+    def pop_nowait(self, accepts: Optional[Callable[[frozenset[str]], bool]] = None) -> Optional[str]:
+        """Saca la primera ejecución cuyos tags acepta `accepts` (o la primera, sin filtro)."""
+        with self._lock:
+            for execution_id, tags in self._items.items():
+                if accepts is None or accepts(tags):
+                    del self._items[execution_id]
+                    return execution_id
+        return None
+
+    async def get(self, accepts: Optional[Callable[[frozenset[str]], bool]] = None) -> str:
+        while True:
+            execution_id = self.pop_nowait(accepts)
+            if execution_id is not None:
+                return execution_id
+            await wait_for_items([self])
+
+    def remove(self, execution_id: str) -> bool:
+        with self._lock:
+            if execution_id not in self._items:
+                return False
+            del self._items[execution_id]
+            return True
+
+    def move(self, execution_id: str, front: bool) -> bool:
+        with self._lock:
+            if execution_id not in self._items:
+                return False
+            self._items.move_to_end(execution_id, last=not front)
+            return True
+
+
+async def wait_for_items(queues: list[ExecutionQueue], timeout: Optional[float] = None):
+    """Espera hasta que se encole algo en cualquiera de las colas (o venza el timeout)."""
+    waiter = asyncio.get_running_loop().create_future()
+    for queue in queues:
+        queue._waiters.add(waiter)
+    try:
+        await asyncio.wait_for(waiter, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for queue in queues:
+            queue._waiters.discard(waiter)
+
+
+ui_queue = ExecutionQueue()
+headless_queue = ExecutionQueue()
 
 _workers: list[asyncio.Task] = []
 _run_fn: Callable[[str], Awaitable[None]] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_background: set[asyncio.Task] = set()
+
+# Workers totales por cola ("ui" / "headless"), locales + agentes
+_worker_counts: dict[str, int] = {"ui": 0, "headless": 0}
+# Ejecuciones que un worker está procesando ahora: execution_id → epoch de inicio
+_active: dict[str, dict[str, float]] = {"ui": {}, "headless": {}}
+
+def _untagged(tags: frozenset[str]) -> bool:
+    return not tags
+
+
+# Callbacks async invocados cuando un worker termina de procesar una ejecución
+_completion_hooks: list[Callable[[str], Awaitable[None]]] = []
 
 
-def init_workers(run_fn: Callable[[str], Awaitable[None]], max_headless: int = 3):
+def register_completion_hook(fn: Callable[[str], Awaitable[None]]):
+    """Registra un callback async que recibe el execution_id al terminar cada ejecución
+    (completada, fallida o descartada por estar cancelada)."""
+    if fn not in _completion_hooks:
+        _completion_hooks.append(fn)
+
+
+def init_workers(run_fn: Callable[[str], Awaitable[None]], max_headless: int = 3, ui_workers: int = 1):
     """Registra la función de ejecución e inicia los worker tasks.
     Debe llamarse desde el lifespan de FastAPI (dentro del loop de asyncio).
+    Con ui_workers=0 / max_headless=0 esa cola queda solo para agentes remotos.
     """
-    global _run_fn
+    global _run_fn, _loop
     _run_fn = run_fn
+    _loop = asyncio.get_running_loop()
 
-    # 1 worker para bots con UI
-    _workers.append(asyncio.create_task(_worker(ui_queue, "ui-worker")))
+    # Workers para bots con UI (normalmente 1: hay un solo escritorio)
+    for i in range(ui_workers):
+        _workers.append(asyncio.create_task(_worker(ui_queue, "ui-worker" if i == 0 else f"ui-worker-{i}")))
+    add_capacity("ui", ui_workers)
 
     # N workers para bots headless
     for i in range(max_headless):
         _workers.append(asyncio.create_task(_worker(headless_queue, f"headless-worker-{i}")))
+    add_capacity("headless", max_headless)
+
+    logger.info("Queue manager iniciado: %d UI workers + %d headless workers", ui_workers, max_headless)
+
+
+def add_capacity(kind: str, slots: int):
+    """Suma (o resta) workers a una cola; los agentes la ajustan al registrarse/irse."""
+    _worker_counts[kind] = max(_worker_counts[kind] + slots, 0)
+
+
+def track_start(kind: str, execution_id: str):
+    _active[kind][execution_id] = time.time()
+
 
-    logger.info("Queue manager iniciado: 1 UI worker + %d headless workers", max_headless)
+def track_end(kind: str, execution_id: str):
+    _active[kind].pop(execution_id, None)
 
 
-async def _worker(queue: asyncio.Queue, name: str):
+async def _worker(queue: ExecutionQueue, name: str):
     logger.info("Worker '%s' iniciado", name)
+    kind = "ui" if queue is ui_queue else "headless"
     while True:
-        execution_id: str = await queue.get()
+        execution_id: str = await queue.get(_untagged)
+        track_start(kind, execution_id)
         try:
             logger.info("Worker '%s' procesando ejecución %s", name, execution_id)
             if _run_fn:
-                await _run_fn(execution_id)
+                with tracing.span("queue.run", execution_id=execution_id, worker=name):
+                    await _run_fn(execution_id)
         except Exception as e:
             logger.error("Worker '%s' error en ejecución %s: %s", name, execution_id, e)
         finally:
-            queue.task_done()
+            track_end(kind, execution_id)
+        await _run_completion_hooks(execution_id)
 
 
-async def enqueue(execution_id: str, requires_ui: bool):
-    """Encola una ejecución en la cola correspondiente."""
-    if requires_ui:
-        await ui_queue.put(execution_id)
-        logger.info("Ejecución %s encolada en UI queue (tamaño: %d)", execution_id, ui_queue.qsize())
-    else:
-        await headless_queue.put(execution_id)
-        logger.info("Ejecución %s encolada en headless queue (tamaño: %d)", execution_id, headless_queue.qsize())
+async def run_completion_hooks(execution_id: str):
+    """Para ejecuciones que terminan fuera de un worker local (agentes remotos)."""
+    await _run_completion_hooks(execution_id)
 
 
+async def _run_completion_hooks(execution_id: str):
+    for hook in _completion_hooks:
+        try:
+            await hook(execution_id)
+        except Exception as e:
+            logger.error("Hook de finalización falló para ejecución %s: %s", execution_id, e)
+
+
+@engine.command
+async def enqueue(execution_id: str, requires_ui: bool, front: bool = False, tags: Iterable[str] = ()):
+    """Encola una ejecución en la cola correspondiente (al frente si `front`).
+    `tags` son los agent_tags del bot."""
+    with tracing.span("queue.enqueue", execution_id=execution_id, requires_ui=requires_ui):
+        if requires_ui:
+            await ui_queue.put(execution_id, front, tags)
+            logger.info("Ejecución %s encolada en UI queue (tamaño: %d)", execution_id, ui_queue.qsize())
+        else:
+            await headless_queue.put(execution_id, front, tags)
+            logger.info("Ejecución %s encolada en headless queue (tamaño: %d)", execution_id, headless_queue.qsize())
+
+
+async def lease(
+    kinds: list[str],
+    accepts: Callable[[frozenset[str]], bool],
+    timeout: float,
+) -> Optional[tuple[str, str]]:
+    """Para agentes remotos: saca la primera ejecución aceptable de las colas `kinds`
+    (en ese orden), esperando hasta `timeout` segundos. Retorna (kind, execution_id)."""
+    queues = [(kind, ui_queue if kind == "ui" else headless_queue) for kind in kinds]
+    deadline = time.monotonic() + timeout
+    while True:
+        for kind, queue in queues:
+            execution_id = queue.pop_nowait(accepts)
+            if execution_id is not None:
+                return kind, execution_id
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        await wait_for_items([q for _, q in queues], remaining)
+
+
+@engine.command
+async def enqueue_many(execution_ids: list[str], requires_ui: bool, tags: Iterable[str] = ()):
+    """Encola varias ejecuciones de una vez.
+
+    No hay await entre los put, así que ningún otro encolado puede intercalarse:
+    el lote entra contiguo en la cola.
+    """
+    queue = ui_queue if requires_ui else headless_queue
+    for execution_id in execution_ids:
+        queue.put_nowait(execution_id, tags=tags)
+    logger.info(
+        "%d ejecuciones encoladas en %s queue (tamaño: %d)",
+        len(execution_ids), "UI" if requires_ui else "headless", queue.qsize(),
+    )
+
+
+@engine.command
 def get_queue_status() -> dict:
     return {
         "ui_queue_size": ui_queue.qsize(),
@@ -65,7 +258,71 @@ def get_queue_status() -> dict:
     }
 
 
+@engine.command
+def snapshot() -> dict:
+    """Estado de cada cola: workers, ejecuciones en curso (con su inicio) e ids en espera
+    en orden de salida."""
+    return {
+        kind: {
+            "workers": _worker_counts[kind],
+            "running": dict(_active[kind]),
+            "queued": queue.list(),
+        }
+        for kind, queue in (("ui", ui_queue), ("headless", headless_queue))
+    }
+
+
+def _queue_of(execution_id: str) -> Optional[ExecutionQueue]:
+    for queue in (ui_queue, headless_queue):
+        if execution_id in queue:
+            return queue
+    return None
+
+
+@engine.command
+def remove(execution_id: str) -> bool:
+    """Quita una ejecución en espera de su cola. Retorna False si no estaba encolada.
+    Los hooks de finalización no corren solos: ver notify_removed."""
+    queue = _queue_of(execution_id)
+    return queue.remove(execution_id) if queue else False
+
+
+@engine.command
+def move(execution_id: str, front: bool) -> bool:
+    """Mueve una ejecución en espera al frente o al final de su cola."""
+    queue = _queue_of(execution_id)
+    return queue.move(execution_id, front) if queue else False
+
+
+@engine.command
+def notify_removed(execution_id: str):
+    """Corre los hooks de finalización de una ejecución que salió de la cola sin pasar por
+    un worker (p. ej. cancelada). Se puede llamar desde cualquier thread."""
+    if _loop is None or _loop.is_closed():
+        return
+
+    def _schedule():
+        task = _loop.create_task(_run_completion_hooks(execution_id))
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+
+    _loop.call_soon_threadsafe(_schedule)
+
+
+def _collect_metrics():
+    # Vía snapshot() para que un proceso api también reporte las colas del engine
+    for kind, state in snapshot().items():
+        busy = len(state["running"])
+        metrics.QUEUE_DEPTH.set(len(state["queued"]), queue=kind)
+        metrics.WORKERS.set(busy, queue=kind, state="busy")
+        metrics.WORKERS.set(max(state["workers"] - busy, 0), queue=kind, state="idle")
+
+
+metrics.register_collector(_collect_metrics)
+
+
 def stop_workers():
     for task in _workers:
         task.cancel()
     _workers.clear()
+    _worker_counts.update(ui=0, headless=0)
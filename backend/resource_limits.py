@@ -0,0 +1,177 @@
+"""Límites de recursos por bot para los subprocess del Orquestador de Bots.
+
+Campos del bot (0 = sin límite):
+- limit_memory_mb: RLIMIT_AS al lanzar + corte por RSS desde resource_monitor
+- limit_cpu_seconds: RLIMIT_CPU (el kernel envía SIGXCPU al superarlo)
+- limit_open_files: RLIMIT_NOFILE
+- limit_wall_seconds: tiempo máximo de reloj; el executor mata el proceso al vencer
+- priority: "normal" | "low" | "idle" → nice + clase de ionice (Linux) o clase de
+  prioridad del proceso (Windows)
+
+Los rlimits y el nice se aplican en el hijo antes del exec (preexec_fn); la clase de
+ionice, desde el padre con el pid recién lanzado (apply_after_spawn). Los intérpretes
+del warm pool se lanzan sin rlimits: warm_runner aplica job_limits() a cada trabajo.
+
+Las violaciones se registran en la ejecución como `failure_reason` para distinguirlas
+de un fallo normal del bot.
+"""
+
+import ctypes
+import os
+import platform
+import signal
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# nice, clase ionice (2 = best-effort, 3 = idle), nivel best-effort
+_PRIORITY_CLASSES = {
+    "normal": (0, None, None),
+    "low": (10, 2, 7),
+    "idle": (19, 3, 0),
+}
+
+# Número de syscall de ioprio_set por arquitectura
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i386": 289, "i686": 289, "armv7l": 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+
+# syscall(2) de libc resuelto una vez al importar: cargar una librería dentro de
+# preexec_fn (entre fork y exec) puede trabarse con locks que otro thread tenía tomados
+_syscall = None
+if resource is not None and _IOPRIO_SET.get(platform.machine()) is not None:
+    try:
+        _syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError):
+        pass
+
+# Exit code (negativo = señal) de un proceso que superó el RLIMIT_CPU soft. Al hard lo
+# mata con SIGKILL, que también puede venir de otro lado (OOM killer, un kill manual):
+# ese solo cuenta si la CPU medida llegó al límite
+_SIGXCPU = -signal.SIGXCPU if hasattr(signal, "SIGXCPU") else None
+_SIGKILL = -signal.SIGKILL if hasattr(signal, "SIGKILL") else None
+
+FAILURE_MESSAGES = {
+    "memory_limit": "Superó el límite de memoria ({limit} MB)",
+    "cpu_limit": "Superó el límite de CPU ({limit} s)",
+    "open_files_limit": "Superó el límite de archivos abiertos ({limit})",
+    "time_limit": "Superó el tiempo máximo de ejecución ({limit} s)",
+}
+
+
+def memory_limit_kb(bot: dict) -> int:
+    return int(bot.get("limit_memory_mb", 0) or 0) * 1024
+
+
+def wall_limit_seconds(bot: dict) -> Optional[float]:
+    value = float(bot.get("limit_wall_seconds", 0) or 0)
+    return value if value > 0 else None
+
+
+def apply_after_spawn(bot: dict, pid: int):
+    """Aplica al proceso ya lanzado la clase de ionice del bot (la heredan sus hijos)."""
+    _, io_class, io_level = _PRIORITY_CLASSES.get(bot.get("priority", "normal"), (0, None, None))
+    if io_class is None or _syscall is None:
+        return
+    nr = _IOPRIO_SET[platform.machine()]
+    # Sin chequeo de error: si el proceso ya terminó o el kernel no lo permite, queda como está
+    _syscall(nr, _IOPRIO_WHO_PROCESS, pid, (io_class << _IOPRIO_CLASS_SHIFT) | io_level)
+
+
+def job_limits(bot: dict) -> dict:
+    """rlimits del bot para un trabajo del warm pool (ver warm_runner._apply_limits)."""
+    limits = {
+        "memory_mb": int(bot.get("limit_memory_mb", 0) or 0),
+        "cpu_seconds": int(bot.get("limit_cpu_seconds", 0) or 0),
+        "open_files": int(bot.get("limit_open_files", 0) or 0),
+    }
+    return {key: value for key, value in limits.items() if value}
+
+
+def _preexec(bot: dict, rlimits: bool) -> Optional[Callable[[], None]]:
+    memory_mb, cpu_seconds, open_files = 0, 0, 0
+    if rlimits:
+        memory_mb = int(bot.get("limit_memory_mb", 0) or 0)
+        cpu_seconds = int(bot.get("limit_cpu_seconds", 0) or 0)
+        open_files = int(bot.get("limit_open_files", 0) or 0)
+    nice, _, _ = _PRIORITY_CLASSES.get(bot.get("priority", "normal"), (0, None, None))
+    if not (memory_mb or cpu_seconds or open_files or nice):
+        return None
+
+    def apply():
+        # Corre en el hijo entre fork y exec: solo llamadas simples, sin logging
+        if memory_mb:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_mb * 1024 * 1024,) * 2)
+        if cpu_seconds:
+            # Soft → SIGXCPU; hard unos segundos después → SIGKILL si lo ignora
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if open_files:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (open_files, open_files))
+        if nice:
+            os.nice(nice)
+
+    return apply
+
+
+def spawn_kwargs(bot: dict, rlimits: bool = True) -> dict:
+    """Argumentos extra para asyncio.create_subprocess_exec que aplican los límites del bot.
+    Con rlimits=False solo la prioridad (intérpretes del warm pool)."""
+    if resource is not None:
+        fn = _preexec(bot, rlimits)
+        return {"preexec_fn": fn} if fn else {}
+    if sys.platform == "win32":
+        # Sin rlimits en Windows: solo prioridad (memoria y tiempo se controlan desde el executor)
+        flags = {
+            "low": getattr(subprocess, "BELOW_NORMAL_PRIORITY_CLASS", 0),
+            "idle": getattr(subprocess, "IDLE_PRIORITY_CLASS", 0),
+        }.get(bot.get("priority", "normal"), 0)
+        return {"creationflags": flags} if flags else {}
+    return {}
+
+
+def _log_tail(log_file: Path, size: int = 8192) -> str:
+    try:
+        with open(log_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - size))
+            return f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return ""
+
+
+def classify_failure(
+    bot: dict,
+    exit_code: int,
+    log_file: Path,
+    timed_out: bool,
+    memory_exceeded: bool,
+    cpu_seconds: Optional[float] = None,
+) -> Optional[tuple[str, str]]:
+    """Si el fallo se debe a un límite de recursos devuelve (failure_reason, mensaje).
+    `cpu_seconds`: CPU medida por resource_monitor (None si no hubo muestras)."""
+    reason = None
+    cpu_limit = bot.get("limit_cpu_seconds")
+    if timed_out:
+        reason, limit = "time_limit", bot.get("limit_wall_seconds")
+    elif memory_exceeded:
+        reason, limit = "memory_limit", bot.get("limit_memory_mb")
+    elif cpu_limit and (
+        exit_code == _SIGXCPU
+        or (exit_code == _SIGKILL and cpu_seconds is not None and cpu_seconds >= cpu_limit)
+    ):
+        reason, limit = "cpu_limit", cpu_limit
+    elif bot.get("limit_memory_mb") or bot.get("limit_open_files"):
+        tail = _log_tail(log_file)
+        if bot.get("limit_memory_mb") and ("MemoryError" in tail or "Cannot allocate memory" in tail):
+            reason, limit = "memory_limit", bot.get("limit_memory_mb")
+        elif bot.get("limit_open_files") and "Too many open files" in tail:
+            reason, limit = "open_files_limit", bot.get("limit_open_files")
+    if reason is None:
+        return None
+    return reason, FAILURE_MESSAGES[reason].format(limit=limit)
@@ -0,0 +1,267 @@
+"""Muestreo de recursos del árbol de procesos de una ejecución.
+
+Cada RESOURCE_SAMPLE_INTERVAL segundos se toma una muestra del proceso del bot y sus
+descendientes (RSS, tiempo de CPU, bytes leídos/escritos, cantidad de hijos) y se
+agrega como una línea JSON a logs/resources.ndjson. Al terminar se guarda un resumen
+(picos y promedios) en el campo `resources` de la ejecución.
+
+CPU y bytes leídos/escritos son contadores acumulados: el resumen usa una muestra final
+tomada al terminar la salida del bot (final_sample), antes de que se recoja el proceso,
+y no la última periódica. Un subprocess cierra su stdout recién al salir, así que esa
+muestra compite con el child watcher de asyncio y a veces llega tarde: por eso las
+primeras muestras van más seguidas (FIRST_SAMPLE_DELAY, duplicando hasta el
+intervalo) y un run corto igual tiene una cerca del final. En un intérprete del warm
+pool (que sigue vivo) la muestra final es exacta; sus contadores incluyen la precarga
+y los trabajos anteriores, así que se les resta una muestra `baseline` tomada antes de
+enviar el trabajo.
+
+En Linux se lee /proc directamente. En otros sistemas se usa psutil si está
+instalado; si no, el muestreo queda desactivado.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import psutil
+except ImportError:  # Opcional: solo se usa donde no hay /proc
+    psutil = None
+
+import io_pool
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = float(os.getenv("RESOURCE_SAMPLE_INTERVAL", "2"))
+RESOURCES_FILENAME = "resources.ndjson"
+FIRST_SAMPLE_DELAY = 0.1
+
+PROC = Path("/proc")
+# Campos acumulados de una muestra (a los que se resta el baseline)
+_COUNTERS = ("cpu_seconds", "read_bytes", "write_bytes")
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_KB = (os.sysconf("SC_PAGE_SIZE") // 1024) if hasattr(os, "sysconf") else 4
+
+
+def available() -> bool:
+    return PROC.joinpath("self", "stat").exists() or psutil is not None
+
+
+# ── /proc ────────────────────────────────────────────────────────────────────
+
+def _read_stat(pid: int) -> Optional[list[str]]:
+    try:
+        raw = (PROC / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # El campo comm va entre paréntesis y puede contener espacios
+    return raw[raw.rindex(")") + 2:].split()
+
+
+def _descendants(root: int) -> list[int]:
+    children: dict[int, list[int]] = {}
+    for entry in PROC.iterdir():
+        if not entry.name.isdigit():
+            continue
+        fields = _read_stat(int(entry.name))
+        if fields:
+            children.setdefault(int(fields[1]), []).append(int(entry.name))
+    result, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _proc_sample(pid: int) -> Optional[dict]:
+    root = _read_stat(pid)
+    if root is None:
+        return None
+    pids = [pid, *_descendants(pid)]
+    rss_kb = 0
+    cpu_ticks = int(root[13]) + int(root[14])  # hijos ya terminados (cutime + cstime)
+    read_bytes = write_bytes = 0
+    for p in pids:
+        fields = root if p == pid else _read_stat(p)
+        if fields is None:
+            continue
+        cpu_ticks += int(fields[11]) + int(fields[12])  # utime + stime
+        rss_kb += int(fields[21]) * _PAGE_KB
+        try:
+            for line in (PROC / str(p) / "io").read_text().splitlines():
+                key, _, value = line.partition(":")
+                if key == "read_bytes":
+                    read_bytes += int(value)
+                elif key == "write_bytes":
+                    write_bytes += int(value)
+        except (OSError, ValueError):
+            pass
+    return {
+        "rss_kb": rss_kb,
+        "cpu_seconds": round(cpu_ticks / _CLK_TCK, 2),
+        "read_bytes": read_bytes,
+        "write_bytes": write_bytes,
+        "children": len(pids) - 1,
+    }
+
+
+def _psutil_sample(pid: int) -> Optional[dict]:
+    try:
+        root = psutil.Process(pid)
+        procs = [root, *root.children(recursive=True)]
+    except psutil.Error:
+        return None
+    sample = {"rss_kb": 0, "cpu_seconds": 0.0, "read_bytes": 0, "write_bytes": 0, "children": len(procs) - 1}
+    for p in procs:
+        try:
+            with p.oneshot():
+                sample["rss_kb"] += p.memory_info().rss // 1024
+                cpu = p.cpu_times()
+                sample["cpu_seconds"] += cpu.user + cpu.system
+                io = p.io_counters() if hasattr(p, "io_counters") else None
+                if io:
+                    sample["read_bytes"] += io.read_bytes
+                    sample["write_bytes"] += io.write_bytes
+        except psutil.Error:
+            continue
+    sample["cpu_seconds"] = round(sample["cpu_seconds"], 2)
+    return sample
+
+
+def sample_tree(pid: int) -> Optional[dict]:
+    """Muestra agregada del proceso `pid` y sus descendientes, o None si ya no existe."""
+    if PROC.joinpath(str(pid)).exists():
+        return _proc_sample(pid)
+    if psutil is not None:
+        return _psutil_sample(pid)
+    return None
+
+
+# ── Monitor por ejecución ────────────────────────────────────────────────────
+
+class ResourceMonitor:
+    def __init__(
+        self,
+        pid: int,
+        out_path: Path,
+        interval: Optional[float] = None,
+        max_rss_kb: int = 0,
+        on_exceeded: Optional[Callable[[], None]] = None,
+        baseline: Optional[dict] = None,
+    ):
+        self.pid = pid
+        self.out_path = out_path
+        self.interval = SAMPLE_INTERVAL if interval is None else interval
+        self.max_rss_kb = max_rss_kb
+        self.on_exceeded = on_exceeded
+        self.baseline = {key: (baseline or {}).get(key, 0) for key in _COUNTERS}
+        self.limit_exceeded = False
+        self.samples = 0
+        self.peak_rss_kb = 0
+        self.sum_rss_kb = 0
+        self.peak_children = 0
+        self.last: dict = {}
+        self._t0 = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.interval > 0 and available():
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        delay = min(FIRST_SAMPLE_DELAY, self.interval)
+        while True:
+            await self._take()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.interval)
+
+    def _collect(self) -> Optional[dict]:
+        sample = sample_tree(self.pid)
+        if sample is None:
+            return None
+        for key in _COUNTERS:
+            sample[key] = max(sample[key] - self.baseline[key], 0)
+        sample["cpu_seconds"] = round(sample["cpu_seconds"], 2)
+        sample["t"] = round(time.monotonic() - self._t0, 2)
+        with open(self.out_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(sample) + "\n")
+        return sample
+
+    async def _take(self):
+        sample = await io_pool.run(self._collect)
+        if sample is None:
+            return
+        self.samples += 1
+        self.sum_rss_kb += sample["rss_kb"]
+        self.peak_rss_kb = max(self.peak_rss_kb, sample["rss_kb"])
+        self.peak_children = max(self.peak_children, sample["children"])
+        self.last = sample
+        if self.max_rss_kb and sample["rss_kb"] > self.max_rss_kb and not self.limit_exceeded:
+            self.limit_exceeded = True
+            logger.warning("Proceso %d superó el límite de memoria (%d KB)", self.pid, sample["rss_kb"])
+            if self.on_exceeded:
+                self.on_exceeded()
+
+    async def _cancel(self):
+        if self._task is None or self._task.done():
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def final_sample(self):
+        """Corta el muestreo periódico y toma una última muestra. Llamar cuando el bot
+        terminó su salida y antes de esperar el proceso: una vez recogido ya no se puede
+        leer (en ese caso queda la última muestra periódica)."""
+        if self._task is None:
+            return
+        await self._cancel()
+        await self._take()
+
+    @property
+    def cpu_seconds(self) -> Optional[float]:
+        """CPU medida del trabajo (árbol de procesos), o None si no hubo muestras."""
+        return self.last.get("cpu_seconds") if self.samples else None
+
+    async def stop(self) -> dict:
+        """Detiene el muestreo y devuelve el resumen para guardar en la ejecución."""
+        if self._task is None:
+            return {}
+        await self._cancel()
+        if not self.samples:
+            return {}
+        return {
+            "samples": self.samples,
+            "interval_seconds": self.interval,
+            "peak_rss_kb": self.peak_rss_kb,
+            "avg_rss_kb": round(self.sum_rss_kb / self.samples),
+            "cpu_seconds": self.last.get("cpu_seconds", 0.0),
+            "read_bytes": self.last.get("read_bytes", 0),
+            "write_bytes": self.last.get("write_bytes", 0),
+            "peak_children": self.peak_children,
+        }
+
+
+def read_samples(run_folder: Path, limit: int = 5000) -> list[dict]:
+    path = run_folder / "logs" / RESOURCES_FILENAME
+    if not path.exists():
+        return []
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                samples.append(json.loads(line))
+            except ValueError:
+                continue
+    # Submuestreo uniforme para no devolver series enormes al frontend
+    if len(samples) > limit:
+        step = len(samples) / limit
+        samples = [samples[int(i * step)] for i in range(limit)]
+    return samples
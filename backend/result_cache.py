@@ -0,0 +1,105 @@
+"""Caché de resultados para el Orquestador de Bots (opt-in por bot con `cache_results`).
+
+Clave: bot_id + versión del script (hash de su contenido) + input_data normalizado.
+Si existe una ejecución completada con la misma clave dentro del TTL del bot, la
+nueva ejecución se sirve sin lanzar el subprocess: su resultados/ se arma con
+hardlinks a los archivos del run original y queda marcada con `cached_from`.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import executor
+import storage
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent
+
+# script_path → ((mtime_ns, size), hash): evita re-hashear el script en cada request
+_script_versions: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def script_version(script_path: str) -> str:
+    path = Path(script_path)
+    try:
+        st = path.stat()
+    except OSError:
+        return "missing"
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _script_versions.get(script_path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    digest = hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+    _script_versions[script_path] = (stamp, digest)
+    return digest
+
+
+def normalize_input(input_data: dict) -> str:
+    """Forma canónica del input (claves en minúscula, valores sin espacios, sin secretos)."""
+    normalized = {
+        str(k).strip().lower(): str(v).strip()
+        for k, v in input_data.items()
+        if str(k).upper() not in executor.SENSITIVE_ENV_KEYS
+    }
+    return json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+
+
+def cache_key(bot: dict, input_data: dict) -> Optional[str]:
+    """Clave de caché de la ejecución, o None si el bot no tiene caché habilitada."""
+    if not bot.get("cache_results"):
+        return None
+    raw = "\n".join([bot["id"], script_version(bot["script_path"]), normalize_input(input_data)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def find_cached(bot: dict, key: str, executions: Optional[list[dict]] = None) -> Optional[dict]:
+    """Última ejecución completada con la misma clave, dentro del TTL y con archivos en disco.
+
+    Solo cuentan ejecuciones que corrieron de verdad: una servida desde caché tiene
+    completed_at del momento en que se sirvió, y usarla de fuente estiraría el TTL
+    del resultado original indefinidamente."""
+    ttl = timedelta(hours=float(bot.get("cache_ttl_hours", 24.0)))
+    cutoff = (datetime.now() - ttl).isoformat()
+    if executions is None:
+        executions = storage.load(executor.EXECUTIONS_FILE)
+    for ex in executions:  # más recientes primero
+        if ex.get("cache_key") != key or ex.get("status") != "completed" or ex.get("cached_from"):
+            continue
+        if (ex.get("completed_at") or "") < cutoff:
+            continue
+        if ex.get("run_folder") and (BASE_DIR / ex["run_folder"] / "resultados").exists():
+            return ex
+    return None
+
+
+def materialize(execution: dict, source: dict) -> dict:
+    """Crea la carpeta del run servido desde caché y devuelve los campos a persistir."""
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    run_folder = executor.EJECUCIONES_DIR / execution["bot_id"] / f"{timestamp}_cache_{execution['id'][:8]}"
+    (run_folder / "logs").mkdir(parents=True, exist_ok=True)
+    (run_folder / "resultados").mkdir(parents=True, exist_ok=True)
+
+    origin_id = source["id"]
+    files = executor.link_tree(BASE_DIR / source["run_folder"] / "resultados", run_folder / "resultados")
+    with open(run_folder / "logs" / "run.log", "w", encoding="utf-8") as lf:
+        lf.write(
+            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Resultado servido desde caché\n"
+            f"Ejecución original: {origin_id} (completada {source.get('completed_at')})\n"
+            f"Archivos reutilizados: {files}\n"
+        )
+    logger.info("Ejecución %s servida desde caché (%s)", execution["id"], origin_id)
+    now = datetime.now().isoformat()
+    return {
+        "status": "completed",
+        "started_at": now,
+        "completed_at": now,
+        "run_folder": str(run_folder.relative_to(BASE_DIR)),
+        "exit_code": 0,
+        "duration_seconds": 0.0,
+        "cached_from": origin_id,
+    }
@@ -0,0 +1,138 @@
+"""Persistencia JSON compartida para el Orquestador de Bots.
+
+- Escrituras atómicas (archivo temporal + os.replace): un lector nunca ve un JSON a medias.
+- transaction(path): lectura-modificación-escritura bajo un lock por archivo, para que
+  los handlers (threadpool) y el executor (event loop) no se pisen actualizaciones.
+- set_interprocess(True): en modo multi-proceso (ver engine.py) save/transaction toman
+  además un lock de archivo (<archivo>.lock) compartido por todos los procesos.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import metrics
+import tracing
+
+_locks: dict[Path, threading.RLock] = {}
+_locks_guard = threading.Lock()
+# Por thread: locks entre procesos ya tomados (ver _process_lock)
+_local = threading.local()
+_interprocess = False
+
+
+def set_interprocess(enabled: bool):
+    global _interprocess
+    _interprocess = enabled
+
+
+def _lock_for(path: Path) -> threading.RLock:
+    key = Path(path).resolve()
+    lock = _locks.get(key)
+    if lock is None:
+        with _locks_guard:
+            lock = _locks.setdefault(key, threading.RLock())
+    return lock
+
+
+def load(path: Path) -> list[dict]:
+    if path.exists():
+        with metrics.PERSISTENCE.time(op="load", file=path.name), tracing.span("storage.load", file=path.name):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    return []
+
+
+def version(path: Path) -> tuple[str, Optional[float]]:
+    """(token, mtime) de la versión actual de un archivo. Toda escritura pasa por
+    os.replace, así que cada una deja un archivo nuevo con otro mtime/tamaño/inode;
+    sirve para ETags sin leer el contenido. ("0", None) si no existe."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return "0", None
+    return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}", st.st_mtime
+
+
+def save(path: Path, data: list[dict]):
+    with _lock_for(path), _process_lock(path):
+        _write_atomic(path, data)
+
+
+@contextmanager
+def _process_lock(path: Path) -> Iterator[None]:
+    """Lock exclusivo entre procesos sobre <archivo>.lock. Se toma siempre después del
+    RLock del archivo, así que es reentrante por thread contando la profundidad."""
+    if not _interprocess:
+        yield
+        return
+    held: dict[Path, int] = _local.__dict__.setdefault("held", {})
+    key = Path(path).resolve()
+    if held.get(key):
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+    key.parent.mkdir(parents=True, exist_ok=True)
+    with open(key.with_name(f".{key.name}.lock"), "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK se rinde a los ~10s: seguir esperando
+                    pass
+        held[key] = 1
+        try:
+            yield
+        finally:
+            held[key] = 0
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomic(path: Path, data: list[dict]):
+    with metrics.PERSISTENCE.time(op="save", file=path.name), tracing.span("storage.save", file=path.name):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        # En Windows os.replace falla si otro handle tiene el destino abierto: reintentar
+        for attempt in range(10):
+            try:
+                os.replace(tmp, path)
+                return
+            except PermissionError:
+                if attempt == 9:
+                    raise
+                time.sleep(0.01)
+
+
+@contextmanager
+def transaction(path: Path) -> Iterator[list[dict]]:
+    """Carga la lista, la entrega para modificarla in-place y la guarda al salir.
+
+    Si el bloque lanza una excepción no se escribe nada.
+    """
+    with _lock_for(path), _process_lock(path):
+        data = load(path)
+        yield data
+        _write_atomic(path, data)
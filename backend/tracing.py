@@ -0,0 +1,214 @@
+"""Spans livianos para los caminos calientes del backend.
+
+Cada span (persistencia, auth, cola, lanzamiento del bot, listado de archivos,
+requests HTTP) se guarda en un ring buffer en memoria y, si TRACE_FILE está
+definido, se agrega como una línea OTLP/JSON (`{"resourceSpans": [...]}`), el mismo
+formato que escribe el file exporter del OpenTelemetry Collector.
+
+Desactivado por defecto (TRACING_ENABLED=0): en ese caso span() solo chequea un flag.
+Se puede prender/apagar en caliente desde /api/admin/tracing.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "orquestador-bots"
+BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "5000"))
+# Desde la API solo se puede elegir un nombre de archivo dentro de esta carpeta
+# (TRACE_FILE, que define el operador, puede ser cualquier ruta)
+TRACES_DIR = Path(__file__).parent / "data" / "traces"
+
+_enabled = os.getenv("TRACING_ENABLED", "0").lower() in ("1", "true", "yes")
+_trace_file: Optional[Path] = Path(os.environ["TRACE_FILE"]) if os.getenv("TRACE_FILE") else None
+_buffer: deque[dict] = deque(maxlen=BUFFER_SIZE)
+_file_lock = threading.Lock()
+
+# (trace_id, span_id) del span activo en el contexto actual (thread o task de asyncio)
+_current: ContextVar[Optional[tuple[str, str]]] = ContextVar("tracing_current", default=None)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def trace_path(name: str) -> Path:
+    """Ruta dentro de TRACES_DIR para un nombre de archivo pedido por la API.
+    ValueError si no es un nombre simple (sin carpetas, rutas absolutas ni ..)."""
+    if not name or Path(name).name != name or name in (".", "..") or any(c in name for c in "/\\:"):
+        raise ValueError("trace_file debe ser solo un nombre de archivo (se guarda en data/traces/)")
+    return TRACES_DIR / name
+
+
+def configure(enabled: bool, trace_file: Optional[str] = None):
+    """Prende/apaga el tracing. trace_file: nombre de archivo en TRACES_DIR, "" desactiva
+    el archivo, None lo deja como está."""
+    global _enabled, _trace_file
+    path = trace_path(trace_file) if trace_file else None
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    _enabled = enabled
+    if trace_file is not None:
+        _trace_file = path
+    logger.info("Tracing %s (archivo: %s)", "activado" if enabled else "desactivado", _trace_file)
+
+
+def status() -> dict:
+    return {
+        "enabled": _enabled,
+        "trace_file": str(_trace_file) if _trace_file else None,
+        "buffer_size": BUFFER_SIZE,
+        "buffered_spans": len(_buffer),
+    }
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[dict]]:
+    """Registra un span alrededor del bloque. Entrega el dict del span (o None si el
+    tracing está apagado) para poder agregar atributos o renombrarlo al terminar."""
+    if not _enabled:
+        yield None
+        return
+    parent = _current.get()
+    trace_id = parent[0] if parent else secrets.token_hex(16)
+    record = {
+        "name": name,
+        "trace_id": trace_id,
+        "span_id": secrets.token_hex(8),
+        "parent_span_id": parent[1] if parent else None,
+        "start_ns": time.time_ns(),
+        "end_ns": None,
+        "attributes": attributes,
+        "error": None,
+        "thread": threading.current_thread().name,
+    }
+    token = _current.set((trace_id, record["span_id"]))
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        record["end_ns"] = time.time_ns()
+        _record(record)
+
+
+def traced(name: str):
+    """Decorador: envuelve la función (sync o async) en un span con ese nombre."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _record(record: dict):
+    _buffer.append(record)
+    if _trace_file is None:
+        return
+    line = json.dumps(to_otlp([record]), ensure_ascii=False)
+    try:
+        with _file_lock:
+            with open(_trace_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except OSError as e:
+        logger.warning("No se pudo escribir el span en %s: %s", _trace_file, e)
+
+
+def recent_spans(limit: int = 1000, name_prefix: str = "") -> list[dict]:
+    spans = [s for s in list(_buffer) if s["name"].startswith(name_prefix)] if name_prefix else list(_buffer)
+    return spans[-limit:] if limit else spans
+
+
+def clear():
+    _buffer.clear()
+
+
+# ── OTLP/JSON ────────────────────────────────────────────────────────────────
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(record: dict) -> dict:
+    attributes = {**record["attributes"], "thread.name": record["thread"]}
+    span = {
+        "traceId": record["trace_id"],
+        "spanId": record["span_id"],
+        "name": record["name"],
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(record["start_ns"]),
+        "endTimeUnixNano": str(record["end_ns"]),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None],
+        "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 1},
+    }
+    if record["parent_span_id"]:
+        span["parentSpanId"] = record["parent_span_id"]
+    return span
+
+
+def to_otlp(records: list[dict]) -> dict:
+    """Payload ExportTraceServiceRequest en JSON (importable en Jaeger/Tempo/Collector)."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": __name__},
+                "spans": [_otlp_span(r) for r in records],
+            }],
+        }],
+    }
+
+
+class TracingMiddleware:
+    """Middleware ASGI: span raíz por request, nombrado con la plantilla de la ruta."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+        with span("http.request", **{"http.method": scope.get("method", "")}) as record:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and record is not None:
+                    record["attributes"]["http.status_code"] = message.get("status", 0)
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                if record is not None:
+                    route = getattr(scope.get("route"), "path", scope.get("path", ""))
+                    record["name"] = f"{scope.get('method', '')} {route}"
+                    record["attributes"]["http.route"] = route
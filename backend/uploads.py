@@ -0,0 +1,92 @@
+"""Recepción de archivos subidos sin tenerlos enteros en memoria.
+
+receive() copia bloque a bloque (de request.stream() o de un UploadFile) a un archivo
+temporal en la carpeta de destino, corta apenas se pasa del límite de tamaño, calcula
+el SHA-256 mientras escribe y recién al final, si el contenido es válido, lo mueve
+sobre el destino con os.replace: quien lee el destino ve el archivo anterior o el
+nuevo completo, nunca uno a medias. Todo el I/O va por io_pool.
+"""
+
+import hashlib
+import os
+import secrets
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Callable, Optional
+
+from fastapi import UploadFile
+
+import io_pool
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Subida rechazada; main.py la convierte en la respuesta HTTP `status`."""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def check_length(content_length: Optional[str], max_bytes: Optional[int]):
+    """Rechaza antes de leer nada si el cliente ya declaró un tamaño mayor al límite."""
+    if max_bytes is not None and content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise UploadError(413, f"El archivo supera el máximo de {_human(max_bytes)}")
+
+
+async def file_chunks(file: UploadFile, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+def _human(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.0f} MB"
+    return f"{size / 1024:.0f} KB"
+
+
+def _write(f: BinaryIO, digest, chunk: bytes):
+    f.write(chunk)
+    digest.update(chunk)
+
+
+def _sync_close(f: BinaryIO):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def _discard(tmp: Path, f: BinaryIO):
+    f.close()
+    tmp.unlink(missing_ok=True)
+
+
+async def receive(
+    chunks: AsyncIterator[bytes],
+    target: Path,
+    max_bytes: Optional[int] = None,
+    validate: Optional[Callable[[Path], None]] = None,
+) -> dict:
+    """Guarda la subida en `target`. `validate(tmp)` se llama en un thread con el archivo
+    ya completo y puede lanzar UploadError para descartarlo. Retorna name, size y sha256."""
+    await io_pool.run(target.parent.mkdir, parents=True, exist_ok=True)
+    # Nombre único: dos subidas simultáneas al mismo destino no se pisan el temporal
+    tmp = target.with_name(f".{target.name}.{secrets.token_hex(4)}.upload")
+    f = await io_pool.run(open, tmp, "wb")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if max_bytes is not None and size > max_bytes:
+                raise UploadError(413, f"El archivo supera el máximo de {_human(max_bytes)}")
+            await io_pool.run(_write, f, digest, chunk)
+        await io_pool.run(_sync_close, f)
+        if validate:
+            await io_pool.run(validate, tmp)
+        await io_pool.run(os.replace, tmp, target)
+    except BaseException:
+        await io_pool.run(_discard, tmp, f)
+        raise
+    return {"name": target.name, "size": size, "sha256": digest.hexdigest()}
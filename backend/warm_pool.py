@@ -0,0 +1,169 @@
+"""Pool de intérpretes Python pre-lanzados por bot (opt-in con `warm_pool_size`).
+
+Cada bot con warm_pool_size > 0 mantiene esa cantidad de procesos warm_runner.py
+ociosos que ya importaron sus `warm_preload_modules`. Al ejecutar, el executor toma
+uno, le envía el trabajo (script, args, env de la ejecución) por stdin y lee su stdout
+como el de un subprocess normal. Tras el trabajo el proceso vuelve al pool salvo que
+haya alcanzado `warm_max_runs` ejecuciones o supere `warm_max_rss_mb`; el default
+(warm_max_runs=1) usa cada intérprete una sola vez para no arrastrar estado global
+entre ejecuciones. El pool se repone en segundo plano.
+
+Si no hay un proceso ocioso disponible, acquire() devuelve None y se usa el camino frío.
+"""
+
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+import resource_limits
+from warm_runner import SENTINEL
+
+logger = logging.getLogger(__name__)
+
+RUNNER_PATH = Path(__file__).parent / "warm_runner.py"
+_SENTINEL_BYTES = SENTINEL.encode("ascii")
+
+
+class WarmProcess:
+    def __init__(self, bot_id: str, proc: asyncio.subprocess.Process):
+        self.bot_id = bot_id
+        self.proc = proc
+        self.runs = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def submit(
+        self,
+        script_path: Path,
+        script_args: list[str],
+        env: dict[str, str],
+        limits: Optional[dict] = None,
+    ):
+        """`limits`: resource_limits.job_limits(bot), que el runner aplica solo a este trabajo."""
+        job = {
+            "script": script_path.name,
+            "args": list(script_args),
+            "cwd": str(script_path.parent),
+            "env": env,
+            "limits": limits or {},
+        }
+        self.runs += 1
+        self.proc.stdin.write((json.dumps(job) + "\n").encode("utf-8"))
+        await self.proc.stdin.drain()
+
+    @staticmethod
+    def split_sentinel(line: bytes) -> tuple[bytes, Optional[dict]]:
+        """Separa la salida del bot de la línea centinela de fin de trabajo, si la hay."""
+        idx = line.find(_SENTINEL_BYTES)
+        if idx < 0:
+            return line, None
+        try:
+            result = json.loads(line[idx + len(_SENTINEL_BYTES):].decode("utf-8"))
+        except ValueError:
+            return line, None
+        return line[:idx], result
+
+    async def close(self):
+        if not self.alive:
+            return
+        try:
+            self.proc.stdin.close()
+            await asyncio.wait_for(self.proc.wait(), timeout=5)
+        except (asyncio.TimeoutError, ProcessLookupError, ConnectionResetError, BrokenPipeError):
+            try:
+                self.proc.kill()
+            except ProcessLookupError:
+                pass
+
+
+_idle: dict[str, list[WarmProcess]] = {}
+_refill_tasks: dict[str, asyncio.Task] = {}
+
+
+async def _spawn(bot: dict) -> WarmProcess:
+    script_path = Path(bot["script_path"])
+    proc = await asyncio.create_subprocess_exec(
+        "python", "-u", str(RUNNER_PATH), *bot.get("warm_preload_modules", []),
+        cwd=str(script_path.parent),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        # Solo la prioridad: los rlimits los aplica el runner por trabajo, así la precarga
+        # y los trabajos anteriores no consumen el límite de CPU de la ejecución
+        **resource_limits.spawn_kwargs(bot, rlimits=False),
+    )
+    resource_limits.apply_after_spawn(bot, proc.pid)
+    return WarmProcess(bot["id"], proc)
+
+
+async def _refill(bot: dict):
+    pool = _idle.setdefault(bot["id"], [])
+    pool[:] = [w for w in pool if w.alive]
+    while len(pool) < int(bot.get("warm_pool_size", 0)):
+        try:
+            pool.append(await _spawn(bot))
+        except Exception as e:
+            logger.warning("No se pudo pre-lanzar intérprete para bot %s: %s", bot["id"], e)
+            return
+
+
+def _schedule_refill(bot: dict):
+    task = _refill_tasks.get(bot["id"])
+    if task and not task.done():
+        return
+    _refill_tasks[bot["id"]] = asyncio.create_task(_refill(bot))
+
+
+async def start(bots: list[dict]):
+    """Pre-lanza los intérpretes de todos los bots con pool. Llamar desde el lifespan."""
+    for bot in bots:
+        if bot.get("enabled", True) and int(bot.get("warm_pool_size", 0)) > 0:
+            _schedule_refill(bot)
+
+
+async def acquire(bot: dict) -> Optional[WarmProcess]:
+    """Toma un intérprete ocioso del bot (o None si no hay) y agenda la reposición."""
+    if int(bot.get("warm_pool_size", 0)) <= 0:
+        return None
+    pool = _idle.setdefault(bot["id"], [])
+    warm = None
+    while pool:
+        candidate = pool.pop(0)
+        if candidate.alive:
+            warm = candidate
+            break
+    _schedule_refill(bot)
+    return warm
+
+
+async def release(bot: dict, warm: WarmProcess, result: Optional[dict]):
+    """Devuelve el intérprete al pool o lo recicla (máx. ejecuciones, memoria, o sin centinela)."""
+    max_runs = max(1, int(bot.get("warm_max_runs", 1)))
+    max_rss_kb = int(bot.get("warm_max_rss_mb", 0)) * 1024
+    rss_kb = (result or {}).get("rss_kb")
+    recycle = (
+        result is None
+        or not warm.alive
+        or warm.runs >= max_runs
+        or (max_rss_kb and rss_kb and rss_kb > max_rss_kb)
+    )
+    pool = _idle.setdefault(bot["id"], [])
+    if recycle or len(pool) >= int(bot.get("warm_pool_size", 0)):
+        await warm.close()
+    else:
+        pool.append(warm)
+    _schedule_refill(bot)
+
+
+async def shutdown():
+    for task in _refill_tasks.values():
+        task.cancel()
+    _refill_tasks.clear()
+    for pool in _idle.values():
+        for warm in pool:
+            await warm.close()
+    _idle.clear()
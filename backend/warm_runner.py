@@ -0,0 +1,144 @@
+"""Intérprete "tibio" para el pool de warm_pool.py.
+
+Se lanza como `python -u warm_runner.py <modulo> [<modulo> ...]` con cwd en la carpeta
+del bot: importa de antemano los módulos pesados del bot y queda esperando trabajos
+por stdin, uno por línea JSON:
+
+    {"script": "main.py", "args": [...], "cwd": "...", "env": {...}, "limits": {...}}
+
+`limits` (memory_mb, cpu_seconds, open_files) se aplican como límites soft solo
+durante el trabajo. El de CPU se suma a lo que el intérprete ya consumió (precarga y
+trabajos anteriores): RLIMIT_CPU cuenta desde que arrancó el proceso. El límite hard
+no se toca porque no se podría volver a subir para el trabajo siguiente.
+
+Cada trabajo ejecuta el script como __main__ con el env de la ejecución y al final
+escribe en stdout una línea centinela con el exit code y la memoria del proceso:
+
+    __WARM_RUNNER_DONE__ {"exit_code": 0, "rss_kb": 123456}
+
+Este archivo no importa nada del backend: corre dentro del intérprete del bot.
+"""
+
+import importlib
+import json
+import math
+import os
+import runpy
+import sys
+import traceback
+
+try:
+    import resource
+except ImportError:  # Windows: sin rlimits
+    resource = None
+
+SENTINEL = "__WARM_RUNNER_DONE__"
+
+
+def _rss_kb():
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+def _apply_limits(limits):
+    """Aplica los límites del trabajo y devuelve los anteriores para restaurarlos."""
+    if resource is None or not limits:
+        return []
+    wanted = []
+    if limits.get("memory_mb"):
+        wanted.append((resource.RLIMIT_AS, limits["memory_mb"] * 1024 * 1024))
+    if limits.get("cpu_seconds"):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = math.ceil(usage.ru_utime + usage.ru_stime)
+        wanted.append((resource.RLIMIT_CPU, used + limits["cpu_seconds"]))
+    if limits.get("open_files"):
+        wanted.append((resource.RLIMIT_NOFILE, limits["open_files"]))
+    previous = []
+    for which, soft in wanted:
+        old_soft, hard = resource.getrlimit(which)
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(which, (soft, hard))
+        previous.append((which, old_soft, hard))
+    return previous
+
+
+def _restore_limits(previous):
+    for which, soft, hard in previous:
+        try:
+            resource.setrlimit(which, (soft, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def _run_job(job):
+    base_env = dict(os.environ)
+    base_cwd = os.getcwd()
+    base_argv = list(sys.argv)
+    base_path0 = sys.path[0]
+
+    script = job["script"]
+    cwd = job.get("cwd") or base_cwd
+    os.environ.clear()
+    os.environ.update(job.get("env") or base_env)
+    os.chdir(cwd)
+    sys.argv = [script, *job.get("args", [])]
+    sys.path[0] = cwd
+
+    exit_code = 0
+    previous_limits = []
+    try:
+        previous_limits = _apply_limits(job.get("limits"))
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif isinstance(e.code, int):
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        _restore_limits(previous_limits)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.environ.clear()
+        os.environ.update(base_env)
+        os.chdir(base_cwd)
+        sys.argv = base_argv
+        sys.path[0] = base_path0
+    return exit_code
+
+
+def main():
+    sys.path[0] = os.getcwd()
+    for name in sys.argv[1:]:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"[warm_runner] no se pudo precargar {name}: {e}", file=sys.stderr)
+    # stdin se cierra cuando el pool descarta el proceso
+    for raw in sys.stdin:
+        raw = raw.strip()
+        if not raw:
+            continue
+        exit_code = _run_job(json.loads(raw))
+        sys.stdout.write(SENTINEL + " " + json.dumps({"exit_code": exit_code, "rss_kb": _rss_kb()}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
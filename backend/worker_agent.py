@@ -0,0 +1,323 @@
+"""Agente remoto del Orquestador de Bots.
+
+Corre en otra VM (o varias instancias en la misma máquina para probar), se registra
+en el orquestador con sus capacidades y toma ejecuciones por HTTP con leases. Ver el
+protocolo en agents.py.
+
+Uso (desde la carpeta backend, con las mismas dependencias):
+
+    python worker_agent.py --server http://orquestador:8000 --token <AGENT_TOKEN> \\
+        --name vm-rpa-02 --ui --slots 2 --tags sap,vpn
+
+Cada slot es un loop independiente: pide un lease, lanza el script del bot con
+`python -u`, manda la salida al orquestador mientras corre, renueva el lease con
+heartbeats (y mata el proceso si la ejecución se canceló), sube logs/ y resultados/
+al terminar y reporta el resultado. El script debe existir en la misma ruta que en
+el orquestador (script_path del bot).
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import socket
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import httpx
+
+import resource_limits
+import resource_monitor
+
+logger = logging.getLogger("worker_agent")
+
+LOG_FLUSH_INTERVAL = 1.0
+RETRY_DELAY = 5
+UPLOAD_CHUNK = 256 * 1024
+
+
+class WorkerAgent:
+    def __init__(
+        self,
+        server: str,
+        token: str,
+        name: str,
+        requires_ui: bool = False,
+        slots: int = 1,
+        tags: Optional[list[str]] = None,
+        work_dir: Optional[Path] = None,
+        wait: float = 25,
+    ):
+        self.server = server.rstrip("/")
+        self.token = token
+        self.name = name
+        self.requires_ui = requires_ui
+        self.slots = slots
+        self.tags = tags or []
+        self.work_dir = work_dir or Path(__file__).parent / "agent_runs"
+        self.wait = wait
+        self.agent_id: Optional[str] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self._register_lock = asyncio.Lock()
+
+    async def run(self):
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        async with httpx.AsyncClient(
+            base_url=self.server,
+            headers={"X-Agent-Token": self.token},
+            timeout=self.wait + 15,
+        ) as client:
+            self.client = client
+            await self._register(None)
+            try:
+                await asyncio.gather(*(self._slot(i) for i in range(self.slots)))
+            finally:
+                if self.agent_id:
+                    try:
+                        await client.delete(f"/api/agents/{self.agent_id}")
+                    except httpx.HTTPError:
+                        pass
+
+    async def _register(self, stale_id: Optional[str]):
+        """Registra el agente. Con varios slots solo el primero que detecta el 404
+        se vuelve a registrar (stale_id = id con el que falló)."""
+        async with self._register_lock:
+            while self.agent_id == stale_id:
+                try:
+                    r = await self.client.post("/api/agents/register", json={
+                        "name": self.name,
+                        "requires_ui": self.requires_ui,
+                        "tags": self.tags,
+                        "slots": self.slots,
+                    })
+                    r.raise_for_status()
+                    self.agent_id = r.json()["agent_id"]
+                    logger.info("Registrado como %s en %s", self.agent_id, self.server)
+                except httpx.HTTPError as e:
+                    logger.warning("No se pudo registrar (%s); reintento en %ds", e, RETRY_DELAY)
+                    await asyncio.sleep(RETRY_DELAY)
+
+    async def _slot(self, index: int):
+        while True:
+            agent_id = self.agent_id
+            try:
+                r = await self.client.post(f"/api/agents/{agent_id}/lease", params={"wait": self.wait})
+                if r.status_code == 404:
+                    # El orquestador se reinició o nos dio de baja
+                    await self._register(agent_id)
+                    continue
+                r.raise_for_status()
+                if r.status_code == 204:
+                    continue
+                await self._run_job(agent_id, r.json())
+            except httpx.HTTPError as e:
+                logger.warning("Slot %d: error hablando con el orquestador (%s)", index, e)
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def _run_job(self, agent_id: str, job: dict):
+        execution_id = job["execution_id"]
+        bot = job["bot"]
+        base = f"/api/agents/{agent_id}/leases/{execution_id}"
+        run_dir = self.work_dir / execution_id
+        logs_dir = run_dir / "logs"
+        resultados_dir = run_dir / "resultados"
+        logs_dir.mkdir(parents=True, exist_ok=True)
+        resultados_dir.mkdir(parents=True, exist_ok=True)
+        log_file = logs_dir / "run.log"
+        logger.info("Ejecutando %s (bot %s, intento %s)", execution_id, bot["id"], job.get("attempt"))
+
+        script_path = Path(bot["script_path"])
+        env = {
+            **os.environ,
+            "EJECUCION_DIR": str(run_dir.resolve()),
+            "EJECUCION_LOGS_DIR": str(logs_dir.resolve()),
+            "EJECUCION_RESULTADOS_DIR": str(resultados_dir.resolve()),
+            "ORQUESTADOR_EVENT_PREFIX": job.get("event_prefix", ""),
+            **job.get("env", {}),
+        }
+
+        start_time = datetime.now()
+        exit_code = -1
+        error_msg = ""
+        failure_reason = None
+        resources: dict = {}
+        timed_out = False
+        lost = False
+        pending = bytearray()
+        # El pump y el heartbeat mandan el log: de a un POST por vez para que llegue en orden
+        flush_lock = asyncio.Lock()
+        proc = None
+        monitor = None
+
+        async def _flush():
+            nonlocal lost
+            async with flush_lock:
+                if not pending:
+                    return
+                data = bytes(pending)
+                r = await self.client.post(f"{base}/log", content=data)
+                if r.status_code == 409:
+                    lost = True
+                elif r.is_success:
+                    # Recién ahora: si el POST falla el bloque se reintenta en el próximo flush
+                    del pending[:len(data)]
+                    if r.json().get("cancel") and proc.returncode is None:
+                        proc.kill()
+
+        async def _heartbeat():
+            nonlocal lost
+            interval = max(job.get("lease_seconds", 30) / 3, 1)
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await _flush()
+                    r = await self.client.post(f"{base}/heartbeat")
+                    if r.status_code == 409:
+                        lost = True
+                    elif r.is_success and r.json().get("cancel"):
+                        logger.info("Ejecución %s cancelada desde el orquestador", execution_id)
+                        if proc.returncode is None:
+                            proc.kill()
+                except httpx.HTTPError as e:
+                    logger.warning("Heartbeat de %s falló: %s", execution_id, e)
+                if lost:
+                    # El lease venció y la ejecución se reasignó: este resultado ya no vale
+                    logger.warning("Lease de %s perdido; se detiene el proceso", execution_id)
+                    if proc.returncode is None:
+                        proc.kill()
+                    return
+
+        async def _pump():
+            last_flush = asyncio.get_running_loop().time()
+            with open(log_file, "wb") as lf:
+                while True:
+                    line = await proc.stdout.readline()
+                    if not line:
+                        break
+                    lf.write(line)
+                    lf.flush()
+                    pending.extend(line)
+                    now = asyncio.get_running_loop().time()
+                    if now - last_flush >= LOG_FLUSH_INTERVAL:
+                        last_flush = now
+                        try:
+                            await _flush()
+                        except httpx.HTTPError as e:
+                            logger.warning("No se pudo enviar el log de %s: %s", execution_id, e)
+
+        heartbeat = None
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "python", "-u", str(script_path.name), *bot.get("script_args", []),
+                cwd=str(script_path.parent),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=env,
+                **resource_limits.spawn_kwargs(bot),
+            )
+            resource_limits.apply_after_spawn(bot, proc.pid)
+            heartbeat = asyncio.create_task(_heartbeat())
+            monitor = resource_monitor.ResourceMonitor(
+                proc.pid,
+                logs_dir / resource_monitor.RESOURCES_FILENAME,
+                max_rss_kb=resource_limits.memory_limit_kb(bot),
+                on_exceeded=proc.kill,
+            )
+            monitor.start()
+            try:
+                await asyncio.wait_for(_pump(), timeout=resource_limits.wall_limit_seconds(bot))
+            except asyncio.TimeoutError:
+                timed_out = True
+                proc.kill()
+            await monitor.final_sample()
+            exit_code = await proc.wait()
+            if exit_code != 0:
+                error_msg = f"El proceso terminó con código {exit_code}"
+                limit_failure = resource_limits.classify_failure(
+                    bot, exit_code, log_file, timed_out, monitor.limit_exceeded, monitor.cpu_seconds,
+                )
+                if limit_failure:
+                    failure_reason, error_msg = limit_failure
+                    pending.extend(f"\n[EXECUTOR] {error_msg}\n".encode())
+        except Exception as e:
+            logger.exception("Error ejecutando %s", execution_id)
+            error_msg = str(e)
+            pending.extend(f"\n[EXECUTOR ERROR] {e}\n".encode())
+        finally:
+            if heartbeat:
+                # Con el lock: no cortar un POST del log a medias (el bloque se mandaría dos veces)
+                async with flush_lock:
+                    heartbeat.cancel()
+            if monitor:
+                resources = await monitor.stop()
+
+        try:
+            if not lost:
+                try:
+                    await _flush()
+                except httpx.HTTPError as e:
+                    # Sin /complete el lease vence y la ejecución se reintenta entera
+                    logger.warning("No se pudo enviar el final del log de %s: %s", execution_id, e)
+                await self._upload_outputs(base, run_dir)
+                await self.client.post(f"{base}/complete", json={
+                    "exit_code": exit_code,
+                    "error_message": error_msg,
+                    "duration_seconds": (datetime.now() - start_time).total_seconds(),
+                    "resources": resources,
+                    "failure_reason": failure_reason,
+                })
+                logger.info("Ejecución %s terminada (exit code %s)", execution_id, exit_code)
+        finally:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    async def _upload_outputs(self, base: str, run_dir: Path):
+        for sub in ("logs", "resultados"):
+            for path in sorted((run_dir / sub).rglob("*")):
+                # run.log ya se mandó en vivo
+                if not path.is_file() or path == run_dir / "logs" / "run.log":
+                    continue
+                rel = path.relative_to(run_dir).as_posix()
+                r = await self.client.put(f"{base}/files/{rel}", content=_file_chunks(path))
+                if not r.is_success:
+                    logger.warning("No se pudo subir %s: %s", rel, r.text)
+
+
+async def _file_chunks(path: Path) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := await asyncio.to_thread(f.read, UPLOAD_CHUNK):
+            yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agente remoto del Orquestador de Bots")
+    parser.add_argument("--server", default=os.getenv("AGENT_SERVER", "http://localhost:8000"))
+    parser.add_argument("--token", default=os.getenv("AGENT_TOKEN", ""))
+    parser.add_argument("--name", default=os.getenv("AGENT_NAME", socket.gethostname()))
+    parser.add_argument("--ui", action="store_true", help="Este agente tiene escritorio para bots con UI")
+    parser.add_argument("--slots", type=int, default=int(os.getenv("AGENT_SLOTS", "1")))
+    parser.add_argument("--tags", default=os.getenv("AGENT_TAGS", ""), help="Separados por coma")
+    parser.add_argument("--work-dir", type=Path, default=None)
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("Falta --token (o AGENT_TOKEN)")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    agent = WorkerAgent(
+        server=args.server,
+        token=args.token,
+        name=args.name,
+        requires_ui=args.ui,
+        slots=args.slots,
+        tags=[t.strip() for t in args.tags.split(",") if t.strip()],
+        work_dir=args.work_dir,
+    )
+    try:
+        asyncio.run(agent.run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
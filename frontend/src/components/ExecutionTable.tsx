@@ -1,6 +1,6 @@
 import { useState, useEffect, useCallback } from 'react'
 import { Download, FileText, Archive, ChevronDown, ChevronRight, XCircle, Loader2, Eye, Timer, Image as ImageIcon, X, ChevronLeft, ChevronRight as ChevronRightIcon, ExternalLink, Trash2 } from 'lucide-react'
-import type { BotExecution, ExecutionFile, ExecutionFiles, ExecutionResultItem } from '@/types'
+import type { BotExecution, ExecutionFile, ExecutionFiles, ExecutionProgress, ExecutionResultItem } from '@/types'
 import { cn, formatDate, formatDuration, formatBytes, formatElapsed } from '@/lib/utils'
 import { fetchExecutionFiles, downloadZipUrl, cancelExecution, deleteExecution } from '@/services/api'
 import LogViewerModal from '@/components/LogViewerModal'
@@ -499,6 +499,21 @@ function LiveDuration({ execution }: { execution: BotExecution }) {
   )
 }
 
+/** Progreso reportado por el bot (bot_events): barra y paso/mensaje actual. */
+function ProgressInfo({ progress }: { progress: ExecutionProgress }) {
+  const label = progress.step || progress.message
+  return (
+    <div className="mt-1 w-28">
+      {progress.percent != null && (
+        <div className="h-1.5 rounded-full bg-gray-100 overflow-hidden" title={`${progress.percent}%`}>
+          <div className="h-full bg-warning-500 transition-all" style={{ width: `${progress.percent}%` }} />
+        </div>
+      )}
+      {label && <p className="text-[11px] text-gray-500 truncate mt-0.5" title={label}>{label}</p>}
+    </div>
+  )
+}
+
 interface RowProps {
   ex: BotExecution
   showBotName: boolean
@@ -527,6 +542,7 @@ function ExecutionRow({ ex, showBotName, expanded, onToggle, onCancel, onDelete,
           <span className={cn('text-xs px-2 py-1 rounded-full font-medium', status.classes)}>
             {status.label}
           </span>
+          {ex.status === 'running' && ex.progress && <ProgressInfo progress={ex.progress} />}
         </td>
         <td className="py-3 pr-4 text-gray-500 whitespace-nowrap">{formatDate(ex.queued_at)}</td>
         <td className="py-3 pr-4">
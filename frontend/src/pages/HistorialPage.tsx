@@ -1,12 +1,17 @@
 import { useCallback, useEffect, useRef, useState } from 'react'
 import { History, RefreshCw } from 'lucide-react'
-import { fetchExecutions } from '@/services/api'
+import { fetchArchivedExecutions, fetchExecutions } from '@/services/api'
 import type { BotExecution } from '@/types'
 import ExecutionTable from '@/components/ExecutionTable'
 
+const ARCHIVE_PAGE_SIZE = 100
+
 export default function HistorialPage() {
   const [executions, setExecutions] = useState<BotExecution[]>([])
   const [loading, setLoading] = useState(true)
+  const [archived, setArchived] = useState<BotExecution[]>([])
+  const [archiveDone, setArchiveDone] = useState(false)
+  const [loadingArchive, setLoadingArchive] = useState(false)
   const intervalRef = useRef<ReturnType<typeof setInterval> | null>(null)
 
   const load = useCallback(async () => {
@@ -26,7 +31,26 @@ export default function HistorialPage() {
     return () => { if (intervalRef.current) clearInterval(intervalRef.current) }
   }, [load])
 
-  const finished = executions.filter((e) => !['running', 'queued'].includes(e.status))
+  // Las ejecuciones viejas se piden de a páginas: cursor = queued_at de la última archivada recibida
+  const loadArchived = async () => {
+    setLoadingArchive(true)
+    try {
+      const before = archived.length ? archived[archived.length - 1].queued_at : undefined
+      const page = await fetchArchivedExecutions(before, ARCHIVE_PAGE_SIZE)
+      setArchived((prev) => [...prev, ...page])
+      if (page.length < ARCHIVE_PAGE_SIZE) setArchiveDone(true)
+    } catch {
+      /* ignore */
+    } finally {
+      setLoadingArchive(false)
+    }
+  }
+
+  const hotIds = new Set(executions.map((e) => e.id))
+  const finished = [
+    ...executions.filter((e) => !['running', 'queued'].includes(e.status)),
+    ...archived.filter((e) => !hotIds.has(e.id)),
+  ]
 
   return (
     <div className="space-y-6 animate-fadeIn">
@@ -66,6 +90,17 @@ export default function HistorialPage() {
               onCancelSuccess={load}
               onDeleteSuccess={load}
             />
+            {!archiveDone && (
+              <div className="flex justify-center mt-4">
+                <button
+                  onClick={loadArchived}
+                  disabled={loadingArchive}
+                  className="text-sm text-gray-500 hover:text-gray-700 bg-white border border-gray-200 hover:border-gray-300 px-3 py-1.5 rounded-lg transition-colors disabled:opacity-50"
+                >
+                  {loadingArchive ? 'Cargando…' : 'Cargar historial archivado'}
+                </button>
+              </div>
+            )}
           </div>
         </div>
       )}
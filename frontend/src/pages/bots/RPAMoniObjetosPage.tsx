@@ -2,12 +2,15 @@ import { useCallback, useEffect, useRef, useState } from 'react'
 import { Server, AlertTriangle, Info, CheckSquare, Square, Loader2, KeyRound, Upload, Eye, EyeOff } from 'lucide-react'
 import BotPage from './BotPage'
 import type { GetInputDataFn } from './BotPage'
-import { fetchBotServers, fetchLinuxKeys, uploadLinuxKey } from '@/services/api'
+import { fetchBotServers, fetchLinuxKeys, uploadBotServers, uploadLinuxKey } from '@/services/api'
+import { useAuth } from '@/context/AuthContext'
 import type { BotServer, LinuxKey } from '@/types'
 
 const BOT_ID = 'rpa-moni-objetos'
 
 export default function RPAMoniObjetosPage() {
+  const { user } = useAuth()
+  const isAdmin = user?.role === 'superadmin' || user?.role === 'admin'
   const [servers, setServers] = useState<BotServer[]>([])
   const [loadingServers, setLoadingServers] = useState(true)
   const [loadError, setLoadError] = useState('')
@@ -23,14 +26,37 @@ export default function RPAMoniObjetosPage() {
   const [showPassphrase, setShowPassphrase] = useState(false)
   const [uploading, setUploading] = useState(false)
   const fileInputRef = useRef<HTMLInputElement>(null)
+  const [uploadingCsv, setUploadingCsv] = useState(false)
+  const csvInputRef = useRef<HTMLInputElement>(null)
 
-  useEffect(() => {
+  const loadServers = useCallback(() => {
+    setLoadingServers(true)
     fetchBotServers(BOT_ID)
-      .then(setServers)
+      .then((data) => { setServers(data); setLoadError('') })
       .catch((e: Error) => setLoadError(e.message))
       .finally(() => setLoadingServers(false))
   }, [])
 
+  useEffect(() => {
+    loadServers()
+  }, [loadServers])
+
+  const handleUploadCsv = async (e: React.ChangeEvent<HTMLInputElement>) => {
+    const file = e.target.files?.[0]
+    if (!file) return
+    setUploadingCsv(true)
+    try {
+      await uploadBotServers(BOT_ID, file)
+      setSelectedServers(new Set())
+      loadServers()
+    } catch (err) {
+      setValidationError(err instanceof Error ? err.message : 'Error al subir el CSV de servidores')
+    } finally {
+      setUploadingCsv(false)
+      if (csvInputRef.current) csvInputRef.current.value = ''
+    }
+  }
+
   const hasLinuxSelected = servers.some(
     (s) => selectedServers.has(s.id) && s.tipo === 'linux',
   )
@@ -139,6 +165,20 @@ export default function RPAMoniObjetosPage() {
             <span className="text-xs text-gray-400">(Windows via RDP · Linux via SSH)</span>
           </div>
           <div className="flex gap-2">
+            {isAdmin && (
+              <>
+                <input ref={csvInputRef} type="file" accept=".csv" className="hidden" onChange={handleUploadCsv} />
+                <button
+                  onClick={() => csvInputRef.current?.click()}
+                  disabled={uploadingCsv}
+                  className="flex items-center gap-1 text-xs text-gray-500 hover:text-gray-700 disabled:opacity-40"
+                >
+                  {uploadingCsv ? <Loader2 className="w-3 h-3 animate-spin" /> : <Upload className="w-3 h-3" />}
+                  Subir CSV
+                </button>
+                <span className="text-gray-300">|</span>
+              </>
+            )}
             <button
               onClick={selectAll}
               disabled={loadingServers || servers.length === 0}
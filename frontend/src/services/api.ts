@@ -65,8 +65,21 @@ export async function uploadLinuxKey(botId: string, file: File): Promise<LinuxKe
   return res.json()
 }
 
+export async function uploadBotServers(botId: string, file: File): Promise<{ name: string; size: number; servers: number }> {
+  // Cuerpo crudo (no multipart): el backend lo guarda en streaming
+  const res = await fetch(`${BASE}/api/bots/${botId}/servers`, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'text/csv', ...authHeaders() },
+    body: file,
+  })
+  if (!res.ok) throw new Error(await res.text())
+  return res.json()
+}
+
 // ── Ejecuciones ───────────────────────────────────────────────────────────────
 export const fetchExecutions = () => get<BotExecution[]>('/api/executions')
+export const fetchArchivedExecutions = (before?: string, limit = 100) =>
+  get<BotExecution[]>(`/api/executions?archived=true&limit=${limit}${before ? `&before=${encodeURIComponent(before)}` : ''}`)
 export const fetchExecution = (id: string) => get<BotExecution>(`/api/executions/${id}`)
 export const cancelExecution = (id: string) => post<{ ok: boolean }>(`/api/executions/${id}/cancel`)
 export const deleteExecution = (id: string) => del<{ ok: boolean; message: string }>(`/api/executions/${id}`)
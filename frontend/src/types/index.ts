@@ -23,6 +23,20 @@ export interface Bot {
   icon: string
   supports_data_input: boolean
   supports_scheduling: boolean
+  cache_results?: boolean
+  cache_ttl_hours?: number
+  single_flight?: boolean
+  warm_pool_size?: number
+  warm_preload_modules?: string[]
+  warm_max_runs?: number
+  warm_max_rss_mb?: number
+  limit_memory_mb?: number
+  limit_cpu_seconds?: number
+  limit_open_files?: number
+  limit_wall_seconds?: number
+  priority?: 'normal' | 'low' | 'idle'
+  queue_sla_seconds?: number
+  agent_tags?: string[]
   created_at: string
 }
 
@@ -43,6 +57,46 @@ export interface BotExecution {
   error_message: string
   duration_seconds: number
   input_data: Record<string, string>
+  batch_id?: string | null
+  parent_id?: string | null
+  fanout_value?: string | null
+  children_ids?: string[]
+  pipeline_run_id?: string | null
+  pipeline_step?: string | null
+  upstream_run_folders?: Record<string, string>
+  cache_key?: string | null
+  cached_from?: string | null
+  coalesced_requests?: { triggered_by: string; triggered_by_name: string; requested_at: string }[]
+  coalesced?: boolean
+  resources?: {
+    samples?: number
+    interval_seconds?: number
+    peak_rss_kb?: number
+    avg_rss_kb?: number
+    cpu_seconds?: number
+    read_bytes?: number
+    write_bytes?: number
+    peak_children?: number
+  }
+  failure_reason?: 'memory_limit' | 'cpu_limit' | 'open_files_limit' | 'time_limit' | 'agent_lost' | null
+  sla_breached_at?: string | null
+  agent_id?: string | null
+  agent_name?: string | null
+  lease_attempts?: number
+  progress?: ExecutionProgress | null
+}
+
+/** Resumen de los eventos estructurados que reporta el bot (progreso, paso, métricas). */
+export interface ExecutionProgress {
+  percent?: number
+  current?: number
+  total?: number
+  message?: string
+  step?: string
+  metrics?: Record<string, unknown>
+  artifacts?: { path: string; label: string }[]
+  events: number
+  updated_at: string
 }
 
 export interface ExecutionFile {
@@ -88,6 +142,7 @@ export interface Stats {
   executions_queued: number
   executions_completed: number
   executions_failed: number
+  executions_archived: number
   total_bots: number
   bots_enabled: number
 }